@@ -2,20 +2,43 @@ import os
 import io
 import logging
 from dotenv import load_dotenv
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
-import requests
 from pymongo import MongoClient
 from gridfs import GridFS
 from datetime import datetime
 import uuid
 import time
-from openai import OpenAI
 import re
 import chromadb
 from sentence_transformers import SentenceTransformer
 
-from upload import handle_file_upload, extract_text, analyze_financial_content
+from upload import handle_file_upload, extract_text, analyze_financial_content, MAX_UPLOAD_BYTES, MULTIPART_OVERHEAD_BYTES
+from news_dates import parse_date_param, parse_half_life_param, build_date_filter, apply_recency_decay, recency_weight
+from region_index import query_news, count_news, news_collections
+from exact_index import exact_index_stats
+from index_config import (
+    EMBEDDING_MODEL_NAME, INDEX_WARMUP_ENABLED, collection_metadata, get_news_collection, warm_up, index_memory_footprint
+)
+from fast_json import init_flask as init_fast_json, dumps as json_dumps
+from batch_ask import batch_cost, parse_batch_items, group_by_filter, split_results, run_concurrently
+from tracing import span, init_flask as init_tracing, install_log_context, render_metrics, METRICS_CONTENT_TYPE
+from rate_limit import limit_llm_route, configure_store as configure_rate_limit_store, admission_queue
+from rate_limit import PRIORITY_INTERACTIVE, PRIORITY_UPLOAD, PRIORITY_BATCH
+from llm_router import complete as llm_complete, ProviderError, router_stats
+from context_builder import (
+    MODEL_SPECS, build_news_context, build_document_context, count_message_tokens, completion_budget, log_token_usage
+)
+from digests import (
+    DIGESTS_ENABLED, DIGEST_SCHEDULER_ENABLED, classify_generic_query, get_fresh_digest, format_digest,
+    start_scheduler as start_digest_scheduler
+)
+from meta_queries import MetaQueryAnswerer
+from gridfs_download import serve_gridfs_file, download_cache_stats
+from financial_metrics import ensure_indexes as ensure_metrics_indexes, parse_filters, query_metrics, metric_trend, METRIC_UNITS
+from documents import ensure_indexes as ensure_document_indexes, find_document, get_document_text as load_document_text, document_summary
+from conversation_memory import MEMORY_ENABLED, load_session, build_memory, needs_summary, update_summary_async
+from reranker import RERANK_ENABLED, RERANK_CANDIDATES, BASELINE_DOCS, rerank_documents, summarize_recent_stats
 
 # Load environment variables
 load_dotenv(".env.local")
@@ -23,15 +46,20 @@ load_dotenv(".env.local")
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
+install_log_context()
 
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)
+init_tracing(app)
+init_fast_json(app)
 
-# Configure upload folder
-UPLOAD_FOLDER = "uploads"  
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+# Werkzeug stops reading request bodies past this size with 413
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES
+
+@app.errorhandler(413)
+def request_too_large(error):
+    return jsonify({"error": f"Request is too large. Maximum file size is {MAX_UPLOAD_BYTES // (1024 * 1024)}MB."}), 413
 
 # MongoDB connection
 MONGO_URI = os.environ.get("MONGODB_URI")
@@ -47,30 +75,59 @@ db = client['finance_ai']
 history_collection = db['query_history']
 chat_history_collection = db['chat_history']
 document_collection = db['documents']
+digest_collection = db['market_digests']
+metrics_collection = db['financial_metrics']
 fs = GridFS(db, collection="uploads")
 
-# API keys and endpoints
-GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
-if not GROQ_API_KEY:
-    logger.warning("GROQ_API_KEY not found in environment variables")
-    # No fallback for API keys - they should be in environment variables
-
-GROQ_API_URL = os.environ.get("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
+# Per-user document lookups by id and by filename
+try:
+    ensure_document_indexes(document_collection)
+except Exception as e:
+    logger.error(f"Could not create document indexes: {str(e)}")
 
-OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    logger.warning("OPENAI_API_KEY not found in environment variables")
-    # No fallback for API keys - they should be in environment variables
+# Metric range queries and per-ticker trends across uploaded documents
+try:
+    ensure_metrics_indexes(metrics_collection)
+except Exception as e:
+    logger.error(f"Could not create financial metrics indexes: {str(e)}")
 
-# Initialize OpenAI client only if API key is available
-openai_client = None
-if OPENAI_API_KEY:
-    openai_client = OpenAI(api_key=OPENAI_API_KEY)
+# Rate limit buckets (only used with RATE_LIMIT_BACKEND=mongo)
+configure_rate_limit_store(db['rate_limits'])
 
 # Initialize ChromaDB and embedding model
 chroma_client = chromadb.PersistentClient(path="./chroma_db")
-collection = chroma_client.get_or_create_collection(name="news_data")
-embed_model = SentenceTransformer("all-MiniLM-L6-v2")
+collection = get_news_collection(chroma_client)
+embed_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+# Load the index and model before serving so the first queries are not slow
+if INDEX_WARMUP_ENABLED:
+    try:
+        warm_up(news_collections(chroma_client, collection).values(), embed_model)
+    except Exception as e:
+        logger.error(f"Index warmup failed: {str(e)}")
+
+# Meta-queries about the search engine are answered from an intent index and cache
+meta_query_answerer = MetaQueryAnswerer(embed_model, db['meta_query_cache'])
+
+# Precomputed market digests, refreshed in the background when enabled
+if DIGESTS_ENABLED and DIGEST_SCHEDULER_ENABLED:
+    start_digest_scheduler(digest_collection, chroma_client, collection, embed_model)
+
+# Default half-life for recency reranking of retrieved news (unset = disabled)
+RECENCY_HALF_LIFE_DAYS = float(os.environ.get("RECENCY_HALF_LIFE_DAYS", "0")) or None
+
+def parse_bool_param(value, name, default=None):
+    """
+    Parse a boolean request field given as a JSON boolean or a "true"/"false"
+    string. Raises ValueError for anything else so routes can answer with a 400.
+    """
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ("true", "false"):
+        return value.strip().lower() == "true"
+    raise ValueError(f'"{name}" must be true or false, got {value!r}')
 
 def clean_response(response_text):
     """
@@ -109,17 +166,30 @@ def clean_response(response_text):
     
     return cleaned.strip()
 
-def get_ai_response(prompt, model, include_prefix=True, region=None, document_name=None, document_text=None):
+def get_ai_response(prompt, model, include_prefix=True, region=None, document_name=None, document_text=None,
+                    start_date=None, end_date=None, recency_half_life_days=None, rerank=None, user_id="user",
+                    history=None, query_embedding=None, retrieved=None, served=None):
     """
     Enhanced RAG (Retrieval Augmented Generation) implementation
     
     This function:
     1. Embeds the user query
-    2. Retrieves relevant documents from ChromaDB
-    3. Constructs a prompt with retrieved context
-    4. Generates a response with internal reasoning
+    2. Retrieves relevant documents from ChromaDB, optionally restricted to a date range
+    3. Optionally reranks them with a recency decay and a cross-encoder
+    4. Constructs a prompt with retrieved context and the conversation so far (`history`)
+    5. Generates a response with internal reasoning
+    
+    Batch callers pass `query_embedding` and/or the single-query ChromaDB result
+    `retrieved` they already fetched, and steps 1-2 reuse them.
+    
+    The router may answer with a fallback or hedged target of another vendor;
+    when a `served` dict is given it is filled with the provider and model used.
     """
     region = region if region else "Global"
+    if recency_half_life_days is None:
+        recency_half_life_days = RECENCY_HALF_LIFE_DAYS
+    if rerank is None:
+        rerank = RERANK_ENABLED
     
     try:
         logger.info(f"Starting RAG process for query: '{prompt[:50]}...'")
@@ -131,65 +201,84 @@ def get_ai_response(prompt, model, include_prefix=True, region=None, document_na
             logger.info(f"Document-specific query for: {document_name}")
             
             if not document_text:
-                logger.info(f"Retrieving document text from database for: {document_name}")
-                doc = document_collection.find_one({"filename": document_name})
-                if doc and "text" in doc:
-                    document_text = doc["text"]
+                logger.debug(f"Retrieving document text from database for: {document_name}")
+                document_text = load_document_text(document_collection, user_id, filename=document_name)
+                if document_text:
                     logger.info(f"Retrieved document text: {len(document_text)} characters")
                 else:
                     logger.warning(f"Document text not found in database for: {document_name}")
         
         # Step 1: Generate query embedding
-        logger.info("Generating query embedding...")
-        query_embedding = embed_model.encode(prompt).tolist()
-        logger.info("Query embedding generated successfully")
+        if query_embedding is None and retrieved is None:
+            logger.debug("Generating query embedding...")
+            with span("embed"):
+                query_embedding = embed_model.encode(prompt).tolist()
+            logger.debug("Query embedding generated successfully")
         
         # Step 2: Retrieve relevant documents from ChromaDB or use the specific document
         if is_document_query and document_text:
-            logger.info("Using provided document text instead of ChromaDB retrieval")
-            retrieved_context = f"DOCUMENT: {document_name}\n\nContent: {document_text[:5000]}..."
-            retrieved_docs = [{"name": document_name, "content": document_text[:5000]}]
+            logger.debug("Using provided document text instead of ChromaDB retrieval")
+            with span("prompt_build"):
+                retrieved_context = build_document_context(document_name, document_text, model)
+            retrieved_docs = [{"name": document_name, "content": retrieved_context}]
         else:
-            logger.info("Retrieving relevant documents from ChromaDB...")
+            logger.debug("Retrieving relevant documents from ChromaDB...")
             
-            # Apply region filter if specified
+            # Apply region and date filters before the similarity search
             if region and region != "Global":
                 logger.info(f"Applying region filter: {region}")
-                results = collection.query(
-                    query_embeddings=[query_embedding], 
-                    n_results=5,
-                    where={"region": region}
-                )
-            else:
-                logger.info("No region filter applied")
-                results = collection.query(
-                    query_embeddings=[query_embedding], 
-                    n_results=5
-                )
+            date_filter = build_date_filter(start_date, end_date)
+            if date_filter:
+                logger.info(f"Applying date filter: {start_date} - {end_date}")
+            
+            # Over-fetch candidates when the reranking stage will narrow them down
+            n_results = RERANK_CANDIDATES if rerank else BASELINE_DOCS
+            
+            with span("retrieve"):
+                if retrieved is not None:
+                    results = retrieved
+                else:
+                    results = query_news(
+                        chroma_client,
+                        collection,
+                        query_embeddings=[query_embedding],
+                        n_results=n_results,
+                        region=region,
+                        where=date_filter
+                    )
+                
+                if recency_half_life_days:
+                    logger.debug(f"Applying recency decay with half-life of {recency_half_life_days} days")
+                    results = apply_recency_decay(results, recency_half_life_days)
             
             # Process retrieved documents
-            retrieved_docs = []
-            if results['metadatas'][0]:
-                retrieved_docs = results['metadatas'][0]
+            retrieved_docs = results['metadatas'][0] or []
+            if rerank and retrieved_docs:
+                # The cross-encoder reorders the candidates, so recency is blended into its score
+                weights = None
+                if recency_half_life_days:
+                    weights = [recency_weight((doc or {}).get("timestamp"), recency_half_life_days) for doc in retrieved_docs]
+                with span("rerank"):
+                    retrieved_docs, _ = rerank_documents(prompt, retrieved_docs, weights=weights)
+            
+            if retrieved_docs:
                 logger.info(f"Retrieved {len(retrieved_docs)} relevant documents")
                 
                 for i, doc in enumerate(retrieved_docs):
-                    logger.info(f"Doc {i+1}: {doc.get('date', 'N/A')} - {doc.get('source', 'Unknown')}")
+                    logger.debug(f"Doc {i+1}: {doc.get('date', 'N/A')} - {doc.get('source', 'Unknown')}")
                     
-                retrieved_context = "\n\n".join([
-                    f"DOCUMENT {i+1}:\n"
-                    f"Date: {doc.get('date', 'N/A')}\n"
-                    f"Source: {doc.get('source', 'Unknown')}\n"
-                    f"Region: {doc.get('region', 'Global')}\n"
-                    f"Content: {doc.get('detailed_summary', '')}"
-                    for i, doc in enumerate(retrieved_docs)
-                ])
+                with span("prompt_build"):
+                    retrieved_context, context_stats = build_news_context(retrieved_docs, model)
+                logger.info(
+                    f"Context built from {context_stats['documents']} documents "
+                    f"({context_stats['truncated']} truncated), {context_stats['context_tokens']} tokens"
+                )
             else:
                 logger.info("No relevant documents found in ChromaDB")
                 retrieved_context = "No relevant documents were retrieved from the knowledge base."
         
         # Step 3: Construct the prompt with internal reasoning instructions
-        logger.info("Constructing prompt with internal reasoning instructions...")
+        logger.debug("Constructing prompt with internal reasoning instructions...")
         
         # System message to guide the model's behavior
         system_message = f"""You are a financial insights assistant specializing in the {region} region.
@@ -232,119 +321,97 @@ INSTRUCTIONS:
 7. DO NOT include any thinking tags, reasoning steps, or internal analysis in your final response.
 """
         
-        logger.info(f"Prompt constructed. Length: {len(user_message)} characters")
+        messages = [
+            {"role": "system", "content": system_message},
+            *(history or []),
+            {"role": "user", "content": user_message}
+        ]
+        with span("prompt_build"):
+            prompt_tokens = count_message_tokens(messages, model)
+            max_tokens = completion_budget(model, prompt_tokens)
+        logger.info(f"Prompt constructed. Length: {prompt_tokens} tokens, completion budget: {max_tokens} tokens")
         
         # Step 4: Generate response using the appropriate model
-        logger.info(f"Generating response using model: {model}...")
+        logger.debug(f"Generating response using model: {model}...")
         
-        if model.lower() == "chatgpt":
-            # Use OpenAI API with gpt4omini model
-            logger.info("Using OpenAI API with gpt-4o-mini model")
-            try:
-                if not openai_client:
-                    return "Error: OpenAI API key not configured. Please set the OPENAI_API_KEY environment variable."
-                
-                response = openai_client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {"role": "system", "content": system_message},
-                        {"role": "user", "content": user_message}
-                    ],
-                    temperature=0.7,
-                    max_tokens=800
-                )
-                response_text = response.choices[0].message.content
-                logger.info("Response generated successfully with OpenAI")
-                logger.info(f"Response preview: {response_text[:100]}...")
-                
-                # Clean the response before returning
-                cleaned_response = clean_response(response_text)
-                return cleaned_response
-                
-            except Exception as e:
-                error_msg = f"OpenAI API Error: {str(e)}"
-                logger.error(error_msg)
-                return error_msg
-        elif model.lower() in ['llama', 'deepseek']:
-            # Use Groq API for llama and deepseek models
-            if not GROQ_API_KEY:
-                return "Error: Groq API key not configured. Please set the GROQ_API_KEY environment variable."
-                
-            headers = {
-                "Authorization": f"Bearer {GROQ_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            
-            # Select the appropriate model
-            if model.lower() == "llama":
-                m = "llama3-70b-8192"  
-            else:  # deepseek
-                m = "deepseek-r1-distill-llama-70b"
-                
-            logger.info(f"Using Groq API with model: {m}")
-            
-            # Call the Groq API
-            payload = {
-                "model": m,
-                "messages": [
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": user_message}
-                ],
-                "max_tokens": 800,
-                "temperature": 0.7
-            }
-            
-            response = requests.post(GROQ_API_URL, headers=headers, json=payload)
-            
-            if response.status_code == 200:
-                response_text = response.json()['choices'][0]['message']['content'].strip()
-                logger.info("Response generated successfully with Groq")
-                logger.info(f"Response preview: {response_text[:100]}...")
-                
-                # Clean the response before returning
-                cleaned_response = clean_response(response_text)
-                return cleaned_response
-                
-            else:
-                error_msg = f"Groq API Error: {response.status_code} - {response.text}"
-                logger.error(error_msg)
-                return error_msg
-        else:
+        if model.lower() not in MODEL_SPECS:
             error_msg = f"Unsupported model: {model}"
             logger.error(error_msg)
             return error_msg
+        
+        # The router picks the provider, hedges slow calls and falls back on failures
+        try:
+            with span("llm_call"):
+                result = llm_complete(model.lower(), messages, max_tokens=max_tokens, temperature=0.7)
+        except ProviderError as e:
+            error_msg = f"LLM Provider Error: {str(e)}"
+            logger.error(error_msg)
+            return error_msg
+        
+        logger.info(f"Response generated successfully with {result.provider}/{result.model}")
+        if served is not None:
+            served.update({"provider": result.provider, "model": result.model, "hedged": result.hedged})
+        log_token_usage(model, prompt_tokens, result.usage)
+        logger.debug(f"Response preview: {result.text[:100]}...")
+        
+        # Clean the response before returning
+        with span("clean"):
+            return clean_response(result.text)
     except Exception as e:
         error_msg = f"Error in RAG process: {str(e)}"
         logger.error(error_msg)
         return f"Error from AI service: {str(e)}"
 
-def save_to_history(prompt, response, region=None, user_id="anonymous", model="chatgpt"):
-    """Save the chat to history collection"""
+def save_to_history(prompt, response, region=None, user_id="anonymous", model="chatgpt", chat_id=None, served=None):
+    """
+    Save the chat to history collection, appending to the user's session `chat_id` when it exists.
+    `served` records the provider and model that actually answered.
+    """
     region = region or "Global" 
     
     # Clean the response one more time before saving to history
     cleaned_response = clean_response(response)
     
+    messages = [
+        {
+            "id": f"msg-{int(time.time() * 1000)}-user",
+            "role": "user",
+            "content": prompt,
+            "timestamp": datetime.utcnow().isoformat()
+        },
+        {
+            "id": f"msg-{int(time.time() * 1000)}-assistant",
+            "role": "assistant",
+            "content": cleaned_response,
+            "timestamp": datetime.utcnow().isoformat(),
+            "model": model,
+            "region": region,
+            **({"servedBy": served} if served else {})
+        }
+    ]
+    
+    if chat_id:
+        # Pipeline update so message_count is also right for sessions stored before it existed;
+        # $literal keeps message text starting with "$" from being read as a field path
+        result = chat_history_collection.update_one({"id": chat_id, "userId": user_id}, [
+            {"$set": {
+                "messages": {"$concatArrays": [{"$ifNull": ["$messages", []]}, {"$literal": messages}]},
+                "model": model,
+                "region": region,
+                "updatedAt": datetime.utcnow().isoformat()
+            }},
+            {"$set": {"message_count": {"$size": "$messages"}}}
+        ])
+        if result.matched_count:
+            return chat_id
+        logger.warning(f"Chat {chat_id} not found for user {user_id}, starting a new one")
+    
     entry = {
         "id": str(uuid.uuid4()),
         "userId": user_id,
         "title": prompt[:50] + ("..." if len(prompt) > 50 else ""),
-        "messages": [
-            {
-                "id": f"msg-{int(time.time() * 1000)}-user",
-                "role": "user",
-                "content": prompt,
-                "timestamp": datetime.utcnow().isoformat()
-            },
-            {
-                "id": f"msg-{int(time.time() * 1000)}-assistant",
-                "role": "assistant",
-                "content": cleaned_response,
-                "timestamp": datetime.utcnow().isoformat(),
-                "model": model,
-                "region": region
-            }
-        ],
+        "messages": messages,
+        "message_count": len(messages),
         "model": model,
         "region": region,
         "createdAt": datetime.utcnow().isoformat(),
@@ -359,6 +426,7 @@ def home():
     return jsonify({'message': 'AI API server with MongoDB integration is running!'}), 200
 
 @app.route('/ask', methods=['POST'])
+@limit_llm_route(priority=PRIORITY_INTERACTIVE)
 def ask_ai():
     """Handle search queries with RAG"""
     data = request.get_json()
@@ -372,72 +440,182 @@ def ask_ai():
     
     is_document_follow_up = data.get('isDocumentFollowUp', False)
     document_name = data.get('documentName')
+    document_id = data.get('documentId')
     
     is_meta_query = data.get('isMetaQuery', False)
+    # Provider and model that answered, which can differ from `model` after a fallback
+    served = {}
+    
+    # Follow-ups in an existing chat are answered with its summary and recent turns
+    chat_id = data.get('chatId')
+    session = None
+    history = []
+    if MEMORY_ENABLED and chat_id:
+        with span("memory_load"):
+            session = load_session(chat_history_collection, chat_id, user_id)
+            history, memory_stats = build_memory(session, model)
+        logger.info(
+            f"Conversation memory: {memory_stats['recent_messages']} recent messages, "
+            f"{memory_stats['summary_tokens']} summary tokens, {memory_stats['memory_tokens']} tokens in total"
+        )
+    
+    try:
+        start_date = parse_date_param(data.get('startDate'))
+        end_date = parse_date_param(data.get('endDate'), end=True)
+        recency_half_life_days = parse_half_life_param(data.get('recencyHalfLifeDays'))
+        rerank = parse_bool_param(data.get('rerank'), 'rerank')
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
     
-    if is_document_follow_up and document_name:
-        logger.info(f"Processing document follow-up question about: {document_name}")
+    if is_document_follow_up and (document_name or document_id):
+        logger.info(f"Processing document follow-up question about: {document_name or document_id}")
         
-        document_text = None
-        doc = document_collection.find_one({"filename": document_name})
-        if doc and "text" in doc:
-            document_text = doc["text"]
+        # Only the text is fetched, scoped to the user's own documents
+        document_text = load_document_text(document_collection, user_id, document_id=document_id, filename=document_name)
+        if document_text:
             logger.info(f"Retrieved document text: {len(document_text)} characters")
         else:
-            logger.warning(f"Document text not found in database for: {document_name}")
+            logger.warning(f"Document text not found in database for: {document_name or document_id}")
         
         response = get_ai_response(
             prompt=prompt, 
             model=model, 
             region=region, 
-            document_name=document_name,
-            document_text=document_text
+            document_name=document_name or document_id,
+            document_text=document_text,
+            user_id=user_id,
+            history=history,
+            served=served
         )
     elif is_meta_query:
         logger.info(f"Processing meta-query about the search engine")
-        # For meta-queries, we don't need RAG, just answer directly about the system
-        system_message = """You are a helpful assistant explaining how the financial search engine works.
-Provide clear, concise explanations about the system's functionality, features, and capabilities.
-
-IMPORTANT: DO NOT use <Thinking> or <Thinking> tags in your response.
-DO NOT include phrases like "Let me think about this" or "Analyzing this step by step".
-DO NOT number your reasoning steps or include any meta-commentary about your thinking process.
-"""
-        
-        user_message = f"""The user is asking about the search engine itself, not about financial information.
-Please answer their question about the system:
-
-USER QUERY: {prompt}
-
-Provide a helpful response about the search engine's functionality."""
-        
+        # Known system questions are answered from prepared or cached answers
         try:
-            logger.info("Using OpenAI for meta-query")
-            if not openai_client:
-                return jsonify({'response': "Error: OpenAI API key not configured. Please set the OPENAI_API_KEY environment variable.", 'chatId': None}), 500
-                
-            response_obj = openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": user_message}
-                ],
-                max_tokens=500,
-                temperature=0.7
-            )
-            response = response_obj.choices[0].message.content
-            
-            response = clean_response(response)
-            
+            with span("meta_query"):
+                response, source = meta_query_answerer.answer(prompt, clean=clean_response)
+            logger.info(f"Meta-query answered from {source}")
+        except ProviderError as e:
+            if not e.retryable:
+                return jsonify({'response': f"Error: {str(e)}", 'chatId': None}), 500
+            logger.error(f"Error processing meta-query: {str(e)}")
+            response = f"Error: Unable to process your query about the search engine."
         except Exception as e:
             logger.error(f"Error processing meta-query: {str(e)}")
             response = f"Error: Unable to process your query about the search engine."
     else:
-        logger.info(f"Processing regular search query with RAG")
-        response = get_ai_response(prompt, model, include_prefix=True, region=region)
+        # Generic market questions are answered from a fresh precomputed digest,
+        # except follow-ups, whose meaning depends on the conversation
+        digest = None
+        if DIGESTS_ENABLED and not (start_date or end_date) and not history:
+            topic = classify_generic_query(prompt, region)
+            if topic:
+                with span("digest_lookup"):
+                    digest = get_fresh_digest(digest_collection, region, topic)
+        
+        if digest:
+            logger.info(f"Serving {digest['region']}/{digest['topic']} market digest")
+            response = format_digest(digest)
+        else:
+            logger.info(f"Processing regular search query with RAG")
+            response = get_ai_response(
+                prompt, 
+                model, 
+                include_prefix=True, 
+                region=region,
+                start_date=start_date,
+                end_date=end_date,
+                recency_half_life_days=recency_half_life_days,
+                rerank=rerank,
+                history=history,
+                served=served
+            )
+    
+    with span("history_save"):
+        chat_id = save_to_history(prompt, response, region, user_id, model, chat_id=chat_id if session else None,
+                                  served=served)
+    if needs_summary(session):
+        update_summary_async(chat_history_collection, chat_id)
+    return jsonify({'response': response, 'chatId': chat_id, 'servedBy': served or None}), 200
+
+@app.route('/ask/batch', methods=['POST'])
+@limit_llm_route(priority=PRIORITY_BATCH, cost=batch_cost, batch=True)
+def ask_batch():
+    """
+    Answer many prompts at once (dashboard widgets, scripts). All prompts are
+    embedded in one call, retrieval runs one multi-query per region/date group
+    and LLM calls run concurrently. With ?stream=true results are sent as NDJSON
+    lines in completion order; otherwise they are returned together in item order.
+    Batch answers are not saved to the chat history.
+    """
+    data = request.get_json(silent=True)
+    try:
+        items = parse_batch_items(data)
+        rerank = parse_bool_param(data.get('rerank'), 'rerank', default=RERANK_ENABLED)
+        recency_half_life_days = parse_half_life_param(data.get('recencyHalfLifeDays'))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    for item in items:
+        if item["model"].lower() not in MODEL_SPECS:
+            return jsonify({'error': f"Unsupported model in item {item['index']}: {item['model']}"}), 400
+    
+    # Generic market questions are served from fresh digests without retrieval or an LLM call
+    digests = {}
+    if DIGESTS_ENABLED:
+        with span("digest_lookup"):
+            for item in items:
+                topic = None if (item["start_date"] or item["end_date"]) else classify_generic_query(item["prompt"], item["region"])
+                digest = get_fresh_digest(digest_collection, item["region"], topic) if topic else None
+                if digest:
+                    digests[item["index"]] = format_digest(digest)
+    pending = [item for item in items if item["index"] not in digests]
+    
+    retrieved = {}
+    if pending:
+        with span("embed"):
+            embeddings = embed_model.encode([item["prompt"] for item in pending]).tolist()
+        for item, embedding in zip(pending, embeddings):
+            item["embedding"] = embedding
+        with span("retrieve"):
+            for (region, start_date, end_date), group in group_by_filter(pending).items():
+                results = query_news(
+                    chroma_client,
+                    collection,
+                    query_embeddings=[item["embedding"] for item in group],
+                    n_results=RERANK_CANDIDATES if rerank else BASELINE_DOCS,
+                    region=region,
+                    where=build_date_filter(start_date, end_date)
+                )
+                for item, result in zip(group, split_results(results, len(group))):
+                    retrieved[item["index"]] = result
+    logger.info(f"Batch of {len(items)} prompts: {len(digests)} digests, {len(pending)} RAG answers")
     
-    chat_id = save_to_history(prompt, response, region, user_id, model)
-    return jsonify({'response': response, 'chatId': chat_id}), 200
+    def answer(item):
+        if item["index"] in digests:
+            return {"response": digests[item["index"]], "source": "digest"}
+        served = {}
+        response = get_ai_response(
+            item["prompt"],
+            item["model"],
+            region=item["region"],
+            start_date=item["start_date"],
+            end_date=item["end_date"],
+            recency_half_life_days=recency_half_life_days,
+            rerank=rerank,
+            query_embedding=item["embedding"],
+            retrieved=retrieved[item["index"]],
+            served=served
+        )
+        return {"response": response, "source": "rag", "servedBy": served or None}
+    
+    def results():
+        for item, result, elapsed_ms in run_concurrently(items, answer):
+            yield {"index": item["index"], "id": item["id"], **result,
+                   "elapsedMs": round(elapsed_ms, 1) if elapsed_ms is not None else None}
+    
+    if request.args.get('stream', 'false').lower() == 'true':
+        lines = (json_dumps(result) + b"\n" for result in results())
+        return Response(stream_with_context(lines), mimetype="application/x-ndjson")
+    return jsonify({"results": sorted(results(), key=lambda result: result["index"])}), 200
 
 @app.route('/chat-history', methods=['GET'])
 def get_chat_sessions():
@@ -493,36 +671,107 @@ def get_current_user():
     return jsonify({"userId": user_id})
 
 @app.route("/upload", methods=["POST"])
+@limit_llm_route(priority=PRIORITY_UPLOAD)
 def upload_file():
     """Handle document upload - delegates to upload.py"""
-    return handle_file_upload(request, fs, document_collection, save_to_history)
+    return handle_file_upload(request, fs, document_collection, save_to_history, metrics_collection)
 
 @app.route("/document/<filename>", methods=["GET"])
 def get_document_text(filename):
-    """Retrieve document text from the database"""
+    """Retrieve a document's preview and metadata from the database"""
     try:
         user_id = request.args.get('userId', 'user')
         if not user_id:
             return jsonify({'error': 'User ID is required'}), 400
             
-        doc = document_collection.find_one({"filename": filename})
+        # The full text is not loaded; preview and length are stored at upload
+        doc = find_document(document_collection, user_id, document_id=request.args.get('documentId'), filename=filename)
         if not doc:
             return jsonify({"error": "Document not found"}), 404
             
-        return jsonify({
-            "filename": doc["filename"],
-            "upload_date": doc.get("upload_date", "Unknown"),
-            "text_preview": doc["text"][:500] + "..." if len(doc["text"]) > 500 else doc["text"],
-            "text_length": len(doc["text"])
-        }), 200
+        return jsonify(document_summary(doc)), 200
     except Exception as e:
         logger.error(f"Error retrieving document: {str(e)}")
         return jsonify({"error": f"Failed to retrieve document: {str(e)}"}), 500
 
+@app.route("/financial-metrics", methods=["GET"])
+def get_financial_metrics():
+    """
+    Query a user's stored document metrics, e.g.
+    /financial-metrics?userId=u1&filter=roe>15&filter=revenue>=500&sort=roe
+    """
+    try:
+        user_id = request.args.get('userId')
+        if not user_id:
+            return jsonify({'error': 'User ID is required'}), 400
+
+        sort_by = request.args.get('sort')
+        if sort_by and sort_by not in METRIC_UNITS:
+            return jsonify({"error": f"Unknown metric: {sort_by}"}), 400
+        try:
+            filters = parse_filters(request.args.getlist('filter'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        try:
+            limit = int(request.args.get('limit', 50))
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return jsonify({"error": '"limit" must be a positive integer'}), 400
+
+        results = query_metrics(
+            metrics_collection,
+            user_id,
+            filters=filters,
+            ticker=request.args.get('ticker'),
+            sort_by=sort_by,
+            descending=request.args.get('order', 'desc') != 'asc',
+            limit=min(limit, 500)
+        )
+        return jsonify({"results": results, "units": METRIC_UNITS}), 200
+    except Exception as e:
+        logger.error(f"Error querying financial metrics: {str(e)}")
+        return jsonify({"error": f"Failed to query financial metrics: {str(e)}"}), 500
+
+@app.route("/financial-metrics/trend", methods=["GET"])
+def get_financial_metric_trend():
+    """One metric for a ticker across reporting periods"""
+    try:
+        user_id = request.args.get('userId')
+        ticker = request.args.get('ticker')
+        metric = request.args.get('metric', 'revenue')
+        if not user_id or not ticker:
+            return jsonify({'error': 'User ID and ticker are required'}), 400
+        if metric not in METRIC_UNITS:
+            return jsonify({"error": f"Unknown metric: {metric}"}), 400
+
+        trend = metric_trend(metrics_collection, user_id, ticker, metric)
+        return jsonify({"ticker": ticker.upper(), "metric": metric, "unit": METRIC_UNITS[metric], "trend": trend}), 200
+    except Exception as e:
+        logger.error(f"Error retrieving metric trend: {str(e)}")
+        return jsonify({"error": f"Failed to retrieve metric trend: {str(e)}"}), 500
+
 @app.route("/uploads/<filename>")
 def uploaded_file(filename):
-    """Serve uploaded files"""
-    return send_from_directory(app.config["UPLOAD_FOLDER"], filename)
+    """Stream a user's uploaded file from GridFS, by filename or by documentId"""
+    try:
+        user_id = request.args.get('userId')
+        if not user_id:
+            return jsonify({'error': 'User ID is required'}), 400
+
+        doc = find_document(document_collection, user_id, document_id=request.args.get('documentId'), filename=filename)
+        if not doc or not doc.get("gridfs_id"):
+            return jsonify({"error": "File not found"}), 404
+
+        return serve_gridfs_file(request, fs, file_id=doc["gridfs_id"])
+    except Exception as e:
+        logger.error(f"Error serving file: {str(e)}")
+        return jsonify({"error": f"Failed to serve file: {str(e)}"}), 500
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Stage and request latency histograms in Prometheus text format"""
+    return render_metrics(), 200, {"Content-Type": METRICS_CONTENT_TYPE}
 
 @app.route("/health", methods=["GET"])
 def health_check():
@@ -530,20 +779,25 @@ def health_check():
     # Check if RAG verification is requested
     check_rag = request.args.get('check_rag', 'false').lower() == 'true'
     check_upload = request.args.get('check_upload', 'false').lower() == 'true'
+    check_llm = request.args.get('check_llm', 'false').lower() == 'true'
     
     response = {"status": "healthy", "api": "running"}
     
     if check_rag:
         try:
             # Check if ChromaDB collection exists and has documents
-            collection_info = collection.get()
-            doc_count = len(collection_info.get('ids', []))
+            doc_count = count_news(chroma_client, collection)
             
             response["rag"] = {
                 "status": "healthy" if doc_count > 0 else "warning",
                 "message": "RAG setup is working properly" if doc_count > 0 else "ChromaDB collection exists but contains no documents",
                 "collection_name": "news_data",
-                "document_count": doc_count
+                "document_count": doc_count,
+                "embedding_model": EMBEDDING_MODEL_NAME,
+                "index_config": collection_metadata(),
+                "index_memory": index_memory_footprint(news_collections(chroma_client, collection).values()),
+                "exact_search": exact_index_stats(),
+                "rerank": {"enabled": RERANK_ENABLED, **summarize_recent_stats()}
             }
         except Exception as e:
             response["rag"] = {
@@ -561,7 +815,8 @@ def health_check():
                 "status": "healthy",
                 "message": "Document upload system is operational",
                 "gridfs_files": fs_files,
-                "document_count": doc_count
+                "document_count": doc_count,
+                "download_cache": download_cache_stats()
             }
         except Exception as e:
             response["upload"] = {
@@ -569,6 +824,10 @@ def health_check():
                 "message": f"Failed to verify upload system: {str(e)}"
             }
     
+    if check_llm:
+        response["llm"] = router_stats()
+        response["llm"]["queue"] = admission_queue.stats()
+    
     return jsonify(response)
 
 if __name__ == '__main__':
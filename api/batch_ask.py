@@ -0,0 +1,97 @@
+"""
+Helpers for /ask/batch: many prompts answered with one embedding call, one
+multi-query retrieval per (region, date range) group and concurrent LLM calls.
+
+Request body:
+    {
+        "userId": "u1", "model": "chatgpt", "region": "Global",      # defaults
+        "items": [
+            {"id": "gold-widget", "prompt": "What's happening in gold today?"},
+            {"prompt": "Outlook for European banks", "region": "Europe", "model": "llama"}
+        ]
+    }
+
+Results carry the item's index and id so they can be matched up when they
+are streamed as NDJSON in completion order.
+"""
+import os
+import time
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from flask import request
+
+from news_dates import parse_date_param
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "50"))
+# LLM calls in flight per batch; the provider limits are shared with /ask
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", "8"))
+
+def batch_cost():
+    """Rate-limit cost of a batch request: one token per item, from the per-user batch bucket"""
+    data = request.get_json(silent=True) or {}
+    items = data.get("items")
+    return max(1, len(items)) if isinstance(items, list) else 1
+
+def parse_batch_items(data):
+    """Validated items with the batch defaults applied; raises ValueError on bad input"""
+    if not isinstance(data, dict) or not isinstance(data.get("items"), list) or not data["items"]:
+        raise ValueError('Please provide a non-empty "items" list')
+    if len(data["items"]) > BATCH_MAX_ITEMS:
+        raise ValueError(f"Too many items: at most {BATCH_MAX_ITEMS} per batch")
+
+    items = []
+    for index, raw in enumerate(data["items"]):
+        if not isinstance(raw, dict) or not raw.get("prompt"):
+            raise ValueError(f'Item {index} needs a "prompt"')
+        model = raw.get("model") or data.get("model")
+        if not model:
+            raise ValueError(f'Item {index} needs a "model" (or give one for the whole batch)')
+        items.append({
+            "index": index,
+            "id": raw.get("id"),
+            "prompt": raw["prompt"],
+            "model": model,
+            "region": raw.get("region") or data.get("region") or "Global",
+            "start_date": parse_date_param(raw.get("startDate", data.get("startDate"))),
+            "end_date": parse_date_param(raw.get("endDate", data.get("endDate")), end=True),
+        })
+    return items
+
+def group_by_filter(items):
+    """Items that can share one retrieval query: same region and date range"""
+    groups = {}
+    for item in items:
+        groups.setdefault((item["region"], item["start_date"], item["end_date"]), []).append(item)
+    return groups
+
+def split_results(results, count):
+    """A multi-query ChromaDB result as one single-query result per query"""
+    keys = [key for key in ("ids", "distances", "metadatas", "documents") if results.get(key) is not None]
+    return [{key: [results[key][i]] for key in keys} for i in range(count)]
+
+def run_concurrently(items, answer, max_workers=None):
+    """
+    Yield (item, result, elapsed_ms) as each answer(item) completes. Each call
+    runs in a copy of the caller's context so request ids and stage timings
+    are attributed to the batch request.
+    """
+    workers = max(1, min(max_workers or BATCH_MAX_CONCURRENCY, len(items)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ask-batch") as pool:
+        def timed(item):
+            start = time.perf_counter()
+            return answer(item), (time.perf_counter() - start) * 1000
+
+        futures = {pool.submit(contextvars.copy_context().run, timed, item): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                result, elapsed_ms = future.result()
+            except Exception as e:
+                logger.error(f"Batch item {item['index']} failed: {str(e)}")
+                result, elapsed_ms = {"error": str(e)}, None
+            yield item, result, elapsed_ms
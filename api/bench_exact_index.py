@@ -0,0 +1,110 @@
+"""
+Find the candidate-set size below which exact search beats HNSW.
+
+Usage:
+    python bench_exact_index.py --docs 200000 --candidates 500,2000,10000,50000,200000
+
+Synthetic unit vectors are indexed into a temporary Chroma collection and an
+ExactIndex. Each document gets a 'slot' in [0, 1000) so a where filter on
+slot selects a candidate set of the requested size. For each size both paths
+answer the same queries; the table shows latency, recall@k against the exact
+answer and the largest size at which exact search is still faster, which is a
+good starting value for EXACT_SEARCH_THRESHOLD.
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+import chromadb
+
+from exact_index import ExactIndex
+
+SLOTS = 1000
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+def int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+def run(args):
+    rng = np.random.default_rng(args.seed)
+    vectors = rng.standard_normal((args.docs, args.dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [str(i) for i in range(args.docs)]
+    metadatas = [{"slot": int(slot)} for slot in rng.integers(0, SLOTS, args.docs)]
+
+    path = tempfile.mkdtemp(prefix="bench_exact_index_")
+    try:
+        start = time.perf_counter()
+        exact = ExactIndex.build(os.path.join(path, "exact"), ids, vectors, metadatas, space="l2", dtype=args.dtype)
+        print(f"Exact index ({args.dtype}) built in {time.perf_counter() - start:.1f}s")
+
+        client = chromadb.PersistentClient(path=os.path.join(path, "chroma"))
+        collection = client.create_collection(name="bench", metadata={
+            "hnsw:space": "l2", "hnsw:M": args.m, "hnsw:search_ef": args.ef_search
+        })
+        batch_size = min(args.batch_size, client.get_max_batch_size())
+        start = time.perf_counter()
+        for offset in range(0, args.docs, batch_size):
+            collection.add(ids=ids[offset:offset + batch_size],
+                           embeddings=vectors[offset:offset + batch_size].tolist(),
+                           metadatas=metadatas[offset:offset + batch_size])
+        print(f"Chroma collection built in {time.perf_counter() - start:.1f}s")
+
+        queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+        print(f"\n{'candidates':>10} {'exact p50':>10} {'exact p95':>10} {'hnsw p50':>10} {'hnsw p95':>10} {'hnsw recall':>12}")
+        crossover = None
+        for size in sorted(args.candidates):
+            slots = max(1, min(SLOTS, round(SLOTS * size / args.docs)))
+            where = {"slot": {"$lt": slots}} if slots < SLOTS else None
+            candidates = exact.candidates(where)
+            count = exact.candidate_count(candidates)
+            k = min(args.k, count)
+
+            exact_latencies, hnsw_latencies, recalls = [], [], []
+            for q in queries:
+                start = time.perf_counter()
+                truth = exact.query([q], k, candidates=candidates)["ids"][0]
+                exact_latencies.append((time.perf_counter() - start) * 1000)
+
+                kwargs = {"query_embeddings": [q.tolist()], "n_results": k, "include": []}
+                if where:
+                    kwargs["where"] = where
+                start = time.perf_counter()
+                found = collection.query(**kwargs)["ids"][0]
+                hnsw_latencies.append((time.perf_counter() - start) * 1000)
+                recalls.append(len(set(found) & set(truth)) / max(1, k))
+
+            exact_p50, hnsw_p50 = percentile(exact_latencies, 50), percentile(hnsw_latencies, 50)
+            if exact_p50 <= hnsw_p50:
+                crossover = count
+            print(f"{count:>10} {exact_p50:>10.2f} {percentile(exact_latencies, 95):>10.2f} "
+                  f"{hnsw_p50:>10.2f} {percentile(hnsw_latencies, 95):>10.2f} {np.mean(recalls):>12.3f}")
+
+        if crossover:
+            print(f"\nExact search is faster up to ~{crossover} candidates (EXACT_SEARCH_THRESHOLD)")
+        else:
+            print("\nHNSW was faster at every measured size")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exact vs HNSW search latency by candidate-set size")
+    parser.add_argument("--docs", type=int, default=200_000, help="total corpus size")
+    parser.add_argument("--candidates", type=int_list, default=[500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000],
+                        help="comma-separated candidate-set sizes")
+    parser.add_argument("--dim", type=int, default=384, help="embedding dimension (all-MiniLM-L6-v2 is 384)")
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float16"])
+    parser.add_argument("--queries", type=int, default=100, help="queries per candidate-set size")
+    parser.add_argument("--k", type=int, default=5, help="results per query")
+    parser.add_argument("--m", type=int, default=16, help="hnsw:M")
+    parser.add_argument("--ef-search", type=int, default=50, help="hnsw:search_ef")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    run(parser.parse_args())
@@ -0,0 +1,112 @@
+"""
+Serialization time and bytes on the wire for the history and news payloads.
+
+Usage:
+    python bench_json.py --sessions 200 --messages 20
+
+A synthetic /chat-history payload (sessions of user/assistant messages with
+markdown answers) and a /relevant-news payload are encoded with the stdlib
+encoder as Flask's jsonify configures it (sorted keys) and with fast_json.dumps,
+then compressed with gzip and, when installed, brotli. Times are the median of
+--repeat runs.
+"""
+import json
+import time
+import random
+import argparse
+import statistics
+from datetime import datetime, timedelta
+
+import fast_json
+
+ANSWER = """## Market overview
+
+- **Gold** rose **1.2%** to $2,341 an ounce as the dollar weakened.
+- **Brent crude** slipped to $82.10 after OPEC+ signalled steady output.
+- **S&P 500** futures were flat ahead of the inflation print.
+
+The central bank is expected to hold rates, with markets pricing two cuts by year end. """
+
+def chat_history_payload(sessions, messages, seed=42):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    history = []
+    for s in range(sessions):
+        created = start + timedelta(hours=s)
+        chat = []
+        for m in range(messages):
+            chat.append({
+                "id": f"msg-{s}-{m}-user",
+                "role": "user",
+                "content": f"What is the outlook for {rng.choice(['gold', 'oil', 'stocks', 'bitcoin'])} this week?",
+                "timestamp": (created + timedelta(minutes=m)).isoformat()
+            })
+            chat.append({
+                "id": f"msg-{s}-{m}-assistant",
+                "role": "assistant",
+                "content": ANSWER * rng.randint(1, 3),
+                "timestamp": (created + timedelta(minutes=m, seconds=5)).isoformat(),
+                "region": "Global",
+                "model": "chatgpt"
+            })
+        history.append({
+            "id": f"chat-{s}",
+            "userId": "user",
+            "title": f"Market question {s}",
+            "messages": chat,
+            "createdAt": created.isoformat(),
+            "updatedAt": (created + timedelta(minutes=messages)).isoformat()
+        })
+    return {"history": history}
+
+def news_payload(articles, seed=42):
+    rng = random.Random(seed)
+    return {"relevant_articles": [{
+        "title": f"Markets move as investors weigh rate outlook ({i})",
+        "description": "Stocks and bonds moved as traders reassessed the path of interest rates after new data. " * 2,
+        "url": f"https://example.com/markets/{i}",
+        "source": rng.choice(["Reuters", "Bloomberg", "FT", "CNBC"]),
+        "publishedAt": f"2025-01-{1 + i % 28:02d}T12:00:00Z",
+        "region": "Global",
+        "score": rng.random()
+    } for i in range(articles)]}
+
+def median_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), result
+
+def run(args):
+    payloads = {
+        "/chat-history": chat_history_payload(args.sessions, args.messages),
+        "/relevant-news": news_payload(args.articles),
+    }
+    encoders = [
+        ("json (jsonify)", lambda obj: json.dumps(obj, sort_keys=True, ensure_ascii=True).encode("utf-8")),
+        (f"fast_json ({fast_json.json_backend()})", fast_json.dumps),
+    ]
+    encodings = ["gzip"] + (["br"] if fast_json.brotli is not None else [])
+
+    print(f"{'endpoint':>15} {'encoder':>20} {'encode':>9} {'raw':>10} "
+          + " ".join(f"{e + ' bytes':>11} {e + ' time':>10}" for e in encodings))
+    for endpoint, payload in payloads.items():
+        for name, encode in encoders:
+            encode_ms, body = median_ms(lambda: encode(payload), args.repeat)
+            row = f"{endpoint:>15} {name:>20} {encode_ms:>7.1f}ms {len(body) / 1024:>8.0f}KB"
+            for encoding in encodings:
+                compress_ms, compressed = median_ms(lambda: fast_json.compress(body, encoding), args.repeat)
+                row += f" {len(compressed) / 1024:>9.0f}KB {compress_ms:>8.1f}ms"
+            print(row)
+    if fast_json.brotli is None:
+        print("\nbrotli is not installed; only gzip was measured")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="JSON encoding and compression benchmark")
+    parser.add_argument("--sessions", type=int, default=200, help="chat sessions in the history payload")
+    parser.add_argument("--messages", type=int, default=20, help="question/answer pairs per session")
+    parser.add_argument("--articles", type=int, default=50, help="articles in the news payload")
+    parser.add_argument("--repeat", type=int, default=5)
+    run(parser.parse_args())
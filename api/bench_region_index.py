@@ -0,0 +1,104 @@
+"""
+Benchmark region-filtered queries on a single collection against per-region
+partitioned collections.
+
+Usage:
+    python bench_region_index.py --docs 1000000 --queries 200
+
+Synthetic unit vectors are indexed twice in a temporary directory: once into a
+single collection with a 'region' metadata field and once into one collection
+per region. Region sizes are skewed so small regions show the recall drop of
+filtered HNSW search. Recall@k is measured against an exact search over the
+region's vectors.
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import chromadb
+
+from region_index import REGIONS, region_collection_name
+
+# Share of the corpus per region, largest first
+REGION_SHARES = [0.40, 0.25, 0.15, 0.10, 0.05, 0.03, 0.02]
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+def random_unit_vectors(rng, n, dim):
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+def build_indexes(client, args, rng):
+    """Index the same synthetic corpus into both layouts, keeping vectors for recall checks"""
+    single = client.create_collection(name="news_data")
+    shards = {region: client.create_collection(name=region_collection_name(region)) for region in REGIONS}
+    batch_size = min(args.batch_size, client.get_max_batch_size())
+
+    counts = np.floor(np.array(REGION_SHARES) * args.docs).astype(int)
+    region_vectors = {}
+    start = time.perf_counter()
+    for region, count in zip(REGIONS, counts):
+        vectors = random_unit_vectors(rng, int(count), args.dim)
+        region_vectors[region] = vectors
+        for offset in range(0, len(vectors), batch_size):
+            chunk = vectors[offset:offset + batch_size]
+            ids = [f"{region_collection_name(region)}-{offset + i}" for i in range(len(chunk))]
+            metadatas = [{"region": region}] * len(chunk)
+            single.add(ids=ids, embeddings=chunk.tolist(), metadatas=metadatas)
+            shards[region].add(ids=ids, embeddings=chunk.tolist(), metadatas=metadatas)
+        print(f"Indexed {count} documents for {region}")
+    print(f"Indexing took {time.perf_counter() - start:.1f}s")
+    return single, shards, region_vectors
+
+def exact_top_k(vectors, query, k):
+    scores = vectors @ query
+    top = np.argpartition(-scores, min(k, len(scores) - 1))[:k]
+    return set(top[np.argsort(-scores[top])].tolist())
+
+def run(args):
+    rng = np.random.default_rng(args.seed)
+    path = tempfile.mkdtemp(prefix="bench_region_index_")
+    try:
+        client = chromadb.PersistentClient(path=path)
+        single, shards, region_vectors = build_indexes(client, args, rng)
+
+        print(f"\n{'region':<15} {'docs':>9} {'layout':<12} {'p50 ms':>8} {'p95 ms':>8} {'recall@k':>9}")
+        for region in REGIONS:
+            vectors = region_vectors[region]
+            prefix = region_collection_name(region)
+            queries = random_unit_vectors(rng, args.queries, args.dim)
+            k = min(args.k, len(vectors))
+
+            layouts = {
+                "filtered": lambda q: single.query(query_embeddings=[q.tolist()], n_results=k,
+                                                   where={"region": region}, include=[]),
+                "partitioned": lambda q: shards[region].query(query_embeddings=[q.tolist()], n_results=k,
+                                                             include=[]),
+            }
+            for layout, query in layouts.items():
+                latencies = []
+                recalls = []
+                for q in queries:
+                    start = time.perf_counter()
+                    result = query(q)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    found = {int(doc_id.rsplit("-", 1)[1]) for doc_id in result["ids"][0] if doc_id.startswith(prefix)}
+                    recalls.append(len(found & exact_top_k(vectors, q, k)) / k)
+                print(f"{region:<15} {len(vectors):>9} {layout:<12} {percentile(latencies, 50):>8.2f} "
+                      f"{percentile(latencies, 95):>8.2f} {np.mean(recalls):>9.3f}")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Filtered vs partitioned region query benchmark")
+    parser.add_argument("--docs", type=int, default=1_000_000, help="total corpus size")
+    parser.add_argument("--dim", type=int, default=384, help="embedding dimension (all-MiniLM-L6-v2 is 384)")
+    parser.add_argument("--queries", type=int, default=200, help="queries per region and layout")
+    parser.add_argument("--k", type=int, default=5, help="results per query")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    run(parser.parse_args())
@@ -0,0 +1,213 @@
+"""
+Offline retrieval quality and latency benchmark for the news index.
+
+Usage:
+    python bench_retrieval.py --dataset dataset.csv --sizes 1000,5000,all \
+        --m 16,32 --ef-construction 100,200 --ef-search 10,50,100 --k 1,5,10
+
+Query/relevant-document pairs come from the Kaggle dataset used by
+load_data.py: each sampled row's Subject (or, when empty, the first sentence of
+its DetailedSummary) is the query and the row's CompactedSummary, the text that
+is actually indexed, is the one relevant document. Pairs can also be loaded
+from a CSV with --pairs (columns: query, doc_id, where doc_id is the dataset
+row index).
+
+For every corpus size the corpus embeddings are searched exactly with numpy as
+the baseline, then indexed into a temporary Chroma collection per HNSW setting.
+Recall@k, MRR and query latency are reported for each, optionally with the
+cross-encoder reranker applied to the exact top candidates.
+"""
+import os
+import re
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import itertools
+
+import numpy as np
+import pandas as pd
+import chromadb
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+def int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+def load_corpus(path):
+    """Indexed texts, keyed by dataset row index like load_data.py"""
+    df = pd.read_csv(path).fillna("")
+    df["CompactedSummary"] = df["CompactedSummary"].astype(str)
+    df = df[df["CompactedSummary"].str.strip() != ""]
+    return df
+
+def first_sentence(text):
+    return re.split(r"(?<=[.!?])\s+", text.strip(), maxsplit=1)[0]
+
+def generate_pairs(df, count, rng):
+    """(query, doc_id) pairs where the query is a different field of the same article"""
+    pairs = []
+    for doc_id in rng.permutation(df.index.to_numpy()):
+        row = df.loc[doc_id]
+        query = str(row.get("Subject", "")).strip() or first_sentence(str(row.get("DetailedSummary", "")))
+        if query and query != row["CompactedSummary"].strip():
+            pairs.append((query, int(doc_id)))
+        if len(pairs) >= count:
+            break
+    return pairs
+
+def load_pairs(path):
+    pairs = pd.read_csv(path)
+    return list(zip(pairs["query"].astype(str), pairs["doc_id"].astype(int)))
+
+def embed(model, texts, cache_path=None, batch_size=256):
+    """Normalized embeddings, cached on disk since encoding dominates the run time"""
+    if cache_path and os.path.exists(cache_path):
+        return np.load(cache_path)
+    vectors = model.encode(texts, batch_size=batch_size, show_progress_bar=len(texts) > 1000,
+                           convert_to_numpy=True, normalize_embeddings=True).astype(np.float32)
+    if cache_path:
+        np.save(cache_path, vectors)
+    return vectors
+
+def cache_file(cache_dir, model_name, texts):
+    if not cache_dir:
+        return None
+    digest = hashlib.sha256("\x00".join([model_name] + texts).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, f"embeddings_{digest}.npy")
+
+def score(ranked_ids, relevant_id, ks):
+    """Hits at each k and the reciprocal rank of the relevant document"""
+    rank = ranked_ids.index(relevant_id) + 1 if relevant_id in ranked_ids else None
+    return {k: int(rank is not None and rank <= k) for k in ks}, (1.0 / rank if rank else 0.0)
+
+def evaluate(search, relevant_ids, ks):
+    """Run every query through search(query_index) -> ranked doc ids"""
+    latencies = []
+    hits = {k: 0 for k in ks}
+    reciprocal_ranks = []
+    for i, relevant_id in enumerate(relevant_ids):
+        start = time.perf_counter()
+        ranked_ids = search(i)
+        latencies.append((time.perf_counter() - start) * 1000)
+        query_hits, rr = score(ranked_ids, relevant_id, ks)
+        for k in ks:
+            hits[k] += query_hits[k]
+        reciprocal_ranks.append(rr)
+    n = max(1, len(relevant_ids))
+    return {
+        **{f"recall@{k}": hits[k] / n for k in ks},
+        "mrr": float(np.mean(reciprocal_ranks)) if reciprocal_ranks else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95)
+    }
+
+def build_collection(client, name, ids, vectors, m, ef_construction, ef_search, batch_size):
+    collection = client.create_collection(name=name, metadata={
+        "hnsw:space": "cosine",
+        "hnsw:M": m,
+        "hnsw:construction_ef": ef_construction,
+        "hnsw:search_ef": ef_search
+    })
+    batch_size = min(batch_size, client.get_max_batch_size())
+    for offset in range(0, len(ids), batch_size):
+        collection.add(ids=[str(i) for i in ids[offset:offset + batch_size]],
+                       embeddings=vectors[offset:offset + batch_size].tolist())
+    return collection
+
+def print_row(label, size, metrics, ks):
+    recalls = " ".join(f"{metrics[f'recall@{k}']:>9.3f}" for k in ks)
+    print(f"{label:<28} {size:>8} {recalls} {metrics['mrr']:>7.3f} {metrics['p50_ms']:>8.2f} {metrics['p95_ms']:>8.2f}")
+
+def run(args):
+    from sentence_transformers import SentenceTransformer
+
+    rng = np.random.default_rng(args.seed)
+    df = load_corpus(args.dataset)
+    pairs = load_pairs(args.pairs) if args.pairs else generate_pairs(df, args.queries, rng)
+    pairs = [(query, doc_id) for query, doc_id in pairs if doc_id in df.index]
+    ks = sorted(args.k)
+    max_k = max(ks)
+
+    # Corpus order: the queried documents first, so every corpus size contains them
+    relevant = {doc_id for _, doc_id in pairs}
+    order = [doc_id for _, doc_id in pairs] + [i for i in df.index if i not in relevant]
+    order = list(dict.fromkeys(order))
+    texts = df.loc[order, "CompactedSummary"].tolist()
+
+    model = SentenceTransformer(args.model)
+    doc_vectors = embed(model, texts, cache_file(args.cache_dir, args.model, texts))
+    query_vectors = embed(model, [query for query, _ in pairs])
+    relevant_ids = [doc_id for _, doc_id in pairs]
+    print(f"{len(pairs)} queries over up to {len(order)} documents, model {args.model}")
+
+    reranker = None
+    if args.rerank:
+        from reranker import get_cross_encoder
+        reranker = get_cross_encoder()
+
+    sizes = sorted({len(order) if s == "all" else min(int(s), len(order)) for s in args.sizes.split(",")})
+    header = " ".join(f"{f'recall@{k}':>9}" for k in ks)
+    print(f"\n{'index':<28} {'docs':>8} {header} {'MRR':>7} {'p50 ms':>8} {'p95 ms':>8}")
+
+    path = tempfile.mkdtemp(prefix="bench_retrieval_")
+    try:
+        client = chromadb.PersistentClient(path=path)
+        for size in sizes:
+            ids = order[:size]
+            vectors = doc_vectors[:size]
+
+            def exact_search(i):
+                scores = vectors @ query_vectors[i]
+                top = np.argpartition(-scores, min(max_k, size - 1))[:max_k]
+                return [ids[j] for j in top[np.argsort(-scores[top])]]
+            print_row("exact (numpy)", size, evaluate(exact_search, relevant_ids, ks), ks)
+
+            if reranker is not None:
+                def reranked_search(i):
+                    scores = vectors @ query_vectors[i]
+                    top = np.argpartition(-scores, min(args.rerank_candidates, size - 1))[:args.rerank_candidates]
+                    rerank_scores = reranker.predict([(pairs[i][0], texts[j]) for j in top], show_progress_bar=False)
+                    return [ids[top[j]] for j in np.argsort(-rerank_scores)[:max_k]]
+                print_row(f"exact + rerank@{args.rerank_candidates}", size,
+                          evaluate(reranked_search, relevant_ids, ks), ks)
+
+            for m, ef_construction, ef_search in itertools.product(args.m, args.ef_construction, args.ef_search):
+                name = f"bench_{size}_{m}_{ef_construction}_{ef_search}"
+                start = time.perf_counter()
+                collection = build_collection(client, name, ids, vectors, m, ef_construction, ef_search, args.batch_size)
+                build_seconds = time.perf_counter() - start
+
+                def hnsw_search(i):
+                    result = collection.query(query_embeddings=[query_vectors[i].tolist()], n_results=min(max_k, size),
+                                              include=[])
+                    return [int(doc_id) for doc_id in result["ids"][0]]
+                label = f"hnsw M={m} efc={ef_construction} ef={ef_search}"
+                print_row(label, size, evaluate(hnsw_search, relevant_ids, ks), ks)
+                print(f"{'':<28} built in {build_seconds:.1f}s")
+                client.delete_collection(name)
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retrieval quality and latency benchmark for the news index")
+    parser.add_argument("--dataset", default="dataset.csv", help="Kaggle dataset used by load_data.py")
+    parser.add_argument("--pairs", default=None, help="CSV of query,doc_id pairs instead of generated ones")
+    parser.add_argument("--queries", type=int, default=500, help="generated query/document pairs")
+    parser.add_argument("--sizes", default="1000,5000,all", help="corpus sizes, 'all' for the whole dataset")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2", help="SentenceTransformer embedding model")
+    parser.add_argument("--m", type=int_list, default=[16], help="comma-separated hnsw:M values")
+    parser.add_argument("--ef-construction", type=int_list, default=[100], help="comma-separated hnsw:construction_ef values")
+    parser.add_argument("--ef-search", type=int_list, default=[10, 50, 100], help="comma-separated hnsw:search_ef values")
+    parser.add_argument("--k", type=int_list, default=[1, 5, 10], help="comma-separated cutoffs for recall@k")
+    parser.add_argument("--rerank", action="store_true", help="also report the cross-encoder reranker over exact candidates")
+    parser.add_argument("--rerank-candidates", type=int, default=30)
+    parser.add_argument("--cache-dir", default=".bench_cache", help="where corpus embeddings are cached")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    if args.cache_dir:
+        os.makedirs(args.cache_dir, exist_ok=True)
+    run(args)
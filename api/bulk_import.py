@@ -0,0 +1,379 @@
+"""
+Offline bulk import of a directory of PDF/DOCX/TXT documents.
+
+Usage:
+    python bulk_import.py ./filings --user-id analyst-1 --workers 8 --embed --analyze
+    python bulk_import.py --analysis-worker              # drain the analysis queue
+    python bulk_import.py --analysis-worker --once       # stop when the queue is empty
+
+Files are extracted across a process pool with the same extract_text and
+extract_financial_data used by /upload. The parent process stores them in GridFS
+and writes the document records in batches, so workers never share a database
+connection. Files whose sha256 is already stored for the user are skipped, which
+makes an interrupted import resumable by running the same command again.
+Extracted metrics are stored in financial_metrics as they are imported.
+
+With --embed the extracted text is split into overlapping chunks, embedded and
+added to the document_chunks collection for retrieval. With --analyze each
+document is queued in analysis_queue instead of being analysed inline; run one
+or more --analysis-worker processes to work through the queue.
+"""
+import os
+import io
+import time
+import hashlib
+import logging
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import BulkWriteError
+
+from documents import build_document_record, get_document_text
+from financial_metrics import build_metrics_record, metrics_upsert
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = {"pdf", "docx", "txt"}
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", "50"))
+CHUNK_CHARS = int(os.environ.get("IMPORT_CHUNK_CHARS", "1000"))
+CHUNK_OVERLAP = int(os.environ.get("IMPORT_CHUNK_OVERLAP", "200"))
+CHUNK_COLLECTION = "document_chunks"
+# A running analysis job is handed to another worker once its lease expires
+ANALYSIS_LEASE_SECONDS = int(os.environ.get("ANALYSIS_LEASE_SECONDS", "600"))
+ANALYSIS_MAX_ATTEMPTS = int(os.environ.get("ANALYSIS_MAX_ATTEMPTS", "3"))
+REPORT_EVERY = 50
+
+def find_files(directory, recursive=True):
+    """Supported files under a directory, in a stable order"""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.rsplit(".", 1)[-1].lower() in SUPPORTED_EXTENSIONS:
+                paths.append(os.path.join(root, name))
+        if not recursive:
+            break
+    return paths
+
+def file_sha256(path):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+def process_file(path):
+    """Extract one file in a worker process; returns a picklable result"""
+    # Imported here so the parent does not load the PDF/DOCX libraries it never uses
+    from upload import extract_text, extract_financial_data
+
+    filename = os.path.basename(path)
+    result = {"path": path, "filename": filename, "size": os.path.getsize(path)}
+    try:
+        with open(path, "rb") as f:
+            stats = {}
+            text = extract_text(io.BytesIO(f.read()), filename.rsplit(".", 1)[-1].lower(), stats)
+        if not text or not text.strip():
+            result["error"] = "No text could be extracted"
+            return result
+        result.update({
+            "text": text,
+            "page_count": stats.get("page_count"),
+            "financial_data": extract_financial_data(text)
+        })
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+def chunk_text(text, size=CHUNK_CHARS, overlap=CHUNK_OVERLAP):
+    """Overlapping chunks of about `size` characters, broken at line or word boundaries when possible"""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + size)
+        if end < len(text):
+            cut = max(text.rfind("\n", start + size // 2, end), text.rfind(" ", start + size // 2, end))
+            if cut > start:
+                end = cut
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+def ensure_queue_indexes(queue_collection):
+    queue_collection.create_index([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created")
+    queue_collection.create_index("document_id", unique=True, name="document_id")
+
+class BulkImporter:
+    """Writes extracted files to GridFS, documents, chunks and the analysis queue in batches"""
+
+    def __init__(self, fs, document_collection, user_id, queue_collection=None,
+                 chunk_collection=None, embed_model=None, metrics_collection=None, batch_size=IMPORT_BATCH_SIZE):
+        self.fs = fs
+        self.document_collection = document_collection
+        self.metrics_collection = metrics_collection
+        self.user_id = user_id
+        self.queue_collection = queue_collection
+        self.chunk_collection = chunk_collection
+        self.embed_model = embed_model
+        self.batch_size = batch_size
+        self.pending = []
+        self.counts = {"imported": 0, "skipped": 0, "failed": 0, "chunks": 0, "queued": 0}
+        self.bytes = 0
+
+    def known_hashes(self):
+        """sha256 of every document the user already has"""
+        return set(self.document_collection.distinct("sha256", {"user_id": self.user_id}))
+
+    def add(self, result, sha256):
+        self.bytes += result["size"]
+        if "error" in result:
+            self.counts["failed"] += 1
+            logger.error(f"Failed to import {result['path']}: {result['error']}")
+            return
+        result["sha256"] = sha256
+        self.pending.append(result)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        records = []
+        for result in batch:
+            with open(result["path"], "rb") as f:
+                gridfs_id = self.fs.put(f, filename=result["filename"], metadata={
+                    "user_id": self.user_id, "sha256": result["sha256"], "source": "bulk_import"
+                })
+            record = build_document_record(
+                result["filename"],
+                self.user_id,
+                gridfs_id,
+                result["text"],
+                sha256=result["sha256"],
+                page_count=result["page_count"],
+                size_bytes=result["size"]
+            )
+            record["financial_data"] = result["financial_data"]
+            record["source_path"] = result["path"]
+            records.append(record)
+
+        self.document_collection.insert_many(records, ordered=False)
+        self.counts["imported"] += len(records)
+        if self.metrics_collection is not None:
+            self.metrics_collection.bulk_write(
+                [metrics_upsert(build_metrics_record(record, record["financial_data"], record["text"])) for record in records],
+                ordered=False
+            )
+        if self.chunk_collection is not None:
+            self._index_chunks(records)
+        if self.queue_collection is not None:
+            self._queue_analysis(records)
+
+    def _index_chunks(self, records):
+        ids, texts, metadatas = [], [], []
+        for record in records:
+            for i, chunk in enumerate(chunk_text(record["text"])):
+                ids.append(f"{record['document_id']}-{i}")
+                texts.append(chunk)
+                metadatas.append({
+                    "user_id": self.user_id,
+                    "document_id": record["document_id"],
+                    "filename": record["filename"],
+                    "chunk": i
+                })
+        if not ids:
+            return
+        # One encode call per batch keeps the model busy with full mini-batches
+        embeddings = self.embed_model.encode(texts, batch_size=64).tolist()
+        step = 5000
+        for offset in range(0, len(ids), step):
+            self.chunk_collection.add(
+                ids=ids[offset:offset + step],
+                embeddings=embeddings[offset:offset + step],
+                documents=texts[offset:offset + step],
+                metadatas=metadatas[offset:offset + step]
+            )
+        self.counts["chunks"] += len(ids)
+
+    def _queue_analysis(self, records):
+        now = datetime.utcnow()
+        jobs = [{
+            "document_id": record["document_id"],
+            "user_id": self.user_id,
+            "filename": record["filename"],
+            "status": "pending",
+            "attempts": 0,
+            "created_at": now
+        } for record in records]
+        try:
+            self.queue_collection.insert_many(jobs, ordered=False)
+        except BulkWriteError as e:
+            # Already queued by an earlier run
+            logger.debug(f"Skipped {len(e.details.get('writeErrors', []))} queued analysis jobs")
+        self.counts["queued"] += len(jobs)
+
+def _report(importer, start, done, total):
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    logger.info(
+        f"{done}/{total} files, {importer.counts['imported']} imported, {importer.counts['skipped']} skipped, "
+        f"{importer.counts['failed']} failed - {done / elapsed:.1f} files/s, "
+        f"{importer.bytes / (1024 * 1024) / elapsed:.2f} MB/s"
+    )
+
+def run_import(importer, paths, workers=None):
+    """Extract files across a process pool and write them in batches; returns throughput stats"""
+    start = time.perf_counter()
+    seen = importer.known_hashes()
+    todo = []
+    for path in paths:
+        sha256 = file_sha256(path)
+        if sha256 in seen:
+            importer.counts["skipped"] += 1
+            continue
+        seen.add(sha256)
+        todo.append((path, sha256))
+    logger.info(f"{len(todo)} of {len(paths)} files to import, {importer.counts['skipped']} already stored")
+
+    workers = workers or os.cpu_count() or 1
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Bounded in flight so extracted texts don't pile up faster than they are written
+        queue = iter(todo)
+        running = {}
+        while True:
+            while len(running) < workers * 2:
+                item = next(queue, None)
+                if item is None:
+                    break
+                running[pool.submit(process_file, item[0])] = item[1]
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                importer.add(future.result(), running.pop(future))
+                done += 1
+                if done % REPORT_EVERY == 0:
+                    _report(importer, start, done, len(todo))
+    importer.flush()
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        **importer.counts,
+        "seconds": round(elapsed, 2),
+        "files_per_second": round(done / elapsed, 2) if elapsed else 0.0,
+        "mb_per_second": round(importer.bytes / (1024 * 1024) / elapsed, 2) if elapsed else 0.0
+    }
+    logger.info(f"Import finished: {stats}")
+    return stats
+
+def claim_analysis_job(queue_collection):
+    """Take the oldest pending job, or one whose worker's lease has expired"""
+    now = time.time()
+    return queue_collection.find_one_and_update(
+        {"$or": [
+            {"status": "pending"},
+            {"status": "running", "lease_expires": {"$lt": now}}
+        ], "attempts": {"$lt": ANALYSIS_MAX_ATTEMPTS}},
+        {"$set": {"status": "running", "lease_expires": now + ANALYSIS_LEASE_SECONDS}, "$inc": {"attempts": 1}},
+        sort=[("created_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+
+def run_analysis_worker(queue_collection, document_collection, once=False, poll_seconds=5):
+    """Analyse queued documents one at a time; returns the number analysed"""
+    from upload import analyze_financial_content
+
+    analysed = 0
+    while True:
+        job = claim_analysis_job(queue_collection)
+        if job is None:
+            if once:
+                break
+            time.sleep(poll_seconds)
+            continue
+
+        text = get_document_text(document_collection, job["user_id"], document_id=job["document_id"])
+        if not text:
+            queue_collection.update_one({"_id": job["_id"]}, {"$set": {"status": "failed", "error": "Document not found"}})
+            continue
+
+        analysis = analyze_financial_content(text)
+        if analysis.startswith(("Analysis Error", "❌ AI Processing Error")):
+            status = "failed" if job["attempts"] >= ANALYSIS_MAX_ATTEMPTS else "pending"
+            queue_collection.update_one({"_id": job["_id"]}, {"$set": {"status": status, "error": analysis}})
+            logger.error(f"Analysis of {job['filename']} failed (attempt {job['attempts']}): {analysis}")
+            continue
+
+        document_collection.update_one(
+            {"user_id": job["user_id"], "document_id": job["document_id"]},
+            {"$set": {"analysis": analysis, "analyzed_at": datetime.utcnow().isoformat()}}
+        )
+        queue_collection.update_one({"_id": job["_id"]}, {"$set": {"status": "done", "finished_at": datetime.utcnow()}})
+        analysed += 1
+        logger.info(f"Analysed {job['filename']} ({analysed} so far)")
+    return analysed
+
+if __name__ == "__main__":
+    import argparse
+    from pymongo import MongoClient
+    from gridfs import GridFS
+    from dotenv import load_dotenv
+    from documents import ensure_indexes
+    from financial_metrics import ensure_indexes as ensure_metrics_indexes
+
+    load_dotenv(".env.local")
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Bulk import documents into GridFS and the documents collection")
+    parser.add_argument("directory", nargs="?", help="directory of PDF/DOCX/TXT files")
+    parser.add_argument("--user-id", default="anonymous", help="owner of the imported documents")
+    parser.add_argument("--workers", type=int, default=None, help="extraction processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="documents per database write")
+    parser.add_argument("--no-recursive", action="store_true", help="only import the top-level directory")
+    parser.add_argument("--embed", action="store_true", help=f"chunk, embed and index into {CHUNK_COLLECTION}")
+    parser.add_argument("--analyze", action="store_true", help="queue LLM analysis of each imported document")
+    parser.add_argument("--analysis-worker", action="store_true", help="process the analysis queue instead of importing")
+    parser.add_argument("--once", action="store_true", help="with --analysis-worker, exit when the queue is empty")
+    args = parser.parse_args()
+
+    db = MongoClient(os.environ.get("MONGODB_URI", "mongodb://localhost:27017/finance_ai"))["finance_ai"]
+    document_collection = db["documents"]
+    queue_collection = db["analysis_queue"]
+    ensure_indexes(document_collection)
+    ensure_queue_indexes(queue_collection)
+    ensure_metrics_indexes(db["financial_metrics"])
+
+    if args.analysis_worker:
+        run_analysis_worker(queue_collection, document_collection, once=args.once)
+    elif not args.directory:
+        parser.error("a directory is required unless --analysis-worker is given")
+    else:
+        chunk_collection = embed_model = None
+        if args.embed:
+            import chromadb
+            from sentence_transformers import SentenceTransformer
+            from index_config import EMBEDDING_MODEL_NAME, get_news_collection
+
+            chunk_collection = get_news_collection(chromadb.PersistentClient(path="./chroma_db"), name=CHUNK_COLLECTION)
+            embed_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+        importer = BulkImporter(
+            GridFS(db, collection="uploads"),
+            document_collection,
+            args.user_id,
+            queue_collection=queue_collection if args.analyze else None,
+            chunk_collection=chunk_collection,
+            embed_model=embed_model,
+            metrics_collection=db["financial_metrics"],
+            batch_size=args.batch_size
+        )
+        stats = run_import(importer, find_files(args.directory, recursive=not args.no_recursive), workers=args.workers)
+        print(f"Imported {stats['imported']} files ({stats['skipped']} skipped, {stats['failed']} failed) in "
+              f"{stats['seconds']}s: {stats['files_per_second']} files/s, {stats['mb_per_second']} MB/s")
@@ -0,0 +1,176 @@
+import os
+import re
+import logging
+from functools import lru_cache
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+    logger.warning("tiktoken not installed, token counts will be estimated from character length")
+
+# Target models keyed by the names the API accepts.
+# Llama 3 and its DeepSeek distill use a 128k BPE vocabulary close to cl100k_base.
+MODEL_SPECS = {
+    "chatgpt": {"model": "gpt-4o-mini", "encoding": "o200k_base", "context_window": 128000},
+    "llama": {"model": "llama3-70b-8192", "encoding": "cl100k_base", "context_window": 8192},
+    "deepseek": {"model": "deepseek-r1-distill-llama-70b", "encoding": "cl100k_base", "context_window": 131072},
+}
+DEFAULT_MODEL = "chatgpt"
+
+# Budgets
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "2000"))
+MAX_COMPLETION_TOKENS = int(os.environ.get("MAX_COMPLETION_TOKENS", "800"))
+MIN_COMPLETION_TOKENS = 64
+DEDUP_SIMILARITY = float(os.environ.get("CONTEXT_DEDUP_SIMILARITY", "0.85"))
+
+CHARS_PER_TOKEN = 4
+
+@lru_cache(maxsize=None)
+def _get_encoding(name):
+    return tiktoken.get_encoding(name)
+
+def _spec(model):
+    return MODEL_SPECS.get((model or DEFAULT_MODEL).lower(), MODEL_SPECS[DEFAULT_MODEL])
+
+def count_tokens(text, model=DEFAULT_MODEL):
+    """Count tokens of text for the target model"""
+    if not text:
+        return 0
+    if tiktoken is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(_get_encoding(_spec(model)["encoding"]).encode(text, disallowed_special=()))
+
+def count_message_tokens(messages, model=DEFAULT_MODEL):
+    """Count tokens of a chat message list, including per-message framing overhead"""
+    return sum(count_tokens(m.get("content", ""), model) + 4 for m in messages) + 2
+
+def truncate_to_tokens(text, max_tokens, model=DEFAULT_MODEL):
+    """Hard-truncate text to at most max_tokens tokens"""
+    if max_tokens <= 0:
+        return ""
+    if tiktoken is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    encoding = _get_encoding(_spec(model)["encoding"])
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+
+def fit_text(text, max_tokens, model=DEFAULT_MODEL):
+    """
+    Shorten text to fit max_tokens by keeping its leading sentences
+    (an extractive lead summary), falling back to a hard cut mid-sentence.
+    """
+    if count_tokens(text, model) <= max_tokens:
+        return text
+
+    kept = []
+    used = 0
+    for sentence in _SENTENCE_SPLIT.split(text):
+        tokens = count_tokens(sentence, model) + 1
+        if used + tokens > max_tokens:
+            break
+        kept.append(sentence)
+        used += tokens
+
+    if kept:
+        return " ".join(kept) + " ..."
+    return truncate_to_tokens(text, max_tokens, model) + "..."
+
+def _shingles(text, size=3):
+    words = re.findall(r'\w+', text.lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def dedupe_documents(docs, text_key="detailed_summary", threshold=None):
+    """
+    Drop retrieved documents whose text is a near-duplicate (word 3-gram Jaccard
+    similarity above the threshold) of a higher-ranked document.
+    """
+    threshold = threshold if threshold is not None else DEDUP_SIMILARITY
+    kept = []
+    kept_shingles = []
+    for doc in docs:
+        shingles = _shingles(doc.get(text_key) or "")
+        duplicate = False
+        for other in kept_shingles:
+            if not shingles and not other:
+                duplicate = True
+                break
+            union = len(shingles | other)
+            if union and len(shingles & other) / union >= threshold:
+                duplicate = True
+                break
+        if duplicate:
+            continue
+        kept.append(doc)
+        kept_shingles.append(shingles)
+
+    if len(kept) < len(docs):
+        logger.info(f"Dropped {len(docs) - len(kept)} near-duplicate documents from context")
+    return kept
+
+def build_news_context(docs, model=DEFAULT_MODEL, budget=None):
+    """
+    Assemble retrieved news documents into a context block that fits the token budget.
+    The budget is shared in rank order: each document gets an equal share of what is
+    left, and anything a short document doesn't use rolls over to the next ones.
+
+    Returns (context, stats).
+    """
+    budget = budget if budget is not None else CONTEXT_TOKEN_BUDGET
+    docs = dedupe_documents(docs)
+
+    blocks = []
+    used = 0
+    truncated = 0
+    for i, doc in enumerate(docs):
+        header = (
+            f"DOCUMENT {i+1}:\n"
+            f"Date: {doc.get('date', 'N/A')}\n"
+            f"Source: {doc.get('source', 'Unknown')}\n"
+            f"Region: {doc.get('region', 'Global')}\n"
+            f"Content: "
+        )
+        share = (budget - used) // (len(docs) - i) - count_tokens(header, model)
+        if share <= 0:
+            break
+        content = doc.get('detailed_summary', '') or ''
+        fitted = fit_text(content, share, model)
+        if fitted is not content:
+            truncated += 1
+        block = header + fitted
+        blocks.append(block)
+        used += count_tokens(block, model)
+
+    stats = {"documents": len(blocks), "truncated": truncated, "context_tokens": used}
+    return "\n\n".join(blocks), stats
+
+def build_document_context(document_name, document_text, model=DEFAULT_MODEL, budget=None):
+    """Fit an uploaded document's text into the token budget"""
+    budget = budget if budget is not None else CONTEXT_TOKEN_BUDGET
+    return f"DOCUMENT: {document_name}\n\nContent: {fit_text(document_text, budget, model)}"
+
+def completion_budget(model, prompt_tokens):
+    """max_tokens for the completion, bounded by what is left of the model's context window"""
+    remaining = _spec(model)["context_window"] - prompt_tokens
+    return max(MIN_COMPLETION_TOKENS, min(MAX_COMPLETION_TOKENS, remaining))
+
+def log_token_usage(model, prompt_tokens, usage=None):
+    """
+    Log prompt and completion token counts for an LLM call.
+    Provider-reported usage is preferred over the local estimate when available.
+    """
+    usage = usage or {}
+    logger.info(
+        f"Token usage for {_spec(model)['model']}: "
+        f"prompt={usage.get('prompt_tokens', prompt_tokens)} (estimated {prompt_tokens}), "
+        f"completion={usage.get('completion_tokens', 'unknown')}"
+    )
@@ -0,0 +1,180 @@
+"""
+Conversation memory for multi-turn chats.
+
+A follow-up /ask with a chatId is answered with the session's context: a running
+summary of older turns plus as many recent messages as fit in
+MEMORY_TOKEN_BUDGET. After each turn, messages that have left the recent
+window are folded into the summary in the background, a few at a time, so
+the summary is updated incrementally instead of being rebuilt from the whole
+transcript. The prompt therefore stays bounded however long the chat gets.
+
+Session documents in chat_history gain three fields:
+    summary            running summary of the older turns
+    summarized_count   number of leading messages covered by the summary
+    message_count      number of messages, updated with each append so it can
+                       be read without loading the messages
+"""
+import os
+import logging
+import threading
+from datetime import datetime
+
+from context_builder import count_tokens, fit_text
+from llm_router import complete as llm_complete, ProviderError
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MEMORY_ENABLED = os.environ.get("MEMORY_ENABLED", "true").lower() == "true"
+# Tokens for the summary and recent messages together
+MEMORY_TOKEN_BUDGET = int(os.environ.get("MEMORY_TOKEN_BUDGET", "1200"))
+MEMORY_SUMMARY_TOKENS = int(os.environ.get("MEMORY_SUMMARY_TOKENS", "300"))
+# A single long answer is shortened so it cannot take the whole budget
+MEMORY_MESSAGE_TOKENS = int(os.environ.get("MEMORY_MESSAGE_TOKENS", "250"))
+# Messages kept verbatim; older ones are only represented by the summary
+MEMORY_RECENT_MESSAGES = int(os.environ.get("MEMORY_RECENT_MESSAGES", "6"))
+# Summarize once this many messages have left the recent window
+MEMORY_SUMMARIZE_BATCH = int(os.environ.get("MEMORY_SUMMARIZE_BATCH", "4"))
+# Upper bound per summary call, so catching up on a long chat takes several small calls
+MEMORY_SUMMARIZE_MAX = 20
+MEMORY_ROUTE = os.environ.get("MEMORY_ROUTE", "chatgpt")
+
+SUMMARY_SYSTEM_MESSAGE = """You maintain a running summary of a conversation between a user and a financial insights assistant.
+Update the summary with the new messages. Keep the assets, companies, regions, figures and dates discussed,
+the user's goals and any conclusions reached. Drop pleasantries and formatting. Write plain sentences, no preamble."""
+
+def session_projection():
+    """Fields needed to build the memory of a session, without its full transcript"""
+    return {
+        "_id": 0, "id": 1, "summary": 1, "summarized_count": 1, "message_count": 1,
+        "messages": {"$slice": -MEMORY_RECENT_MESSAGES}
+    }
+
+def load_session(chat_collection, chat_id, user_id):
+    """A user's session with its most recent messages, or None"""
+    if not chat_id:
+        return None
+    return chat_collection.find_one({"id": chat_id, "userId": user_id}, session_projection())
+
+def build_memory(session, model, budget=None):
+    """
+    Chat messages carrying the conversation so far: the running summary and
+    the most recent messages that fit in the budget, oldest first.
+    Returns (messages, stats).
+    """
+    budget = budget if budget is not None else MEMORY_TOKEN_BUDGET
+    messages, used = [], 0
+    if not session:
+        return messages, {"summary_tokens": 0, "recent_messages": 0, "memory_tokens": 0}
+
+    summary = session.get("summary")
+    summary_tokens = 0
+    if summary:
+        summary = fit_text(summary, MEMORY_SUMMARY_TOKENS, model)
+        summary_tokens = count_tokens(summary, model) + 4
+        used += summary_tokens
+
+    # Newest first until the budget is spent, never reaching back into summarized messages
+    total = session.get("message_count") or len(session.get("messages", []))
+    recent = session.get("messages", [])
+    first_index = total - len(recent)
+    kept = []
+    for offset in range(len(recent) - 1, -1, -1):
+        if first_index + offset < session.get("summarized_count", 0):
+            break
+        message = recent[offset]
+        content = fit_text(message.get("content", ""), MEMORY_MESSAGE_TOKENS, model)
+        tokens = count_tokens(content, model) + 4
+        if used + tokens > budget:
+            break
+        kept.append({"role": message.get("role", "user"), "content": content})
+        used += tokens
+    kept.reverse()
+
+    # Chat APIs expect user/assistant alternation to start with the user
+    while kept and kept[0]["role"] != "user":
+        used -= count_tokens(kept[0]["content"], model) + 4
+        kept.pop(0)
+
+    if summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation: {summary}"})
+    messages.extend(kept)
+    return messages, {"summary_tokens": summary_tokens, "recent_messages": len(kept), "memory_tokens": used}
+
+def _format_transcript(messages):
+    return "\n".join(f"{m.get('role', 'user').upper()}: {m.get('content', '')}" for m in messages)
+
+def summarize(previous_summary, new_messages, model=None):
+    """Fold new messages into the running summary with one LLM call"""
+    model = model or MEMORY_ROUTE
+    transcript = fit_text(_format_transcript(new_messages), MEMORY_MESSAGE_TOKENS * len(new_messages), model)
+    result = llm_complete(
+        model,
+        [
+            {"role": "system", "content": SUMMARY_SYSTEM_MESSAGE},
+            {"role": "user", "content": (
+                f"CURRENT SUMMARY:\n{previous_summary or '(none yet)'}\n\n"
+                f"NEW MESSAGES:\n{transcript}\n\n"
+                f"Write the updated summary in at most {MEMORY_SUMMARY_TOKENS * 3 // 4} words."
+            )}
+        ],
+        max_tokens=MEMORY_SUMMARY_TOKENS,
+        temperature=0.2
+    )
+    return fit_text(result.text.strip(), MEMORY_SUMMARY_TOKENS, model)
+
+def update_summary(chat_collection, chat_id):
+    """
+    Fold the messages that have left the recent window into the summary.
+    The write is conditional on summarized_count, so concurrent updates of the
+    same session cannot overwrite each other. Returns True when updated.
+    """
+    session = chat_collection.find_one({"id": chat_id}, {"_id": 0, "summary": 1, "summarized_count": 1, "message_count": 1})
+    if session is None:
+        return False
+    done = session.get("summarized_count", 0)
+    total = session.get("message_count")
+    if total is None:
+        sizes = list(chat_collection.aggregate([
+            {"$match": {"id": chat_id}},
+            {"$project": {"_id": 0, "size": {"$size": {"$ifNull": ["$messages", []]}}}}
+        ]))
+        total = sizes[0]["size"] if sizes else 0
+    available = total - MEMORY_RECENT_MESSAGES - done
+    if available < MEMORY_SUMMARIZE_BATCH:
+        return False
+
+    # Fetch only the messages to fold in, not the whole transcript
+    window = chat_collection.find_one(
+        {"id": chat_id},
+        {"_id": 0, "messages": {"$slice": [done, min(available, MEMORY_SUMMARIZE_MAX)]}}
+    )
+    pending = (window or {}).get("messages", [])
+    if len(pending) < MEMORY_SUMMARIZE_BATCH:
+        return False
+
+    summary = summarize(session.get("summary"), pending)
+    result = chat_collection.update_one(
+        {"id": chat_id, "summarized_count": session.get("summarized_count")},
+        {"$set": {"summary": summary, "summarized_count": done + len(pending), "summaryUpdatedAt": datetime.utcnow().isoformat()}}
+    )
+    logger.info(f"Summarized {len(pending)} messages of chat {chat_id} ({count_tokens(summary)} tokens)")
+    return result.modified_count == 1
+
+def needs_summary(session, added=2):
+    """Whether a session will have enough messages outside the recent window after adding `added`"""
+    if not session:
+        return False
+    total = (session.get("message_count") or len(session.get("messages", []))) + added
+    return total - MEMORY_RECENT_MESSAGES - session.get("summarized_count", 0) >= MEMORY_SUMMARIZE_BATCH
+
+def update_summary_async(chat_collection, chat_id):
+    def run():
+        try:
+            update_summary(chat_collection, chat_id)
+        except ProviderError as e:
+            logger.warning(f"Could not summarize chat {chat_id}: {str(e)}")
+        except Exception as e:
+            logger.error(f"Summary update failed for chat {chat_id}: {str(e)}")
+
+    threading.Thread(target=run, name="chat-summary", daemon=True).start()
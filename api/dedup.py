@@ -0,0 +1,127 @@
+import os
+import re
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Near-duplicate detection configuration
+DEDUP_ENABLED = os.environ.get("DEDUP_ENABLED", "true").lower() == "true"
+# Maximum Hamming distance between 64-bit SimHash fingerprints to count as the same story.
+# The index splits fingerprints into 4 bands of 16 bits, which finds every match up to 3 bits.
+DEDUP_MAX_DISTANCE = min(int(os.environ.get("DEDUP_MAX_DISTANCE", "3")), 3)
+# Only compare against stories ingested in the last few days
+DEDUP_WINDOW_DAYS = int(os.environ.get("DEDUP_WINDOW_DAYS", "7"))
+DEDUP_MAX_ITEMS = int(os.environ.get("DEDUP_MAX_ITEMS", "50000"))
+
+SIMHASH_BITS = 64
+BANDS = 4
+BAND_BITS = SIMHASH_BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+def _features(text):
+    """Word bigrams of the normalized text"""
+    words = re.findall(r'\w+', (text or "").lower())
+    if len(words) < 2:
+        return words
+    return [f"{words[i]} {words[i + 1]}" for i in range(len(words) - 1)]
+
+def simhash(text):
+    """64-bit SimHash fingerprint of a text"""
+    weights = [0] * SIMHASH_BITS
+    for feature in _features(text):
+        h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+def article_fingerprint(article):
+    """Fingerprint of a news article's title and description"""
+    return simhash(f"{article.get('title', '') or ''} {article.get('description', '') or ''}")
+
+class NearDuplicateIndex:
+    """
+    In-memory index of recent SimHash fingerprints.
+    Each fingerprint is bucketed by its 4 bands; two fingerprints within 3 bits
+    of each other must share at least one band, so only those buckets are scanned.
+    Oldest entries are evicted once max_items is reached.
+    """
+
+    def __init__(self, max_distance=DEDUP_MAX_DISTANCE, max_items=DEDUP_MAX_ITEMS):
+        self.max_distance = max_distance
+        self.max_items = max_items
+        self.items = OrderedDict()
+        self.bands = [{} for _ in range(BANDS)]
+
+    def __len__(self):
+        return len(self.items)
+
+    def _band_keys(self, fingerprint):
+        return [(fingerprint >> (i * BAND_BITS)) & BAND_MASK for i in range(BANDS)]
+
+    def add(self, doc_id, fingerprint, location=None):
+        """Register a canonical document; location is any value the caller needs to find it again"""
+        if doc_id in self.items:
+            return
+        self.items[doc_id] = (fingerprint, location)
+        for band, key in zip(self.bands, self._band_keys(fingerprint)):
+            band.setdefault(key, set()).add(doc_id)
+
+        while len(self.items) > self.max_items:
+            old_id, (old_fingerprint, _) = self.items.popitem(last=False)
+            for band, key in zip(self.bands, self._band_keys(old_fingerprint)):
+                band.get(key, set()).discard(old_id)
+
+    def find(self, fingerprint):
+        """Return (doc_id, location) of the closest near-duplicate, or None"""
+        best = None
+        best_distance = self.max_distance + 1
+        for band, key in zip(self.bands, self._band_keys(fingerprint)):
+            for doc_id in band.get(key, ()):
+                distance = hamming_distance(fingerprint, self.items[doc_id][0])
+                if distance < best_distance:
+                    best, best_distance = doc_id, distance
+        if best is None:
+            return None
+        return best, self.items[best][1]
+
+def load_recent_fingerprints(index, collections, window_days=DEDUP_WINDOW_DAYS):
+    """
+    Seed the index from documents ingested in the last window_days.
+    `collections` maps a location (e.g. region) to a ChromaDB collection.
+    """
+    since = int(time.time()) - window_days * 86400
+    for location, collection in collections.items():
+        batch = collection.get(where={"timestamp": {"$gte": since}}, include=["metadatas"])
+        for doc_id, metadata in zip(batch.get("ids", []), batch.get("metadatas", [])):
+            if metadata and metadata.get("simhash"):
+                index.add(doc_id, int(metadata["simhash"], 16), location)
+    logger.info(f"Loaded {len(index)} recent fingerprints for near-duplicate detection")
+
+def merge_source(metadata, source, url):
+    """Metadata of a canonical document with one more syndicated source attached"""
+    sources = [s for s in (metadata.get("sources") or metadata.get("source", "")).split(", ") if s]
+    urls = [u for u in (metadata.get("source_urls") or metadata.get("url", "")).split(" ") if u]
+    if url and url in urls:
+        return None
+    if source and source not in sources:
+        sources.append(source)
+    if url:
+        urls.append(url)
+    return {
+        **metadata,
+        "sources": ", ".join(sources),
+        "source_urls": " ".join(urls),
+        "source_count": int(metadata.get("source_count", 1)) + 1
+    }
@@ -0,0 +1,274 @@
+"""
+Precomputed market digests per region and topic.
+
+A refresh job summarises the most relevant recently ingested news for every
+(region, topic) pair and stores the result in the market_digests collection
+with the time it was generated. Generic questions such as "what's happening in
+gold today" are answered from a fresh digest instead of a full RAG and LLM
+round-trip; specific questions still take the full path.
+
+Usage:
+    python digests.py                       # refresh every digest once (cron)
+    python digests.py --region Europe --topic oil
+
+Set DIGEST_SCHEDULER_ENABLED=true to refresh from a background thread inside
+the API instead; a lease in the collection keeps multiple workers from
+refreshing at the same time.
+"""
+import os
+import re
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from region_index import REGIONS, DEFAULT_REGION, query_news
+from region_classifier import REGION_KEYWORDS, classify_region
+from news_dates import build_date_filter
+from context_builder import build_news_context
+from llm_router import complete as llm_complete
+from tracing import span
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DIGESTS_ENABLED = os.environ.get("DIGESTS_ENABLED", "true").lower() == "true"
+# Digests older than this are not served
+DIGEST_MAX_AGE_MINUTES = float(os.environ.get("DIGEST_MAX_AGE_MINUTES", "120"))
+# How far back news is considered when building a digest
+DIGEST_LOOKBACK_HOURS = float(os.environ.get("DIGEST_LOOKBACK_HOURS", "24"))
+DIGEST_MAX_DOCS = int(os.environ.get("DIGEST_MAX_DOCS", "8"))
+DIGEST_ROUTE = os.environ.get("DIGEST_ROUTE", "chatgpt")
+DIGEST_SCHEDULER_ENABLED = os.environ.get("DIGEST_SCHEDULER_ENABLED", "false").lower() == "true"
+DIGEST_REFRESH_MINUTES = float(os.environ.get("DIGEST_REFRESH_MINUTES", "60"))
+
+# Topic -> (retrieval query, keywords that identify the topic in a question)
+TOPICS = {
+    "gold": ("gold and precious metals prices", ["gold", "silver", "precious metals?", "bullion"]),
+    "oil": ("oil and energy prices, OPEC and supply", ["oil", "crude", "brent", "wti", "opec", "energy", "natural gas"]),
+    "stocks": ("stock market indices and equities", ["stocks?", "equit(?:y|ies)", "shares", "stock market", "indices", "index"]),
+    "crypto": ("cryptocurrency market, bitcoin and ethereum", ["crypto(?:currency|currencies)?", "bitcoin", "btc", "ethereum", "eth"]),
+    "currencies": ("currency exchange rates and the dollar", ["currenc(?:y|ies)", "forex", "fx", "dollar", "euro", "yen", "exchange rates?"]),
+    "rates": ("central bank interest rates and bond yields", ["interest rates?", "rates", "bonds?", "yields?", "treasur(?:y|ies)", "central banks?", "fed"]),
+    "inflation": ("inflation and consumer prices", ["inflation", "cpi", "consumer prices"]),
+    "markets": ("overall financial markets and economy", ["markets?", "economy", "finance", "financial news"]),
+}
+
+_TOPIC_PATTERNS = {
+    topic: re.compile(r"\b(?:" + "|".join(keywords) + r")\b", re.IGNORECASE)
+    for topic, (_, keywords) in TOPICS.items()
+}
+
+# Phrasing of broad "what's going on" questions
+_GENERIC_PATTERNS = re.compile(
+    r"\b(?:what'?s|what is|whats)\s+(?:happening|going on|new|up|the latest)\b"
+    r"|\b(?:latest|today'?s|recent|current)\b.*\b(?:news|updates?|developments|headlines|moves?)\b"
+    r"|\bhow (?:is|are)\b.*\b(?:doing|performing|moving|trading)\b"
+    r"|\b(?:overview|summary|recap|update|news)\s+(?:on|of|for|about)\b"
+    r"|\b(?:news|update|updates|headlines)\b\s*\??$",
+    re.IGNORECASE
+)
+
+# Anything that makes a question specific enough to need the full path:
+# numbers, dates, analysis verbs, ticker-like upper-case words and proper names
+_SPECIFIC_PATTERNS = re.compile(
+    r"\d|\b(?:why|should|compare|versus|vs|predict|forecast|target|explain|analy[sz]e|impact of|effect of|between)\b",
+    re.IGNORECASE
+)
+_TICKER_PATTERN = re.compile(r"\b[A-Z]{2,5}\b")
+KNOWN_ACRONYMS = {"US", "USA", "UK", "EU", "FX", "CPI", "BTC", "ETH", "WTI", "OPEC", "FED", "ECB", "UAE", "GCC", "GDP"}
+
+# Capitalized words that don't name a company: places, topics and calendar words.
+# Any other capitalized word inside a sentence ("Tesla", "Nvidia") makes a question specific.
+_PLACE_NAMES = REGIONS + [keyword for keywords in REGION_KEYWORDS.values() for keyword in keywords]
+KNOWN_CAPITALIZED = (
+    {word.lower().rstrip(".") for name in _PLACE_NAMES for word in name.split()}
+    | {"i", "today", "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+       "january", "february", "march", "april", "may", "june", "july", "august", "september",
+       "october", "november", "december"}
+)
+_TOPIC_WORD_PATTERN = re.compile(
+    "(?:" + "|".join(keyword for _, keywords in TOPICS.values() for keyword in keywords) + ")",
+    re.IGNORECASE
+)
+
+GENERIC_MAX_WORDS = 14
+
+def _names_in_sentences(text):
+    """Capitalized words that don't start a sentence and aren't known place, topic or calendar words"""
+    names = []
+    sentence_start = True
+    for token in text.split():
+        word = re.sub(r"(?:'s|’s)$", "", token.strip("\"'“”‘’()[],;:!?."))
+        if (word and word[0].isupper() and not sentence_start
+                and word.lower().rstrip(".") not in KNOWN_CAPITALIZED
+                and word.upper() not in KNOWN_ACRONYMS
+                and not _TOPIC_WORD_PATTERN.fullmatch(word)):
+            names.append(word)
+        sentence_start = token.endswith((".", "!", "?"))
+    return names
+
+def classify_generic_query(prompt, region="Global"):
+    """The digest topic for a generic market question, or None when the question needs the full path"""
+    text = (prompt or "").strip()
+    if not text or len(text.split()) > GENERIC_MAX_WORDS:
+        return None
+    if _SPECIFIC_PATTERNS.search(text) or not _GENERIC_PATTERNS.search(text):
+        return None
+    if any(word not in KNOWN_ACRONYMS for word in _TICKER_PATTERN.findall(text)):
+        return None
+    # Company and other proper names ("Tesla", "Nvidia") need the full path
+    if _names_in_sentences(text):
+        return None
+    # A question about another place than the selected region is not answered by its digest
+    if classify_region(text) not in (DEFAULT_REGION, region or DEFAULT_REGION):
+        return None
+    for topic, pattern in _TOPIC_PATTERNS.items():
+        if pattern.search(text):
+            return topic
+    return None
+
+def digest_id(region, topic):
+    return f"{region}:{topic}"
+
+def get_fresh_digest(digest_collection, region, topic, max_age_minutes=None):
+    """The stored digest for a region and topic if it is fresh enough, else None"""
+    max_age = (max_age_minutes if max_age_minutes is not None else DIGEST_MAX_AGE_MINUTES) * 60
+    return digest_collection.find_one({
+        "_id": digest_id(region or "Global", topic),
+        "generated_at": {"$gte": time.time() - max_age}
+    })
+
+def format_digest(digest):
+    """Digest text as served to the user, with its freshness"""
+    updated = datetime.fromtimestamp(digest["generated_at"], tz=timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+    return f"{digest['summary']}\n\n_Market digest updated {updated}._"
+
+def build_digest(chroma_client, collection, embed_model, region, topic, now=None):
+    """Summarise recent news for a region and topic; returns the digest document or None"""
+    now = now or time.time()
+    query, _ = TOPICS[topic]
+    with span("embed"):
+        query_embedding = embed_model.encode(query).tolist()
+    with span("retrieve"):
+        results = query_news(
+            chroma_client,
+            collection,
+            query_embeddings=[query_embedding],
+            n_results=DIGEST_MAX_DOCS,
+            region=region,
+            where=build_date_filter(now - DIGEST_LOOKBACK_HOURS * 3600, None)
+        )
+    docs = [doc for doc in (results.get("metadatas") or [[]])[0] if doc]
+    if not docs:
+        return None
+
+    context, _ = build_news_context(docs, DIGEST_ROUTE)
+    scope = "global markets" if region == "Global" else f"the {region} region"
+    messages = [
+        {"role": "system", "content": (
+            "You are a financial news editor writing a short market digest. "
+            "Use only the provided news. Use markdown bullet points (\"- Point\"), "
+            "bold key figures with **bold**, and do not mention the documents or this prompt."
+        )},
+        {"role": "user", "content": (
+            f"Write a digest of the latest {topic} news for {scope} in at most 6 bullet points, "
+            f"followed by a one-sentence takeaway.\n\nNEWS:\n{context}"
+        )}
+    ]
+    with span("llm_call"):
+        result = llm_complete(DIGEST_ROUTE, messages, max_tokens=500, temperature=0.3)
+
+    return {
+        "_id": digest_id(region, topic),
+        "region": region,
+        "topic": topic,
+        "summary": result.text.strip(),
+        "sources": [doc.get("title") or doc.get("subject") or "" for doc in docs],
+        "document_count": len(docs),
+        "model": f"{result.provider}/{result.model}",
+        "generated_at": now
+    }
+
+def refresh_digests(digest_collection, chroma_client, collection, embed_model, regions=None, topics=None):
+    """Rebuild the digests for every region and topic; returns the number stored"""
+    start = time.perf_counter()
+    stored = 0
+    for region in regions or REGIONS:
+        for topic in topics or TOPICS:
+            try:
+                digest = build_digest(chroma_client, collection, embed_model, region, topic)
+            except Exception as e:
+                logger.error(f"Digest {region}/{topic} failed: {str(e)}")
+                continue
+            if digest is None:
+                logger.debug(f"No recent news for digest {region}/{topic}")
+                continue
+            digest_collection.replace_one({"_id": digest["_id"]}, digest, upsert=True)
+            stored += 1
+    logger.info(f"Refreshed {stored} market digests in {time.perf_counter() - start:.1f}s")
+    return stored
+
+def _acquire_lease(digest_collection, owner, seconds):
+    """Take the refresh lease unless another worker holds an unexpired one"""
+    now = time.time()
+    try:
+        lease = digest_collection.find_one_and_update(
+            {"_id": "__refresh_lease", "$or": [{"expires_at": {"$lt": now}}, {"owner": owner}]},
+            {"$set": {"owner": owner, "expires_at": now + seconds}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # The lease exists and belongs to someone else
+        return False
+    return lease is not None and lease.get("owner") == owner
+
+def start_scheduler(digest_collection, chroma_client, collection, embed_model, interval_minutes=None):
+    """Refresh digests periodically from a daemon thread"""
+    interval = (interval_minutes or DIGEST_REFRESH_MINUTES) * 60
+    owner = f"{os.getpid()}-{threading.get_ident()}"
+
+    def loop():
+        while True:
+            try:
+                if _acquire_lease(digest_collection, owner, interval * 0.9):
+                    refresh_digests(digest_collection, chroma_client, collection, embed_model)
+            except Exception as e:
+                logger.error(f"Digest refresh failed: {str(e)}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=loop, name="digest-refresh", daemon=True)
+    thread.start()
+    logger.info(f"Digest refresh scheduled every {interval / 60:.0f} minutes")
+    return thread
+
+if __name__ == "__main__":
+    import argparse
+    import chromadb
+    from pymongo import MongoClient
+    from dotenv import load_dotenv
+    from sentence_transformers import SentenceTransformer
+    from index_config import EMBEDDING_MODEL_NAME, get_news_collection
+
+    load_dotenv(".env.local")
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Refresh precomputed market digests")
+    parser.add_argument("--region", action="append", choices=REGIONS, help="limit to these regions")
+    parser.add_argument("--topic", action="append", choices=list(TOPICS), help="limit to these topics")
+    args = parser.parse_args()
+
+    mongo = MongoClient(os.environ.get("MONGODB_URI", "mongodb://localhost:27017/finance_ai"))
+    chroma_client = chromadb.PersistentClient(path="./chroma_db")
+    refresh_digests(
+        mongo["finance_ai"]["market_digests"],
+        chroma_client,
+        get_news_collection(chroma_client),
+        SentenceTransformer(EMBEDDING_MODEL_NAME),
+        regions=args.region,
+        topics=args.topic
+    )
@@ -0,0 +1,120 @@
+import uuid
+import hashlib
+import logging
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+PREVIEW_CHARS = 500
+
+# Everything but the extracted text, which can be megabytes
+SUMMARY_PROJECTION = {"_id": 0, "text": 0}
+TEXT_PROJECTION = {"_id": 0, "text": 1, "filename": 1, "document_id": 1}
+
+def ensure_indexes(document_collection):
+    """Indexes for per-user lookups by document id and by filename (latest upload first)"""
+    document_collection.create_index(
+        [("user_id", ASCENDING), ("document_id", ASCENDING)],
+        unique=True,
+        partialFilterExpression={"document_id": {"$exists": True}},
+        name="user_document"
+    )
+    document_collection.create_index(
+        [("user_id", ASCENDING), ("filename", ASCENDING), ("upload_date", DESCENDING)],
+        name="user_filename_date"
+    )
+    document_collection.create_index([("user_id", ASCENDING), ("sha256", ASCENDING)], name="user_sha256")
+
+def sha256_hex(data):
+    return hashlib.sha256(data).hexdigest()
+
+def build_document_record(filename, user_id, gridfs_id, text, sha256=None, page_count=None, size_bytes=None):
+    """Document record with the fields the API serves precomputed at upload time"""
+    return {
+        "document_id": uuid.uuid4().hex,
+        "user_id": user_id,
+        "filename": filename,
+        "gridfs_id": str(gridfs_id),
+        "text": text,
+        "preview": text[:PREVIEW_CHARS],
+        "text_length": len(text),
+        "page_count": page_count,
+        "sha256": sha256,
+        "size_bytes": size_bytes,
+        "upload_date": datetime.utcnow().isoformat()
+    }
+
+def _lookup(user_id, document_id=None, filename=None):
+    query = {"user_id": user_id}
+    if document_id:
+        query["document_id"] = document_id
+    else:
+        query["filename"] = filename
+    return query
+
+def _find_latest(document_collection, query, projection):
+    docs = list(document_collection.find(query, projection).sort("upload_date", DESCENDING).limit(1))
+    return docs[0] if docs else None
+
+def _backfill(document_collection, query):
+    """Compute the summary fields of a record stored before they existed"""
+    doc = _find_latest(document_collection, query, {"text": 1, "document_id": 1})
+    if not doc:
+        return None
+    text = doc.get("text") or ""
+    fields = {"preview": text[:PREVIEW_CHARS], "text_length": len(text)}
+    if not doc.get("document_id"):
+        fields["document_id"] = uuid.uuid4().hex
+    document_collection.update_one({"_id": doc["_id"]}, {"$set": fields})
+    logger.info(f"Backfilled document summary fields for {query}")
+    return fields
+
+def find_document(document_collection, user_id, document_id=None, filename=None):
+    """A user's document record without its text, by id or by filename (latest upload wins)"""
+    query = _lookup(user_id, document_id, filename)
+    doc = _find_latest(document_collection, query, SUMMARY_PROJECTION)
+    if doc is not None and "preview" not in doc:
+        doc.update(_backfill(document_collection, query) or {})
+    return doc
+
+def get_document_text(document_collection, user_id, document_id=None, filename=None):
+    """Full extracted text of a user's document, only fetched when a prompt needs it"""
+    doc = _find_latest(document_collection, _lookup(user_id, document_id, filename), TEXT_PROJECTION)
+    return doc.get("text") if doc else None
+
+def document_summary(doc):
+    """API representation of a document record"""
+    preview = doc.get("preview", "")
+    return {
+        "documentId": doc.get("document_id"),
+        "filename": doc["filename"],
+        "upload_date": doc.get("upload_date", "Unknown"),
+        "text_preview": preview + "..." if doc.get("text_length", 0) > len(preview) else preview,
+        "text_length": doc.get("text_length", 0),
+        "page_count": doc.get("page_count"),
+        "sha256": doc.get("sha256")
+    }
+
+def backfill_documents(document_collection, batch_size=100):
+    """Add ids and summary fields to all records stored before they existed"""
+    updated = 0
+    missing = {"$or": [{"preview": {"$exists": False}}, {"document_id": {"$exists": False}}]}
+    for doc in document_collection.find(missing, {"_id": 1}).batch_size(batch_size):
+        if _backfill(document_collection, {"_id": doc["_id"]}):
+            updated += 1
+    logger.info(f"Backfilled {updated} document records")
+    return updated
+
+if __name__ == "__main__":
+    import os
+    from pymongo import MongoClient
+    from dotenv import load_dotenv
+
+    load_dotenv(".env.local")
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    collection = MongoClient(os.environ.get("MONGODB_URI", "mongodb://localhost:27017/finance_ai"))["finance_ai"]["documents"]
+    ensure_indexes(collection)
+    backfill_documents(collection)
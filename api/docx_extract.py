@@ -0,0 +1,71 @@
+import logging
+
+import docx
+from docx.oxml.ns import qn
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Separates the cells of a table row in the extracted text
+CELL_DELIMITER = " | "
+
+_P = qn("w:p")
+_TBL = qn("w:tbl")
+_TR = qn("w:tr")
+_TC = qn("w:tc")
+_SDT = qn("w:sdt")
+_SDT_CONTENT = qn("w:sdtContent")
+_T = qn("w:t")
+_TAB = qn("w:tab")
+_BR = qn("w:br")
+_CR = qn("w:cr")
+
+def _element_text(element):
+    """Text of a paragraph or cell, reading the run XML directly instead of building python-docx objects"""
+    parts = []
+    for node in element.iter(_T, _TAB, _BR, _CR, _P):
+        if node.tag == _T:
+            if node.text:
+                parts.append(node.text)
+        elif node.tag == _TAB:
+            parts.append("\t")
+        elif node.tag == _P:
+            # Paragraph boundary inside a table cell
+            if parts:
+                parts.append(" ")
+        else:
+            parts.append("\n")
+    return "".join(parts).strip()
+
+def _iter_table_rows(table):
+    for row in table.iterchildren(_TR):
+        cells = [_element_text(cell) for cell in row.iterchildren(_TC)]
+        if any(cells):
+            yield CELL_DELIMITER.join(cells)
+
+def _iter_blocks(parent):
+    for child in parent.iterchildren():
+        if child.tag == _P:
+            text = _element_text(child)
+            if text:
+                yield text
+        elif child.tag == _TBL:
+            yield from _iter_table_rows(child)
+        elif child.tag == _SDT:
+            # Content controls wrap ordinary body content
+            for content in child.iterchildren(_SDT_CONTENT):
+                yield from _iter_blocks(content)
+
+def iter_docx_blocks(document):
+    """
+    Yield the non-empty lines of a DOCX body in document order: one per
+    paragraph and one per table row, with cells joined by CELL_DELIMITER
+    """
+    yield from _iter_blocks(document.element.body)
+
+def extract_docx_text(f):
+    """All paragraph and table text of a DOCX file-like object, joined once"""
+    document = docx.Document(f)
+    lines = list(iter_docx_blocks(document))
+    logger.info(f"DOCX opened successfully. Lines: {len(lines)}")
+    return "\n".join(lines) + "\n" if lines else ""
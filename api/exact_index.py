@@ -0,0 +1,409 @@
+"""
+Exact (brute-force) vector search over a memory-mapped copy of a Chroma collection.
+
+For small candidate sets, such as a small region, a narrow date range or a
+small collection, a matrix-vector product over the matching rows is both faster
+than filtered HNSW search and exact. Each exported collection is a directory
+holding:
+
+    vectors.npy   float32 or float16 embeddings, memory-mapped read-only
+    norms.npy     float32 row norms for l2/cosine distances
+    meta.json     ids, documents and metadata stored column-wise
+
+query_news() in region_index.py picks this path automatically when the number
+of candidates after the where filter is at or below EXACT_SEARCH_THRESHOLD
+(see bench_exact_index.py for the crossover).
+
+Writers call mark_changed() after adding or updating news, which stores a new
+version token next to the index (a file, so the ingesting service and the API
+see the same value). An index built from an older version, or with a different
+size, is not used; Chroma serves queries while it is rebuilt in the
+background, at most once per EXACT_INDEX_MIN_REBUILD_INTERVAL seconds. Indexes
+older than EXACT_INDEX_MAX_AGE are also rebuilt, to pick up writes made
+without mark_changed(). Exports stream the vectors to disk in batches.
+
+Exact search is off unless EXACT_SEARCH_ENABLED=true. With several gunicorn
+workers, one worker exports a collection (a file lock per collection) and the
+others memory-map its result once meta.json is newer than their copy.
+
+Usage:
+    python exact_index.py [collection_name]    # export now
+"""
+import os
+import json
+import fcntl
+import time
+import shutil
+import logging
+import threading
+
+import numpy as np
+
+from index_config import HNSW_SPACE
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Opt-in: exporting costs disk and CPU proportional to the collection size
+EXACT_SEARCH_ENABLED = os.environ.get("EXACT_SEARCH_ENABLED", "false").lower() == "true"
+# Candidate count at or below which exact search replaces HNSW
+EXACT_SEARCH_THRESHOLD = int(os.environ.get("EXACT_SEARCH_THRESHOLD", "20000"))
+EXACT_INDEX_PATH = os.environ.get("EXACT_INDEX_PATH", "./exact_index")
+EXACT_INDEX_DTYPE = os.environ.get("EXACT_INDEX_DTYPE", "float32")
+EXACT_INDEX_MAX_AGE = float(os.environ.get("EXACT_INDEX_MAX_AGE", "3600"))
+# Rebuilds after writes are spaced out so steady ingestion doesn't export continuously
+EXACT_INDEX_MIN_REBUILD_INTERVAL = float(os.environ.get("EXACT_INDEX_MIN_REBUILD_INTERVAL", "60"))
+# Collections larger than this are not exported; HNSW handles them alone
+EXACT_INDEX_MAX_DOCUMENTS = int(os.environ.get("EXACT_INDEX_MAX_DOCUMENTS", "500000"))
+
+_COMPARISONS = {
+    "$eq": np.equal,
+    "$ne": np.not_equal,
+    "$gt": np.greater,
+    "$gte": np.greater_equal,
+    "$lt": np.less,
+    "$lte": np.less_equal,
+}
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _column_array(values):
+    """Numeric columns become float arrays (NaN = missing), everything else object arrays"""
+    present = [v for v in values if v is not None]
+    if present and all(_is_number(v) for v in present):
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+class ExactIndex:
+    """Read-only exact vector index with Chroma-compatible query results"""
+
+    def __init__(self, path):
+        self.path = path
+        meta_path = os.path.join(path, "meta.json")
+        self.loaded_mtime = os.path.getmtime(meta_path)
+        with open(meta_path) as f:
+            meta = json.load(f)
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.norms = np.load(os.path.join(path, "norms.npy"))
+        self.ids = meta["ids"]
+        self.documents = meta.get("documents")
+        self.space = meta.get("space", HNSW_SPACE)
+        self.built_at = meta.get("built_at", 0)
+        self.version = meta.get("version")
+        self.column_values = meta["columns"]
+        self.columns = {name: _column_array(values) for name, values in self.column_values.items()}
+        self.size = len(self.ids)
+
+    @classmethod
+    def build(cls, path, ids, embeddings, metadatas, documents=None, space=None, dtype=None):
+        """Write an index directory from in-memory data and load it"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        _write_index(path, ids, embeddings, metadatas, documents, space or HNSW_SPACE, dtype or EXACT_INDEX_DTYPE)
+        return cls(path)
+
+    def _field_mask(self, name, condition):
+        column = self.columns.get(name)
+        if column is None:
+            return np.zeros(self.size, dtype=bool)
+        numeric = column.dtype == np.float64
+        present = ~np.isnan(column) if numeric else np.fromiter((v is not None for v in column), dtype=bool, count=self.size)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+
+        mask = present.copy()
+        for op, value in condition.items():
+            if op in ("$in", "$nin"):
+                if numeric:
+                    matched = np.isin(column, [v for v in value if _is_number(v)])
+                else:
+                    values = set(value)
+                    matched = np.fromiter((v in values for v in column), dtype=bool, count=self.size)
+                mask &= matched if op == "$in" else ~matched
+            elif op in _COMPARISONS:
+                if numeric != _is_number(value):
+                    # Comparing a number field with a string (or vice versa) matches nothing but $ne
+                    if op != "$ne":
+                        mask &= False
+                    continue
+                with np.errstate(invalid="ignore"):
+                    mask &= _COMPARISONS[op](column, value).astype(bool)
+            else:
+                raise ValueError(f"Unsupported where operator: {op}")
+        return mask
+
+    def match(self, where):
+        """Boolean mask of rows matching a Chroma where clause"""
+        mask = np.ones(self.size, dtype=bool)
+        for key, value in (where or {}).items():
+            if key == "$and":
+                for clause in value:
+                    mask &= self.match(clause)
+            elif key == "$or":
+                mask &= np.logical_or.reduce([self.match(clause) for clause in value])
+            else:
+                mask &= self._field_mask(key, value)
+        return mask
+
+    def candidates(self, where):
+        """Row indices matching the filter, or None for all rows"""
+        if not where:
+            return None
+        return np.flatnonzero(self.match(where))
+
+    def candidate_count(self, candidates):
+        return self.size if candidates is None else len(candidates)
+
+    def _distances(self, scores, norms, query_norm):
+        # Same conventions as Chroma: squared l2, 1 - cosine, 1 - inner product
+        if self.space == "cosine":
+            return 1.0 - scores / np.maximum(norms * query_norm, 1e-12)
+        if self.space == "ip":
+            return 1.0 - scores
+        return np.maximum(norms * norms + query_norm * query_norm - 2.0 * scores, 0.0)
+
+    def metadata(self, row):
+        return {name: values[row] for name, values in self.column_values.items() if values[row] is not None}
+
+    def query(self, query_embeddings, n_results, where=None, candidates=None):
+        """Top n_results per query embedding, shaped like collection.query() results"""
+        if candidates is None and where:
+            candidates = self.candidates(where)
+        if candidates is None:
+            vectors, norms = self.vectors, self.norms
+        else:
+            vectors, norms = self.vectors[candidates], self.norms[candidates]
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        query_norms = np.linalg.norm(queries, axis=1)
+        scores = np.asarray(vectors @ queries.T, dtype=np.float32) if len(vectors) else np.empty((0, len(queries)))
+
+        results = {"ids": [], "distances": [], "metadatas": [], "documents": []}
+        for j in range(len(queries)):
+            distances = self._distances(scores[:, j], norms, query_norms[j])
+            k = min(n_results, len(distances))
+            top = np.argpartition(distances, k - 1)[:k] if k else np.array([], dtype=int)
+            top = top[np.argsort(distances[top])]
+            rows = top if candidates is None else candidates[top]
+            results["ids"].append([self.ids[r] for r in rows])
+            results["distances"].append([float(d) for d in distances[top]])
+            results["metadatas"].append([self.metadata(r) for r in rows])
+            results["documents"].append([self.documents[r] if self.documents else None for r in rows])
+        return results
+
+def _version_path(name):
+    return os.path.join(EXACT_INDEX_PATH, f"{name}.version")
+
+def collection_version(name):
+    """Version token of a collection's contents, None until it is first marked changed"""
+    try:
+        with open(_version_path(name)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def mark_changed(*collections):
+    """Record a write to collections so their exact indexes are rebuilt before being used again"""
+    os.makedirs(EXACT_INDEX_PATH, exist_ok=True)
+    for collection in collections:
+        path = _version_path(collection.name)
+        tmp = f"{path}.{os.getpid()}-{threading.get_ident()}"
+        with open(tmp, "w") as f:
+            f.write(f"{time.time_ns()}-{os.getpid()}-{threading.get_ident()}")
+        os.replace(tmp, path)
+
+def _building_path(path):
+    return f"{path}.building-{os.getpid()}-{threading.get_ident()}"
+
+def _write_index(path, ids, embeddings, metadatas, documents, space, dtype):
+    """Write the index files to a scratch directory and swap it in"""
+    building = _building_path(path)
+    os.makedirs(building, exist_ok=True)
+
+    np.save(os.path.join(building, "vectors.npy"), np.asarray(embeddings).astype(dtype))
+    np.save(os.path.join(building, "norms.npy"), np.linalg.norm(np.asarray(embeddings, dtype=np.float32), axis=1))
+    _finish_index(building, path, ids, metadatas, documents, space, dtype)
+
+def _finish_index(building, path, ids, metadatas, documents, space, dtype, version=None):
+    """Write meta.json next to the vectors in `building` and swap the directory in"""
+    names = sorted({name for metadata in metadatas for name in (metadata or {})})
+    columns = {name: [(metadata or {}).get(name) for metadata in metadatas] for name in names}
+    with open(os.path.join(building, "meta.json"), "w") as f:
+        json.dump({
+            "ids": list(ids),
+            "documents": list(documents) if documents and any(d is not None for d in documents) else None,
+            "columns": columns,
+            "space": space,
+            "dtype": dtype,
+            "built_at": time.time(),
+            "version": version,
+        }, f)
+
+    # Readers keep their memory maps of the old files after the swap
+    previous = None
+    if os.path.exists(path):
+        previous = f"{path}.old-{os.getpid()}-{threading.get_ident()}"
+        os.rename(path, previous)
+    os.rename(building, path)
+    if previous:
+        shutil.rmtree(previous, ignore_errors=True)
+
+def export_collection(collection, path=None, dtype=None, batch_size=5000):
+    """
+    Copy a Chroma collection into an exact index directory; returns the loaded
+    index. Vectors are written batch by batch to a memory-mapped file, so the
+    export never holds the whole matrix in memory.
+    """
+    path = path or os.path.join(EXACT_INDEX_PATH, collection.name)
+    dtype = dtype or EXACT_INDEX_DTYPE
+    start = time.perf_counter()
+    # Read before the export, so writes made while it runs trigger another rebuild
+    version = collection_version(collection.name)
+    count = collection.count()
+    building = _building_path(path)
+    os.makedirs(building, exist_ok=True)
+
+    vectors = None
+    norms = np.empty(count, dtype=np.float32)
+    ids, metadatas, documents = [], [], []
+    try:
+        while len(ids) < count:
+            batch = collection.get(include=["embeddings", "metadatas", "documents"], limit=batch_size, offset=len(ids))
+            batch_ids = (batch.get("ids") or [])[:count - len(ids)]
+            if not batch_ids:
+                break
+            embeddings = np.asarray(batch["embeddings"][:len(batch_ids)], dtype=np.float32)
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(os.path.join(building, "vectors.npy"), mode="w+",
+                                                    dtype=dtype, shape=(count, embeddings.shape[1]))
+            rows = slice(len(ids), len(ids) + len(batch_ids))
+            vectors[rows] = embeddings
+            norms[rows] = np.linalg.norm(embeddings, axis=1)
+            ids.extend(batch_ids)
+            metadatas.extend((batch["metadatas"] or [None] * len(batch_ids))[:len(batch_ids)])
+            documents.extend((batch.get("documents") or [None] * len(batch_ids))[:len(batch_ids)])
+
+        if len(ids) != count:
+            raise RuntimeError(f"{collection.name} shrank during export ({len(ids)} of {count} rows read)")
+        if vectors is None:
+            np.save(os.path.join(building, "vectors.npy"), np.empty((0, 0), dtype=dtype))
+        else:
+            vectors.flush()
+            del vectors
+        np.save(os.path.join(building, "norms.npy"), norms)
+
+        space = (collection.metadata or {}).get("hnsw:space", "l2")
+        _finish_index(building, path, ids, metadatas, documents, space, dtype, version)
+    except Exception:
+        shutil.rmtree(building, ignore_errors=True)
+        raise
+
+    index = ExactIndex(path)
+    logger.info(f"Exported {index.size} vectors from {collection.name} in {time.perf_counter() - start:.1f}s")
+    return index
+
+_indexes = {}
+_rebuilding = set()
+_last_rebuild = {}
+_lock = threading.Lock()
+_usage = {"exact": 0, "hnsw": 0}
+
+def _rebuild(collection):
+    try:
+        os.makedirs(EXACT_INDEX_PATH, exist_ok=True)
+        # One exporter per collection across gunicorn workers; the others load its result
+        with open(os.path.join(EXACT_INDEX_PATH, f"{collection.name}.lock"), "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.debug(f"Exact index for {collection.name} is being exported by another process")
+                return
+            _indexes[collection.name] = export_collection(collection)
+    except Exception as e:
+        logger.error(f"Exact index rebuild failed for {collection.name}: {str(e)}")
+    finally:
+        with _lock:
+            _rebuilding.discard(collection.name)
+
+def _load_from_disk(name, index):
+    """The exported index on disk when it is newer than `index` (built by another process), else `index`"""
+    path = os.path.join(EXACT_INDEX_PATH, name)
+    meta_path = os.path.join(path, "meta.json")
+    try:
+        if os.path.exists(meta_path) and (index is None or os.path.getmtime(meta_path) > index.loaded_mtime):
+            index = _indexes[name] = ExactIndex(path)
+    except Exception as e:
+        logger.error(f"Could not load exact index {path}: {str(e)}")
+    return index
+
+def _schedule_rebuild(collection):
+    now = time.monotonic()
+    with _lock:
+        if collection.name in _rebuilding:
+            return
+        last = _last_rebuild.get(collection.name)
+        if last is not None and now - last < EXACT_INDEX_MIN_REBUILD_INTERVAL:
+            return
+        _rebuilding.add(collection.name)
+        _last_rebuild[collection.name] = now
+    threading.Thread(target=_rebuild, args=(collection,), daemon=True).start()
+
+def get_exact_index(collection):
+    """
+    The exact index for a collection when it is in sync with it, else None.
+    Missing, changed or old indexes are rebuilt in the background.
+    """
+    if not EXACT_SEARCH_ENABLED:
+        return None
+    count = collection.count()
+    version = collection_version(collection.name)
+    index = _indexes.get(collection.name)
+    for load in (False, True):
+        if load:
+            # Another worker may already have exported a newer copy
+            index = _load_from_disk(collection.name, index)
+        in_sync = index is not None and index.size == count and index.version == version
+        fresh = in_sync and time.time() - index.built_at <= EXACT_INDEX_MAX_AGE
+        if fresh:
+            break
+    if not fresh and count <= EXACT_INDEX_MAX_DOCUMENTS:
+        _schedule_rebuild(collection)
+    return index if in_sync else None
+
+def query_collection(collection, query_embeddings, n_results, where=None):
+    """Query one collection, exactly when few enough documents match the filter, else through HNSW"""
+    index = get_exact_index(collection)
+    if index is not None:
+        candidates = index.candidates(where)
+        if index.candidate_count(candidates) <= EXACT_SEARCH_THRESHOLD:
+            _usage["exact"] += 1
+            return index.query(query_embeddings, n_results, candidates=candidates)
+
+    _usage["hnsw"] += 1
+    if where:
+        return collection.query(query_embeddings=query_embeddings, n_results=n_results, where=where)
+    return collection.query(query_embeddings=query_embeddings, n_results=n_results)
+
+def exact_index_stats():
+    """Loaded indexes and how often each path served queries, for the health endpoint"""
+    return {
+        "enabled": EXACT_SEARCH_ENABLED,
+        "threshold": EXACT_SEARCH_THRESHOLD,
+        "queries": dict(_usage),
+        "indexes": {name: {"documents": index.size, "dtype": str(index.vectors.dtype),
+                           "age_seconds": round(time.time() - index.built_at)}
+                    for name, index in _indexes.items()},
+        "rebuilding": sorted(_rebuilding),
+        "min_rebuild_interval": EXACT_INDEX_MIN_REBUILD_INTERVAL,
+    }
+
+if __name__ == "__main__":
+    import sys
+    import chromadb
+    from index_config import get_news_collection
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    chroma_client = chromadb.PersistentClient(path="./chroma_db")
+    export_collection(get_news_collection(chroma_client, sys.argv[1] if len(sys.argv) > 1 else "news_data"))
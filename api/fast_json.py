@@ -0,0 +1,198 @@
+"""
+Fast JSON encoding and response compression for both API services.
+
+orjson is used when installed (several times faster than the stdlib encoder
+on large history payloads) and the stdlib json module otherwise. JSON and
+text responses above COMPRESS_MIN_BYTES are compressed with brotli when the
+client accepts it and the brotli package is installed, else with gzip.
+Streamed responses are passed through untouched.
+"""
+import os
+import json
+import gzip
+import logging
+import decimal
+from datetime import date, datetime
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+FAST_JSON_ENABLED = os.environ.get("FAST_JSON_ENABLED", "true").lower() == "true"
+COMPRESSION_ENABLED = os.environ.get("COMPRESSION_ENABLED", "true").lower() == "true"
+# Small bodies fit in a packet or two; compressing them only costs CPU
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "6"))
+# Brotli quality 4 compresses better than gzip -6 at similar speed; 11 is for static assets
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+def _default(obj):
+    """Types the stdlib encoder and orjson don't handle natively"""
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    # bson.ObjectId and anything else with a meaningful string form
+    return str(obj)
+
+def dumps(obj, default=None, passthrough_datetime=False):
+    """
+    Serialize to UTF-8 JSON bytes. With passthrough_datetime, datetimes go to
+    `default` instead of being encoded as ISO strings by orjson.
+    """
+    default = default or _default
+    if FAST_JSON_ENABLED and orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if passthrough_datetime:
+            option |= orjson.OPT_PASSTHROUGH_DATETIME
+        return orjson.dumps(obj, default=default, option=option)
+    return json.dumps(obj, default=default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def json_backend():
+    return "orjson" if FAST_JSON_ENABLED and orjson is not None else "json"
+
+def choose_encoding(accept_encoding):
+    """'br', 'gzip' or None for an Accept-Encoding header, honouring q=0"""
+    accepted = set()
+    for part in (accept_encoding or "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if name and params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(name)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+def should_compress(content_type, size, status=200):
+    return (
+        COMPRESSION_ENABLED
+        and size >= COMPRESS_MIN_BYTES
+        and 200 <= status < 300 and status not in (204, 206)
+        and (content_type or "").startswith(COMPRESSIBLE_TYPES)
+    )
+
+def init_flask(app):
+    """Use the fast encoder for jsonify and compress eligible responses"""
+    from flask import request
+    from flask.json.provider import DefaultJSONProvider
+    from werkzeug.http import http_date
+
+    def flask_default(obj):
+        # Keep jsonify's HTTP date format for datetimes
+        if isinstance(obj, (date, datetime)):
+            return http_date(obj)
+        return _default(obj)
+
+    class FastJSONProvider(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            return dumps(obj, default=flask_default, passthrough_datetime=True).decode("utf-8")
+
+        def loads(self, s, **kwargs):
+            return loads(s)
+
+        def response(self, *args, **kwargs):
+            obj = self._prepare_response_obj(args, kwargs)
+            return self._app.response_class(dumps(obj, default=flask_default, passthrough_datetime=True), mimetype=self.mimetype)
+
+    app.json = FastJSONProvider(app)
+    logger.info(f"Flask JSON encoder: {json_backend()}, compression: {'on' if COMPRESSION_ENABLED else 'off'}")
+
+    @app.after_request
+    def _compress(response):
+        if response.direct_passthrough or response.is_streamed or "Content-Encoding" in response.headers:
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = choose_encoding(request.headers.get("Accept-Encoding"))
+        if encoding is None or not should_compress(response.mimetype, response.content_length or 0, response.status_code):
+            return response
+        response.set_data(compress(response.get_data(), encoding))
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+def fastapi_response_class():
+    """JSONResponse rendering with the fast encoder, for FastAPI(default_response_class=...)"""
+    from fastapi.responses import JSONResponse
+
+    class FastJSONResponse(JSONResponse):
+        def render(self, content):
+            return dumps(content)
+
+    return FastJSONResponse
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing single-message JSON/text responses with br or
+    gzip. Responses sent in several body messages (streams) pass through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        encoding = choose_encoding(headers.get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                # Held back until the body shows whether it can be compressed
+                start = message
+                return
+            if start is None:
+                await send(message)
+                return
+
+            response_headers = start.get("headers", [])
+            names = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in response_headers}
+            body = message.get("body", b"")
+            if (not message.get("more_body", False)
+                    and "content-encoding" not in names
+                    and should_compress(names.get("content-type"), len(body), start["status"])):
+                body = compress(body, encoding)
+                response_headers = [(k, v) for k, v in response_headers if k.lower() != b"content-length"]
+                response_headers += [
+                    (b"content-encoding", encoding.encode()),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"vary", b"Accept-Encoding"),
+                ]
+                message = {**message, "body": body}
+            await send({**start, "headers": response_headers})
+            start = None
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+def init_fastapi(app):
+    app.add_middleware(CompressionMiddleware)
+    logger.info(f"FastAPI JSON encoder: {json_backend()}, compression: {'on' if COMPRESSION_ENABLED else 'off'}")
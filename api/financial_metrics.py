@@ -0,0 +1,217 @@
+"""
+Structured financial metrics extracted from uploaded documents.
+
+The metrics and ratios found by extract_financial_data are stored as numbers in
+the financial_metrics collection, one record per document, together with the
+ticker and reporting period when they can be detected. Every value is also kept
+in a `values` array of {k, v} pairs so a single index serves range queries on
+any metric ("roe > 15") and trends over periods for a ticker.
+
+Usage:
+    python financial_metrics.py                 # backfill from the documents collection
+    python financial_metrics.py --user-id u1    # only one user's documents
+"""
+import re
+import logging
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+METRIC_UNITS = {
+    "revenue": "USD millions",
+    "net_income": "USD millions",
+    "ebitda": "USD millions",
+    "eps": "USD",
+    "gross_margin": "percent",
+    "operating_margin": "percent",
+    "net_profit_margin": "percent",
+    "roa": "percent",
+    "roe": "percent",
+}
+
+COMPARISON_OPERATORS = {">": "$gt", ">=": "$gte", "<": "$lt", "<=": "$lte", "=": "$eq"}
+_FILTER_PATTERN = re.compile(r"^\s*(\w+)\s*(>=|<=|>|<|=)\s*(-?[0-9][0-9,]*(?:\.[0-9]+)?)\s*$")
+
+_TICKER_PATTERNS = [
+    re.compile(r"\((?:NYSE|NASDAQ|Nasdaq|AMEX|LSE|TSX|ASX|HKEX|Tadawul|TADAWUL|DFM|ADX)\s*:\s*([A-Z][A-Z0-9.]{0,7})\)"),
+    re.compile(r"\b(?:Ticker|Ticker Symbol|Stock Symbol)\s*:\s*([A-Z][A-Z0-9.]{0,7})\b"),
+]
+_QUARTER_PATTERN = re.compile(r"\b(?:Q([1-4])\s*(?:FY)?\s*'?((?:19|20)\d{2})|(first|second|third|fourth)\s+quarter\s+(?:of\s+)?(?:fiscal\s+(?:year\s+)?)?((?:19|20)\d{2}))\b", re.IGNORECASE)
+_YEAR_PATTERN = re.compile(r"\b(?:FY\s*'?|fiscal\s+(?:year\s+)?|year\s+ended\s+\w+\s+\d{1,2},\s+|annual\s+report\s+)((?:19|20)\d{2})\b", re.IGNORECASE)
+_QUARTER_WORDS = {"first": 1, "second": 2, "third": 3, "fourth": 4}
+
+def ensure_indexes(metrics_collection):
+    """Indexes for metric range queries, per-ticker trends and lookups by document"""
+    metrics_collection.create_index("document_id", unique=True, name="document_id")
+    metrics_collection.create_index(
+        [("user_id", ASCENDING), ("values.k", ASCENDING), ("values.v", ASCENDING)],
+        name="user_metric_value"
+    )
+    metrics_collection.create_index(
+        [("user_id", ASCENDING), ("ticker", ASCENDING), ("fiscal_year", ASCENDING), ("quarter", ASCENDING)],
+        name="user_ticker_period"
+    )
+
+def parse_number(value):
+    """'1,234.5' -> 1234.5; None when the value is not a number"""
+    try:
+        return float(str(value).replace(",", "").strip().rstrip("."))
+    except (TypeError, ValueError):
+        return None
+
+def detect_ticker(text):
+    for pattern in _TICKER_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            return match.group(1).rstrip(".")
+    return None
+
+def detect_period(text):
+    """(fiscal_year, quarter, label) of the reporting period; quarter is None for annual reports"""
+    match = _QUARTER_PATTERN.search(text)
+    if match:
+        quarter = int(match.group(1)) if match.group(1) else _QUARTER_WORDS[match.group(3).lower()]
+        year = int(match.group(2) or match.group(4))
+        return year, quarter, f"Q{quarter} {year}"
+    match = _YEAR_PATTERN.search(text)
+    if match:
+        year = int(match.group(1))
+        return year, None, f"FY{year}"
+    return None, None, None
+
+def build_metrics_record(document, financial_data, text=""):
+    """
+    Numeric metrics record for a document record (document_id, user_id,
+    filename, upload_date) and the output of extract_financial_data
+    """
+    metrics = {}
+    for group in ("metrics", "ratios"):
+        for key, raw in (financial_data.get(group) or {}).items():
+            value = parse_number(raw)
+            if value is not None:
+                metrics[key] = value
+
+    segments = []
+    for segment in financial_data.get("segments") or []:
+        segments.append({
+            "name": segment.get("name"),
+            "revenue_contribution": parse_number(str(segment.get("revenue_contribution", "")).rstrip("%"))
+        })
+
+    # Headers carry the ticker and period; scanning the whole text picks up comparisons to other years
+    head = text[:5000]
+    fiscal_year, quarter, period = detect_period(head)
+    return {
+        "document_id": document["document_id"],
+        "user_id": document["user_id"],
+        "filename": document.get("filename"),
+        "ticker": detect_ticker(head),
+        "fiscal_year": fiscal_year,
+        "quarter": quarter,
+        "period": period,
+        "metrics": metrics,
+        "values": [{"k": key, "v": value} for key, value in metrics.items()],
+        "segments": segments,
+        "upload_date": document.get("upload_date"),
+        "extracted_at": datetime.utcnow().isoformat()
+    }
+
+def metrics_upsert(record):
+    """Bulk-write operation storing a metrics record, replacing an earlier one for the document"""
+    return UpdateOne({"document_id": record["document_id"]}, {"$set": record}, upsert=True)
+
+def store_metrics(metrics_collection, document, financial_data, text=""):
+    record = build_metrics_record(document, financial_data, text)
+    metrics_collection.update_one({"document_id": record["document_id"]}, {"$set": record}, upsert=True)
+    logger.info(f"Stored {len(record['metrics'])} financial metrics for document {record['document_id']}")
+    return record
+
+def parse_filters(expressions):
+    """["roe>15", "revenue >= 500"] -> [("roe", "$gt", 15.0), ...]; raises ValueError on bad input"""
+    filters = []
+    for expression in expressions:
+        match = _FILTER_PATTERN.match(expression)
+        if not match:
+            raise ValueError(f"Invalid filter: {expression}. Use e.g. roe>15")
+        metric, operator, value = match.groups()
+        if metric not in METRIC_UNITS:
+            raise ValueError(f"Unknown metric: {metric}. Known metrics: {', '.join(METRIC_UNITS)}")
+        filters.append((metric, COMPARISON_OPERATORS[operator], parse_number(value)))
+    return filters
+
+def query_metrics(metrics_collection, user_id, filters=(), ticker=None, sort_by=None, descending=True, limit=50):
+    """A user's metrics records matching every (metric, operator, value) filter"""
+    query = {"user_id": user_id}
+    conditions = [{"values": {"$elemMatch": {"k": metric, "v": {operator: value}}}} for metric, operator, value in filters]
+    if conditions:
+        query["$and"] = conditions
+    if ticker:
+        query["ticker"] = ticker.upper()
+
+    cursor = metrics_collection.find(query, {"_id": 0, "values": 0})
+    if sort_by:
+        cursor = cursor.sort(f"metrics.{sort_by}", DESCENDING if descending else ASCENDING)
+    else:
+        cursor = cursor.sort([("fiscal_year", DESCENDING), ("quarter", DESCENDING)])
+    return list(cursor.limit(limit))
+
+def metric_trend(metrics_collection, user_id, ticker, metric):
+    """Values of one metric for a ticker in period order"""
+    cursor = metrics_collection.find(
+        {"user_id": user_id, "ticker": ticker.upper(), "values.k": metric},
+        {"_id": 0, "document_id": 1, "filename": 1, "period": 1, "fiscal_year": 1, "quarter": 1, f"metrics.{metric}": 1}
+    ).sort([("fiscal_year", ASCENDING), ("quarter", ASCENDING)])
+    return [{
+        "period": doc.get("period"),
+        "fiscal_year": doc.get("fiscal_year"),
+        "quarter": doc.get("quarter"),
+        "value": doc["metrics"][metric],
+        "document_id": doc["document_id"],
+        "filename": doc.get("filename")
+    } for doc in cursor]
+
+def backfill_metrics(document_collection, metrics_collection, user_id=None, batch_size=100):
+    """Extract and store metrics for every document that has none yet; returns the number stored"""
+    # Imported here so the API and the importer can use this module without the extraction stack
+    from upload import extract_financial_data
+
+    done = set(metrics_collection.distinct("document_id", {"user_id": user_id} if user_id else {}))
+    # Leave documents that already have metrics out of the query so their text is never fetched
+    query = {"document_id": {"$exists": True, "$nin": list(done)}}
+    if user_id:
+        query["user_id"] = user_id
+
+    operations, stored = [], 0
+    cursor = document_collection.find(query, {"_id": 0, "document_id": 1, "user_id": 1, "filename": 1, "upload_date": 1, "text": 1})
+    for doc in cursor.batch_size(batch_size):
+        text = doc.pop("text", "") or ""
+        operations.append(metrics_upsert(build_metrics_record(doc, extract_financial_data(text), text)))
+        if len(operations) >= batch_size:
+            metrics_collection.bulk_write(operations, ordered=False)
+            stored += len(operations)
+            operations = []
+    if operations:
+        metrics_collection.bulk_write(operations, ordered=False)
+        stored += len(operations)
+    logger.info(f"Backfilled financial metrics for {stored} documents")
+    return stored
+
+if __name__ == "__main__":
+    import os
+    import argparse
+    from pymongo import MongoClient
+    from dotenv import load_dotenv
+
+    load_dotenv(".env.local")
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Backfill structured financial metrics from stored documents")
+    parser.add_argument("--user-id", help="only backfill this user's documents")
+    args = parser.parse_args()
+
+    db = MongoClient(os.environ.get("MONGODB_URI", "mongodb://localhost:27017/finance_ai"))["finance_ai"]
+    ensure_indexes(db["financial_metrics"])
+    backfill_metrics(db["documents"], db["financial_metrics"], user_id=args.user_id)
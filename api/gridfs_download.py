@@ -0,0 +1,184 @@
+import os
+import logging
+import mimetypes
+import threading
+import unicodedata
+from collections import OrderedDict
+from urllib.parse import quote
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import Response, jsonify, send_file
+from gridfs.errors import NoFile
+from werkzeug.wsgi import FileWrapper
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Matches the default GridFS chunk size so each read maps to one chunk document
+DOWNLOAD_CHUNK_SIZE = 255 * 1024
+DOWNLOAD_MAX_AGE = int(os.environ.get("DOWNLOAD_MAX_AGE", "3600"))
+
+# Optional local copy of hot files; disabled when DOWNLOAD_CACHE_DIR is empty
+DOWNLOAD_CACHE_DIR = os.environ.get("DOWNLOAD_CACHE_DIR", "")
+DOWNLOAD_CACHE_MAX_BYTES = int(os.environ.get("DOWNLOAD_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+DOWNLOAD_CACHE_MAX_FILE_BYTES = int(os.environ.get("DOWNLOAD_CACHE_MAX_FILE_BYTES", str(50 * 1024 * 1024)))
+
+class DiskLRUCache:
+    """
+    Local copies of GridFS files keyed by file id, evicted least recently used
+    first once the total size exceeds max_bytes. GridFS files are immutable,
+    so entries never need invalidation.
+    """
+
+    def __init__(self, directory, max_bytes=DOWNLOAD_CACHE_MAX_BYTES, max_file_bytes=DOWNLOAD_CACHE_MAX_FILE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.filling = set()
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        # Resume from what is on disk, oldest access first
+        existing = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith(".tmp"):
+                os.remove(path)
+            elif os.path.isfile(path):
+                existing.append((os.path.getmtime(path), name, os.path.getsize(path)))
+        for _, name, size in sorted(existing):
+            self.entries[name] = size
+            self.size += size
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """Path of a cached file, marking it as recently used"""
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            with self.lock:
+                self.size -= self.entries.pop(key, 0)
+            return None
+        return path
+
+    def fill_async(self, key, open_file, length):
+        """Copy a file into the cache in the background; open_file() returns a readable stream"""
+        if length > self.max_file_bytes:
+            return
+        with self.lock:
+            if key in self.entries or key in self.filling:
+                return
+            self.filling.add(key)
+        threading.Thread(target=self._fill, args=(key, open_file), daemon=True).start()
+
+    def _fill(self, key, open_file):
+        tmp = self._path(key) + ".tmp"
+        try:
+            source = open_file()
+            with open(tmp, "wb") as f:
+                while True:
+                    chunk = source.read(DOWNLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+            os.replace(tmp, self._path(key))
+            size = os.path.getsize(self._path(key))
+            with self.lock:
+                self.entries[key] = size
+                self.size += size
+            self._evict()
+        except Exception as e:
+            logger.error(f"Download cache fill failed for {key}: {str(e)}")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        finally:
+            with self.lock:
+                self.filling.discard(key)
+
+    def _evict(self):
+        while True:
+            with self.lock:
+                if self.size <= self.max_bytes or not self.entries:
+                    return
+                key, size = self.entries.popitem(last=False)
+                self.size -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            logger.debug(f"Evicted {key} from download cache")
+
+    def stats(self):
+        with self.lock:
+            return {"files": len(self.entries), "bytes": self.size, "max_bytes": self.max_bytes}
+
+download_cache = DiskLRUCache(DOWNLOAD_CACHE_DIR) if DOWNLOAD_CACHE_DIR else None
+
+def find_grid_file(fs, file_id=None, filename=None):
+    """GridOut by id, or the latest version of a filename; None when missing"""
+    try:
+        if file_id:
+            return fs.get(ObjectId(file_id))
+        return fs.get_last_version(filename)
+    except (NoFile, InvalidId):
+        return None
+
+def serve_gridfs_file(request, fs, file_id=None, filename=None):
+    """
+    Stream a GridFS file chunk by chunk with ETag/Last-Modified validation and
+    single-range requests, so browsers can start rendering large PDFs early and
+    resume interrupted downloads. Hot files are served from the disk cache.
+    """
+    grid_out = find_grid_file(fs, file_id, filename)
+    if grid_out is None:
+        return jsonify({"error": "File not found"}), 404
+
+    key = str(grid_out._id)
+    # Line breaks can't appear in a header value
+    name = " ".join((grid_out.filename or filename or key).splitlines())
+    mimetype = grid_out.content_type if getattr(grid_out, "content_type", None) else None
+    mimetype = mimetype or mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+    if download_cache is not None:
+        cached = download_cache.get(key)
+        if cached:
+            grid_out.close()
+            return send_file(cached, mimetype=mimetype, download_name=name, conditional=True,
+                             etag=key, last_modified=grid_out.upload_date, max_age=DOWNLOAD_MAX_AGE)
+        download_cache.fill_async(key, lambda: fs.get(grid_out._id), grid_out.length)
+
+    response = Response(FileWrapper(grid_out, DOWNLOAD_CHUNK_SIZE), mimetype=mimetype, direct_passthrough=True)
+    response.content_length = grid_out.length
+    response.set_etag(key)
+    response.last_modified = grid_out.upload_date
+    response.cache_control.private = True
+    response.cache_control.max_age = DOWNLOAD_MAX_AGE
+    response.headers.set("Content-Disposition", "inline", **content_disposition_params(name))
+    # Handles If-None-Match / If-Modified-Since (304), Range and If-Range (206, 416)
+    return response.make_conditional(request, accept_ranges=True, complete_length=grid_out.length)
+
+def content_disposition_params(name):
+    """
+    Filename parameters for Content-Disposition, built like Flask's send_file:
+    the name itself when it is ASCII, else an ASCII fallback plus the RFC 5987
+    filename* form. Quotes are escaped when the header is serialized.
+    """
+    try:
+        name.encode("ascii")
+        return {"filename": name}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+        return {"filename": simple, "filename*": f"UTF-8''{quote(name, safe='!#$&+^`|~')}"}
+
+def download_cache_stats():
+    return download_cache.stats() if download_cache is not None else {"enabled": False}
@@ -0,0 +1,166 @@
+import os
+import time
+import logging
+import threading
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Embedding model shared by ingestion and retrieval; changing it requires re-indexing
+EMBEDDING_MODEL_NAME = os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_DIM = int(os.environ.get("EMBEDDING_DIM", "384"))
+
+# HNSW settings applied to every news collection when it is created. Space and
+# the build parameters (M, construction_ef) are fixed once a collection exists;
+# search_ef is the query-time recall/latency knob.
+# all-MiniLM-L6-v2 embeddings are unit length, so l2 and cosine rank identically.
+HNSW_SPACE = os.environ.get("HNSW_SPACE", "l2").lower()
+HNSW_M = int(os.environ.get("HNSW_M", "16"))
+HNSW_CONSTRUCTION_EF = int(os.environ.get("HNSW_CONSTRUCTION_EF", "100"))
+HNSW_SEARCH_EF = int(os.environ.get("HNSW_SEARCH_EF", "50"))
+
+# Startup warmup: page the index in and run synthetic queries before serving
+INDEX_WARMUP_ENABLED = os.environ.get("INDEX_WARMUP_ENABLED", "true").lower() == "true"
+INDEX_WARMUP_QUERIES = int(os.environ.get("INDEX_WARMUP_QUERIES", "20"))
+
+WARMUP_TEXTS = [
+    "stock market outlook",
+    "gold price today",
+    "oil supply and OPEC decisions",
+    "central bank interest rate decision",
+    "inflation data and consumer prices",
+    "cryptocurrency market news",
+    "quarterly earnings results",
+    "currency exchange rates",
+]
+
+# Collection handles by (client, name), so shard lookups on the query path don't hit the catalog
+_collections = {}
+_collections_lock = threading.Lock()
+
+def collection_metadata():
+    """HNSW metadata used when creating a news collection"""
+    return {
+        "hnsw:space": HNSW_SPACE,
+        "hnsw:M": HNSW_M,
+        "hnsw:construction_ef": HNSW_CONSTRUCTION_EF,
+        "hnsw:search_ef": HNSW_SEARCH_EF,
+    }
+
+def _collection_names(chroma_client):
+    # Older chromadb returns Collection objects, newer versions return names
+    return {getattr(c, "name", c) for c in chroma_client.list_collections()}
+
+def get_news_collection(chroma_client, name="news_data"):
+    """
+    Get or create a news collection with the configured HNSW settings.
+    Existing collections keep their build settings; a mismatch is logged.
+    """
+    key = (id(chroma_client), name)
+    collection = _collections.get(key)
+    if collection is not None:
+        return collection
+
+    with _collections_lock:
+        collection = _collections.get(key)
+        if collection is not None:
+            return collection
+        if name in _collection_names(chroma_client):
+            collection = chroma_client.get_collection(name=name)
+            check_collection_config(collection)
+        else:
+            collection = chroma_client.create_collection(name=name, metadata=collection_metadata())
+            logger.info(f"Created collection {name} with {collection_metadata()}")
+        _collections[key] = collection
+    return collection
+
+def forget_collection(chroma_client, name):
+    """Drop a cached handle, e.g. after the collection was deleted and recreated"""
+    with _collections_lock:
+        _collections.pop((id(chroma_client), name), None)
+
+# Settings fixed when a collection's index is built
+FIXED_HNSW_KEYS = ("hnsw:space", "hnsw:M", "hnsw:construction_ef")
+
+def check_collection_config(collection):
+    """Warn when an existing collection was built with other settings, and apply search_ef"""
+    current = collection.metadata or {}
+    desired = collection_metadata()
+    # Collections created before central configuration carry no hnsw keys and use Chroma's defaults
+    defaults = {"hnsw:space": "l2", "hnsw:M": 16, "hnsw:construction_ef": 100, "hnsw:search_ef": 10}
+
+    fixed = [key for key in FIXED_HNSW_KEYS
+             if current.get(key, defaults[key]) != desired[key]]
+    if fixed:
+        built = {key: current.get(key, defaults[key]) for key in fixed}
+        configured = {key: desired[key] for key in fixed}
+        logger.warning(f"Collection {collection.name} was built with {built}, configured {configured}; re-index to apply")
+
+    if current.get("hnsw:search_ef", defaults["hnsw:search_ef"]) != HNSW_SEARCH_EF:
+        # Chroma refuses any modify() carrying the build-time keys, even unchanged
+        metadata = {key: value for key, value in current.items() if key not in FIXED_HNSW_KEYS}
+        try:
+            collection.modify(metadata={**metadata, "hnsw:search_ef": HNSW_SEARCH_EF})
+            logger.info(f"Set hnsw:search_ef={HNSW_SEARCH_EF} on {collection.name}; it takes effect once the index is reloaded")
+        except Exception as e:
+            logger.warning(f"Could not set hnsw:search_ef on {collection.name}: {str(e)}")
+
+def collection_space(collection):
+    return (collection.metadata or {}).get("hnsw:space", "l2")
+
+def distance_to_similarity(distance, space=None):
+    """
+    Cosine similarity in [0, 1] from a Chroma distance, assuming unit-length
+    embeddings: l2 is squared euclidean (2 - 2cos), cosine and ip are 1 - cos.
+    """
+    space = space or HNSW_SPACE
+    similarity = 1.0 - distance / 2.0 if space == "l2" else 1.0 - distance
+    return min(1.0, max(0.0, similarity))
+
+def warm_up(collections, embed_model, queries=None):
+    """
+    Load the embedding model and each collection's HNSW index with synthetic
+    queries so the first real requests don't pay for it. Returns timing stats.
+    """
+    queries = queries if queries is not None else INDEX_WARMUP_QUERIES
+    start = time.perf_counter()
+    texts = [WARMUP_TEXTS[i % len(WARMUP_TEXTS)] for i in range(max(1, queries))]
+    embeddings = embed_model.encode(texts).tolist()
+    embed_ms = (time.perf_counter() - start) * 1000
+
+    stats = {"embed_ms": round(embed_ms, 1), "collections": {}}
+    for collection in collections:
+        count = collection.count()
+        if count == 0:
+            continue
+        latencies = []
+        for embedding in embeddings:
+            query_start = time.perf_counter()
+            collection.query(query_embeddings=[embedding], n_results=min(5, count), include=[])
+            latencies.append((time.perf_counter() - query_start) * 1000)
+        stats["collections"][collection.name] = {
+            "documents": count,
+            "first_query_ms": round(latencies[0], 2),
+            "last_query_ms": round(latencies[-1], 2),
+        }
+
+    stats["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    logger.info(f"Index warmup finished in {stats['total_ms']}ms: {stats['collections']}")
+    return stats
+
+def index_memory_footprint(collections, dim=EMBEDDING_DIM):
+    """
+    Estimated resident size of the HNSW indexes: per element the float32
+    vector, the level-0 links (2*M neighbours) and hnswlib's label and list
+    headers, plus the upper layers (about 1/M of elements, M links each).
+    """
+    report = {"collections": {}, "estimated_bytes": 0}
+    for collection in collections:
+        count = collection.count()
+        m = (collection.metadata or {}).get("hnsw:M", 16)
+        per_element = dim * 4 + 2 * m * 4 + 4 + 8 + (m * 4 + 4) / max(1, m - 1)
+        size = int(count * per_element)
+        report["collections"][collection.name] = {"documents": count, "M": m, "estimated_bytes": size}
+        report["estimated_bytes"] += size
+    report["estimated_mb"] = round(report["estimated_bytes"] / (1024 * 1024), 2)
+    return report
@@ -0,0 +1,253 @@
+"""
+Versioned snapshots of the news index for fast deploys.
+
+Usage:
+    python index_snapshot.py export --output snapshots
+    python index_snapshot.py restore snapshots                 # latest snapshot in the directory
+    python index_snapshot.py restore snapshots/news-20250101T120000Z --chroma-path ./chroma_db --if-empty
+    python index_snapshot.py verify snapshots
+
+A snapshot is a directory with, for every news collection (one, or one per
+region shard with REGION_PARTITIONING), the embeddings as a float16 .npy
+matrix and the ids, metadata and documents as JSON lines in the same order.
+manifest.json records the embedding model and dimension, the HNSW settings,
+row counts and a sha256 for every file. Restoring bulk-adds the stored
+vectors, which is much faster than re-embedding the dataset with load_data.py.
+Each collection is loaded under a staging name and renamed once complete, so
+an interrupted restore leaves the index as it was and --if-empty retries it.
+Snapshots made with another embedding model or dimension are refused, since
+their vectors are not comparable with the query embeddings.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+from datetime import datetime, timezone
+
+import numpy as np
+
+from index_config import EMBEDDING_MODEL_NAME, EMBEDDING_DIM, get_news_collection, forget_collection
+from region_index import news_collections
+from exact_index import mark_changed
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_DTYPE = os.environ.get("SNAPSHOT_DTYPE", "float16")
+MANIFEST = "manifest.json"
+LATEST = "LATEST"
+EXPORT_BATCH_SIZE = 5000
+RESTORING_SUFFIX = "_restoring"
+
+class SnapshotError(Exception):
+    """The snapshot is incomplete, corrupted or incompatible with this deployment"""
+
+def _sha256(path):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+def _export_collection(collection, directory, dtype):
+    """Write one collection's vectors and records; returns its manifest entry"""
+    count = collection.count()
+    os.makedirs(directory, exist_ok=True)
+    vectors_path = os.path.join(directory, "embeddings.npy")
+    records_path = os.path.join(directory, "records.jsonl")
+
+    # Preallocated on disk so the export never holds the whole matrix in memory
+    vectors = np.lib.format.open_memmap(vectors_path, mode="w+", dtype=dtype, shape=(count, EMBEDDING_DIM))
+    written = 0
+    with open(records_path, "w", encoding="utf-8") as records:
+        while written < count:
+            batch = collection.get(include=["embeddings", "metadatas", "documents"], limit=EXPORT_BATCH_SIZE, offset=written)
+            ids = batch.get("ids") or []
+            if not ids:
+                break
+            embeddings = np.asarray(batch["embeddings"], dtype=np.float32)
+            if embeddings.shape[1] != EMBEDDING_DIM:
+                raise SnapshotError(f"{collection.name} has {embeddings.shape[1]}-dimensional vectors, expected {EMBEDDING_DIM}")
+            vectors[written:written + len(ids)] = embeddings
+            metadatas = batch.get("metadatas") or [None] * len(ids)
+            documents = batch.get("documents") or [None] * len(ids)
+            for doc_id, metadata, document in zip(ids, metadatas, documents):
+                records.write(json.dumps({"id": doc_id, "metadata": metadata, "document": document}, ensure_ascii=False) + "\n")
+            written += len(ids)
+    vectors.flush()
+    del vectors
+    if written != count:
+        raise SnapshotError(f"{collection.name} changed during export ({written} of {count} rows read)")
+
+    return {
+        "name": collection.name,
+        "count": written,
+        "metadata": collection.metadata or {},
+        "files": {
+            name: {"sha256": _sha256(os.path.join(directory, name)), "bytes": os.path.getsize(os.path.join(directory, name))}
+            for name in ("embeddings.npy", "records.jsonl")
+        }
+    }
+
+def export_snapshot(chroma_client, collection, output_dir, dtype=None):
+    """Export every news collection to a new versioned snapshot directory; returns its path"""
+    dtype = dtype or SNAPSHOT_DTYPE
+    start = time.perf_counter()
+    version = datetime.now(timezone.utc).strftime("news-%Y%m%dT%H%M%SZ")
+    path = os.path.join(output_dir, version)
+    tmp = path + ".tmp"
+    os.makedirs(tmp)
+
+    collections = [_export_collection(c, os.path.join(tmp, c.name), dtype) for c in news_collections(chroma_client, collection).values()]
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "version": version,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "embedding_model": EMBEDDING_MODEL_NAME,
+        "embedding_dim": EMBEDDING_DIM,
+        "dtype": dtype,
+        "collections": collections
+    }
+    with open(os.path.join(tmp, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    # Only complete snapshots get their final name and become the latest
+    os.replace(tmp, path)
+    with open(os.path.join(output_dir, LATEST), "w") as f:
+        f.write(version + "\n")
+
+    total = sum(c["count"] for c in collections)
+    size = sum(f["bytes"] for c in collections for f in c["files"].values())
+    logger.info(f"Exported {total} vectors to {path} ({size / (1024 * 1024):.1f}MB) in {time.perf_counter() - start:.1f}s")
+    return path
+
+def resolve_snapshot(path):
+    """A snapshot directory, or the latest one when given the directory holding snapshots"""
+    if os.path.exists(os.path.join(path, MANIFEST)):
+        return path
+    latest = os.path.join(path, LATEST)
+    if os.path.exists(latest):
+        with open(latest) as f:
+            return os.path.join(path, f.read().strip())
+    raise SnapshotError(f"No snapshot found at {path}")
+
+def load_manifest(path, verify=True):
+    """Read and check a snapshot's manifest; with verify, also every file checksum"""
+    manifest_path = os.path.join(path, MANIFEST)
+    if not os.path.exists(manifest_path):
+        raise SnapshotError(f"{path} has no {MANIFEST}")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot format {manifest.get('format_version')}")
+    if manifest.get("embedding_model") != EMBEDDING_MODEL_NAME or manifest.get("embedding_dim") != EMBEDDING_DIM:
+        raise SnapshotError(
+            f"Snapshot was built with {manifest.get('embedding_model')} ({manifest.get('embedding_dim')} dims), "
+            f"this deployment uses {EMBEDDING_MODEL_NAME} ({EMBEDDING_DIM} dims)"
+        )
+    if verify:
+        for entry in manifest["collections"]:
+            for name, expected in entry["files"].items():
+                file_path = os.path.join(path, entry["name"], name)
+                if not os.path.exists(file_path) or _sha256(file_path) != expected["sha256"]:
+                    raise SnapshotError(f"Checksum mismatch for {entry['name']}/{name}")
+    return manifest
+
+def _drop_collection(chroma_client, name):
+    try:
+        chroma_client.delete_collection(name)
+    except Exception:
+        pass  # nothing to drop
+    forget_collection(chroma_client, name)
+
+def _restore_collection(chroma_client, directory, entry, replace=False, if_empty=False):
+    name = entry["name"]
+    existing = get_news_collection(chroma_client, name)
+    if existing.count():
+        if if_empty:
+            logger.info(f"{name} already has {existing.count()} items, skipping restore")
+            return 0
+        if not replace:
+            raise SnapshotError(f"{name} is not empty; use --replace or --if-empty")
+
+    # Load into a staging collection and swap it in when complete, so an
+    # interrupted restore never leaves a partial collection under the real name
+    staging_name = name + RESTORING_SUFFIX
+    _drop_collection(chroma_client, staging_name)
+    staging = get_news_collection(chroma_client, staging_name)
+    try:
+        vectors = np.load(os.path.join(directory, "embeddings.npy"), mmap_mode="r")
+        batch_size = min(EXPORT_BATCH_SIZE, chroma_client.get_max_batch_size())
+        restored = 0
+        with open(os.path.join(directory, "records.jsonl"), encoding="utf-8") as f:
+            while True:
+                records = [json.loads(line) for _, line in zip(range(batch_size), f)]
+                if not records:
+                    break
+                staging.add(
+                    ids=[r["id"] for r in records],
+                    embeddings=vectors[restored:restored + len(records)].astype(np.float32).tolist(),
+                    metadatas=[r["metadata"] for r in records],
+                    documents=[r["document"] for r in records] if any(r["document"] is not None for r in records) else None
+                )
+                restored += len(records)
+        if restored != entry["count"]:
+            raise SnapshotError(f"{name}: restored {restored} rows, manifest lists {entry['count']}")
+    except Exception:
+        _drop_collection(chroma_client, staging_name)
+        raise
+
+    _drop_collection(chroma_client, name)
+    staging.modify(name=name)
+    forget_collection(chroma_client, staging_name)
+    mark_changed(get_news_collection(chroma_client, name))
+    return restored
+
+def restore_snapshot(chroma_client, path, replace=False, if_empty=False, verify=True):
+    """Bulk-load a snapshot into a Chroma client; returns the number of vectors added"""
+    start = time.perf_counter()
+    path = resolve_snapshot(path)
+    manifest = load_manifest(path, verify=verify)
+    restored = 0
+    for entry in manifest["collections"]:
+        restored += _restore_collection(chroma_client, os.path.join(path, entry["name"]), entry, replace, if_empty)
+    logger.info(f"Restored {restored} vectors from {manifest['version']} in {time.perf_counter() - start:.1f}s")
+    return restored
+
+if __name__ == "__main__":
+    import sys
+    import argparse
+    import chromadb
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Export and restore news index snapshots")
+    parser.add_argument("--chroma-path", default="./chroma_db")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="write a new snapshot")
+    export_parser.add_argument("--output", default="snapshots", help="directory holding snapshots")
+    export_parser.add_argument("--dtype", default=SNAPSHOT_DTYPE, choices=["float16", "float32"])
+    restore_parser = commands.add_parser("restore", help="load a snapshot into the index")
+    restore_parser.add_argument("path", help="snapshot directory, or the directory holding snapshots for the latest")
+    restore_parser.add_argument("--replace", action="store_true", help="replace collections that already have data")
+    restore_parser.add_argument("--if-empty", action="store_true", help="skip collections that already have data")
+    verify_parser = commands.add_parser("verify", help="check a snapshot's model version and checksums")
+    verify_parser.add_argument("path")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "verify":
+            manifest = load_manifest(resolve_snapshot(args.path))
+            print(f"{manifest['version']}: {sum(c['count'] for c in manifest['collections'])} vectors, OK")
+        else:
+            client = chromadb.PersistentClient(path=args.chroma_path)
+            if args.command == "export":
+                print(export_snapshot(client, get_news_collection(client), args.output, args.dtype))
+            else:
+                restore_snapshot(client, args.path, replace=args.replace, if_empty=args.if_empty)
+    except SnapshotError as e:
+        logger.error(str(e))
+        sys.exit(1)
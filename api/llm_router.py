@@ -0,0 +1,360 @@
+import os
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+from openai import OpenAI
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv(".env.local")
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# API keys and endpoints
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+if not OPENAI_API_KEY:
+    logger.warning("OPENAI_API_KEY not found in environment variables")
+
+GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
+if not GROQ_API_KEY:
+    logger.warning("GROQ_API_KEY not found in environment variables")
+
+GROQ_API_URL = os.environ.get("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
+
+# Initialize OpenAI client only if API key is available.
+# OPENAI_BASE_URL points it at a local mock server for load tests.
+openai_client = None
+if OPENAI_API_KEY:
+    openai_client = OpenAI(api_key=OPENAI_API_KEY, base_url=os.environ.get("OPENAI_BASE_URL") or None)
+
+# Routing configuration
+HEDGING_ENABLED = os.environ.get("LLM_HEDGING_ENABLED", "true").lower() == "true"
+HEDGE_PERCENTILE = float(os.environ.get("LLM_HEDGE_PERCENTILE", "95"))
+HEDGE_DEFAULT_DELAY = float(os.environ.get("LLM_HEDGE_DEFAULT_DELAY", "8.0"))
+HEDGE_MIN_DELAY = float(os.environ.get("LLM_HEDGE_MIN_DELAY", "0.5"))
+MAX_HEDGES = int(os.environ.get("LLM_MAX_HEDGES", "1"))
+REQUEST_TIMEOUT = float(os.environ.get("LLM_REQUEST_TIMEOUT", "60"))
+
+STATS_WINDOW = 200
+MIN_SAMPLES = 20
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("LLM_BREAKER_FAILURES", "5"))
+BREAKER_ERROR_RATE = float(os.environ.get("LLM_BREAKER_ERROR_RATE", "0.5"))
+BREAKER_COOLDOWN = float(os.environ.get("LLM_BREAKER_COOLDOWN", "30"))
+
+# Ordered (provider, model) targets per API model name. The first target is the
+# primary; the rest are used for hedged requests and fallbacks.
+MODEL_ROUTES = {
+    "chatgpt": [("openai", "gpt-4o-mini"), ("groq", "llama3-70b-8192")],
+    "llama": [("groq", "llama3-70b-8192"), ("openai", "gpt-4o-mini")],
+    "deepseek": [("groq", "deepseek-r1-distill-llama-70b"), ("groq", "llama3-70b-8192")],
+    "analysis": [("openai", "gpt-4o"), ("groq", "gemma-7b-it")],
+}
+
+class ProviderError(Exception):
+    """An LLM provider call failed. Non-retryable errors (bad requests) skip the fallbacks."""
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+class LLMResult:
+    """Text and metadata of a completed LLM call"""
+
+    def __init__(self, text, usage, provider, model, latency, hedged=False):
+        self.text = text
+        self.usage = usage
+        self.provider = provider
+        self.model = model
+        self.latency = latency
+        self.hedged = hedged
+
+class LatencyStats:
+    """Rolling latency and error rate of one (provider, model) target"""
+
+    def __init__(self, window=STATS_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self.lock:
+            self.samples.append((latency, ok))
+
+    def percentile(self, q):
+        with self.lock:
+            latencies = sorted(latency for latency, ok in self.samples if ok)
+        if len(latencies) < MIN_SAMPLES:
+            return None
+        index = min(len(latencies) - 1, int(round(q / 100 * (len(latencies) - 1))))
+        return latencies[index]
+
+    def error_rate(self):
+        with self.lock:
+            if not self.samples:
+                return 0.0
+            return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def snapshot(self):
+        return {
+            "samples": len(self.samples),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "error_rate": round(self.error_rate(), 3)
+        }
+
+class CircuitBreaker:
+    """
+    Per-provider circuit breaker. Opens after consecutive failures or a high error
+    rate, rejects calls for the cooldown, then lets a single trial call through.
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def acquire(self):
+        """Admit a call: "closed" for a normal call, "trial" for the half-open trial, None when rejected"""
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return "closed"
+            if state == "half-open" and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return "trial"
+            return None
+
+    def allow(self):
+        return self.acquire() is not None
+
+    def release_trial(self):
+        """Free the trial slot of a trial call that was cancelled before it ran"""
+        with self.lock:
+            self.trial_in_flight = False
+
+    def record(self, ok, error_rate=0.0, samples=0):
+        with self.lock:
+            self.trial_in_flight = False
+            if ok:
+                self.consecutive_failures = 0
+                self.opened_at = None
+                return
+            self.consecutive_failures += 1
+            if (self.consecutive_failures >= self.failure_threshold
+                    or (samples >= MIN_SAMPLES and error_rate >= BREAKER_ERROR_RATE)):
+                if self.opened_at is None or self.state == "half-open":
+                    logger.warning(f"Circuit breaker opened after {self.consecutive_failures} failures")
+                self.opened_at = time.monotonic()
+
+_stats = {}
+_breakers = {}
+_registry_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("LLM_ROUTER_WORKERS", "32")),
+                               thread_name_prefix="llm-router")
+
+def get_stats(provider, model):
+    with _registry_lock:
+        return _stats.setdefault((provider, model), LatencyStats())
+
+def get_breaker(provider):
+    with _registry_lock:
+        return _breakers.setdefault(provider, CircuitBreaker())
+
+def provider_configured(provider):
+    if provider == "openai":
+        return openai_client is not None
+    if provider == "groq":
+        return bool(GROQ_API_KEY)
+    return False
+
+def _usage_dict(usage):
+    if usage is None:
+        return None
+    if isinstance(usage, dict):
+        return usage
+    return {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens}
+
+def _call_openai(model, messages, max_tokens, temperature, timeout):
+    try:
+        response = openai_client.with_options(timeout=timeout, max_retries=0).chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+    except Exception as e:
+        status = getattr(e, "status_code", None)
+        raise ProviderError(f"OpenAI API Error: {str(e)}",
+                            retryable=status is None or status >= 500 or status == 429)
+    return response.choices[0].message.content, _usage_dict(response.usage)
+
+def _call_groq(model, messages, max_tokens, temperature, timeout):
+    headers = {
+        "Authorization": f"Bearer {GROQ_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    payload = {
+        "model": model,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": temperature
+    }
+    try:
+        response = requests.post(GROQ_API_URL, headers=headers, json=payload, timeout=timeout)
+    except requests.RequestException as e:
+        raise ProviderError(f"Groq API Error: {str(e)}")
+
+    if response.status_code != 200:
+        raise ProviderError(f"Groq API Error: {response.status_code} - {response.text}",
+                            retryable=response.status_code >= 500 or response.status_code == 429)
+    response_json = response.json()
+    return response_json['choices'][0]['message']['content'].strip(), response_json.get('usage')
+
+PROVIDERS = {
+    "openai": _call_openai,
+    "groq": _call_groq,
+}
+
+def _call_target(target, messages, max_tokens, temperature, timeout):
+    """Call one target and record its latency and outcome, also when its result is discarded"""
+    provider, model = target
+    stats = get_stats(provider, model)
+    breaker = get_breaker(provider)
+    start = time.perf_counter()
+    try:
+        text, usage = PROVIDERS[provider](model, messages, max_tokens, temperature, timeout)
+    except ProviderError as e:
+        latency = time.perf_counter() - start
+        if e.retryable:
+            stats.record(latency, False)
+            breaker.record(False, stats.error_rate(), len(stats.samples))
+        else:
+            breaker.record(True)
+        raise
+    except Exception as e:
+        stats.record(time.perf_counter() - start, False)
+        breaker.record(False, stats.error_rate(), len(stats.samples))
+        raise ProviderError(f"{provider} error: {str(e)}")
+
+    latency = time.perf_counter() - start
+    stats.record(latency, True)
+    breaker.record(True)
+    return LLMResult(text, usage, provider, model, latency)
+
+def hedge_delay(target):
+    """How long to wait on a target before sending a hedged duplicate request"""
+    p = get_stats(*target).percentile(HEDGE_PERCENTILE)
+    return max(HEDGE_MIN_DELAY, p if p is not None else HEDGE_DEFAULT_DELAY)
+
+def complete(route, messages, max_tokens=800, temperature=0.7, timeout=None):
+    """
+    Run a chat completion for a route name from MODEL_ROUTES.
+
+    The primary target is called first. If it hasn't answered by its latency
+    percentile, a hedged duplicate goes to the next target and the first success
+    wins; the slower call is cancelled if it hasn't started, or its result is
+    discarded. Failed calls fall back to the next target, and targets whose
+    provider circuit breaker is open are skipped.
+    """
+    timeout = timeout or REQUEST_TIMEOUT
+    targets = [t for t in MODEL_ROUTES.get(route, []) if provider_configured(t[0])]
+    if not targets:
+        raise ProviderError(f"No configured provider for model: {route}", retryable=False)
+
+    remaining = list(targets)
+    pending = {}
+    errors = []
+    hedges = 0
+    deadline = time.monotonic() + timeout
+
+    def launch():
+        # Skip targets whose provider circuit is open
+        while remaining:
+            target = remaining.pop(0)
+            breaker = get_breaker(target[0])
+            admission = breaker.acquire()
+            if admission is None:
+                errors.append(f"{target[0]} circuit open")
+                continue
+            # Run in a copy of the caller's context so logs keep the request id
+            future = _executor.submit(contextvars.copy_context().run, _call_target,
+                                      target, messages, max_tokens, temperature, timeout)
+            if admission == "trial":
+                # A trial cancelled before it starts never records an outcome
+                future.add_done_callback(lambda f, breaker=breaker: f.cancelled() and breaker.release_trial())
+            pending[future] = target
+            return target
+        return None
+
+    primary = launch()
+    if primary is None:
+        raise ProviderError(f"All providers for {route} are unavailable (circuit open)")
+
+    while pending:
+        now = time.monotonic()
+        if now >= deadline:
+            break
+        can_hedge = HEDGING_ENABLED and remaining and hedges < MAX_HEDGES
+        wait_for = deadline - now
+        if can_hedge:
+            wait_for = min(wait_for, hedge_delay(primary))
+
+        done, _ = wait(list(pending), timeout=wait_for, return_when=FIRST_COMPLETED)
+        if not done:
+            if can_hedge:
+                target = launch()
+                hedges += 1
+                if target:
+                    logger.info(f"Hedging {primary[0]}/{primary[1]} with {target[0]}/{target[1]}")
+            continue
+
+        for future in done:
+            target = pending.pop(future)
+            try:
+                result = future.result()
+            except ProviderError as e:
+                logger.error(f"{target[0]}/{target[1]} failed: {str(e)}")
+                errors.append(str(e))
+                if not e.retryable:
+                    for other in pending:
+                        other.cancel()
+                    raise
+                if not pending and remaining:
+                    launch()
+                continue
+
+            for other in pending:
+                other.cancel()
+            result.hedged = hedges > 0
+            logger.info(f"Completed with {result.provider}/{result.model} in {result.latency:.2f}s")
+            return result
+
+    for other in pending:
+        other.cancel()
+    raise ProviderError("; ".join(errors) if errors else f"LLM request timed out after {timeout}s")
+
+def router_stats():
+    """Latency, error rate and breaker state per target, for the health endpoint"""
+    with _registry_lock:
+        stats = dict(_stats)
+        breakers = dict(_breakers)
+    return {
+        "targets": {f"{provider}/{model}": s.snapshot() for (provider, model), s in stats.items()},
+        "breakers": {provider: b.state for provider, b in breakers.items()}
+    }
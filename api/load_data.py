@@ -2,6 +2,10 @@
 import pandas as pd
 import chromadb
 from sentence_transformers import SentenceTransformer
+from news_dates import parse_date_to_epoch
+from region_classifier import classify_batch, region_metadata
+from region_index import add_news
+from index_config import EMBEDDING_MODEL_NAME, get_news_collection
 
 # Load Dataset
 df = pd.read_csv("dataset.csv")  
@@ -11,14 +15,19 @@ df = df.fillna("")
 
 # Ensure 'CompactedSummary' column is of type string
 df["CompactedSummary"] = df["CompactedSummary"].astype(str)
+
+# Tag regions for the whole dataset in one pass
+detailed = df["DetailedSummary"].astype(str) if "DetailedSummary" in df else ""
+region_results = classify_batch((df["CompactedSummary"] + " " + detailed).tolist(), multi=True)
+
 # Initialize ChromaDB client
 chroma_client = chromadb.PersistentClient(path="./chroma_db")  # Persistent storage
 # Create Collection
-collection = chroma_client.get_or_create_collection(name="news_data")
+collection = get_news_collection(chroma_client)
 # Load Embedding Model
-embed_model = SentenceTransformer("all-MiniLM-L6-v2")  
+embed_model = SentenceTransformer(EMBEDDING_MODEL_NAME)  
 
-for index, row in df.iterrows():
+for (index, row), regions in zip(df.iterrows(), region_results):
     doc_id = str(index)
     text = row["CompactedSummary"]
 
@@ -31,12 +40,17 @@ for index, row in df.iterrows():
         "subject": row.get("Subject", ""),
         "detailed_summary": row.get("DetailedSummary", ""),
         "impact": row.get("Impact", ""),
+        **region_metadata(regions),
     }
+    # Numeric date so retrieval can range-filter on it
+    timestamp = parse_date_to_epoch(metadata["date"])
+    if timestamp is not None:
+        metadata["timestamp"] = timestamp
     
     # Generate Embedding
     embedding = embed_model.encode(text).tolist()
     
-    # Add to ChromaDB
-    collection.add(ids=[doc_id], embeddings=[embedding], metadatas=[metadata])
+    # Add to ChromaDB, routed to the region shard when partitioning is enabled
+    add_news(chroma_client, collection, ids=[doc_id], embeddings=[embedding], metadatas=[metadata])
 
 print("Dataset Indexed Successfully!")
\ No newline at end of file
@@ -0,0 +1,298 @@
+"""
+Reproducible load test for the Flask API (app.py) and the FastAPI news service
+(app/trending/backend.py) against local stand-ins.
+
+Both services run in-process on real HTTP servers, in a temporary working
+directory with a seeded Chroma corpus. LLM calls go to mock OpenAI/Groq servers
+with configurable latency, news searches go to a mock GNews/NewsAPI server, and
+MongoDB is either mongomock (default) or a local instance given with --mongo-uri.
+
+Usage:
+    python loadtest.py --concurrency 8 --requests 200 --llm-latency-ms 400
+    python loadtest.py --endpoints ask,relevant-news --json results.json
+
+For each endpoint it reports throughput and p50/p95/p99 latency, and for each
+pipeline stage the p50/p95/p99 estimated from the /metrics histograms.
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_PATH = os.path.join(API_DIR, "..", "app", "trending", "backend.py")
+
+ENDPOINTS = ["ask", "upload", "relevant-news", "search-news"]
+QUERIES = [
+    "What's happening with gold prices today?",
+    "How are US tech stocks performing this week?",
+    "Latest news on oil supply in the Middle East",
+    "Is inflation in Europe slowing down?",
+    "Bitcoin price outlook after the latest rally",
+    "How did Asian markets react to the central bank decision?",
+]
+REGIONS = ["Global", "North America", "Europe", "Asia Pacific", "Middle East"]
+UPLOAD_TEXT = (
+    "Quarterly Financial Report\n"
+    "Total Revenue: $1,250.5M, up 8% year over year.\n"
+    "Net Income: $210.3M\nEarnings Per Share: $2.15\nEBITDA: $340.0M\n"
+    "Gross Margin: 42.5%\nOperating Margin: 18.2%\nReturn on Equity: 16.4%\n"
+) * 40
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+def seed_corpus(chroma_client, size, dim=384, seed=42):
+    """Fill news_data with synthetic articles spread over regions and the last 30 days"""
+    rng = np.random.default_rng(seed)
+    from index_config import get_news_collection
+
+    collection = get_news_collection(chroma_client)
+    now = int(time.time())
+    batch_size = 1000
+    for offset in range(0, size, batch_size):
+        n = min(batch_size, size - offset)
+        vectors = rng.standard_normal((n, dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        metadatas = []
+        for i in range(n):
+            timestamp = now - int(rng.integers(0, 30 * 86400))
+            metadatas.append({
+                "title": f"Seeded article {offset + i}",
+                "source": "Seed",
+                "date": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(timestamp)),
+                "timestamp": timestamp,
+                "region": REGIONS[int(rng.integers(0, len(REGIONS)))],
+                "detailed_summary": f"Synthetic market summary {offset + i}. " * int(rng.integers(5, 30))
+            })
+        collection.add(ids=[f"seed-{offset + i}" for i in range(n)], embeddings=vectors.tolist(), metadatas=metadatas)
+    return collection
+
+def start_stand_ins(args):
+    """Start mock LLM and news servers and point the services at them"""
+    from mock_llm_server import start_server as start_llm_server
+    from mock_news_server import start_server as start_news_server
+
+    llm_options = dict(latency_ms=args.llm_latency_ms, jitter_ms=args.llm_latency_ms * 0.2,
+                       slow_rate=args.llm_slow_rate, error_rate=args.llm_error_rate, seed=args.seed)
+    openai_server, _ = start_llm_server(**llm_options)
+    groq_server, _ = start_llm_server(**llm_options)
+    news_server = start_news_server(latency_ms=args.news_latency_ms, seed=args.seed)
+
+    os.environ.update({
+        "OPENAI_API_KEY": "mock",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{openai_server.server_port}/v1",
+        "GROQ_API_KEY": "mock",
+        "GROQ_API_URL": f"http://127.0.0.1:{groq_server.server_port}/openai/v1/chat/completions",
+        "GNEWS_API_KEY": "mock",
+        "GNEWS_API_URL": f"http://127.0.0.1:{news_server.server_port}/api/v4/search",
+        "NEWS_API_KEY": "mock",
+        "NEWS_API_URL": f"http://127.0.0.1:{news_server.server_port}/v2/everything",
+    })
+    if not args.rate_limit:
+        os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+def use_mongo(args):
+    if args.mongo_uri:
+        os.environ["MONGODB_URI"] = args.mongo_uri
+        return
+    import pymongo
+    import mongomock
+    import mongomock.gridfs
+
+    mongomock.gridfs.enable_gridfs_integration()
+    pymongo.MongoClient = mongomock.MongoClient
+
+def serve_flask(flask_app):
+    from werkzeug.serving import make_server
+
+    server = make_server("127.0.0.1", 0, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+def serve_fastapi(fastapi_app):
+    import socket
+    import uvicorn
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    server = uvicorn.Server(uvicorn.Config(fastapi_app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+def load_services():
+    """Import both services from the temporary working directory"""
+    sys.path.insert(0, API_DIR)
+    import app as flask_service
+
+    spec = importlib.util.spec_from_file_location("backend", BACKEND_PATH)
+    news_service = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(news_service)
+    return flask_service, news_service
+
+def make_request(endpoint, session, urls, rng, user_id):
+    query = rng.choice(QUERIES)
+    if endpoint == "ask":
+        return session.post(f"{urls['api']}/ask", json={
+            "model": rng.choice(["chatgpt", "llama", "deepseek"]),
+            "prompt": query,
+            "region": rng.choice(REGIONS),
+            "userId": user_id
+        })
+    if endpoint == "upload":
+        return session.post(f"{urls['api']}/upload",
+                            files={"file": ("report.txt", UPLOAD_TEXT.encode("utf-8"), "text/plain")},
+                            data={"user_id": user_id})
+    if endpoint == "relevant-news":
+        return session.get(f"{urls['news']}/relevant-news", params={"query": query, "region": rng.choice(REGIONS)})
+    return session.get(f"{urls['news']}/search-news", params={"query": rng.choice(["gold", "oil", "stocks"])})
+
+def run_endpoint(endpoint, urls, args):
+    """Drive one endpoint at the configured concurrency; returns latencies and error count"""
+    import requests
+
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    counter = iter(range(args.requests))
+    counter_lock = threading.Lock()
+
+    def worker(worker_id):
+        rng = random.Random(args.seed + worker_id)
+        session = requests.Session()
+        while True:
+            with counter_lock:
+                if next(counter, None) is None:
+                    return
+            start = time.perf_counter()
+            try:
+                response = make_request(endpoint, session, urls, rng, f"loadtest-{worker_id}")
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors[0] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(worker, range(args.concurrency)))
+    wall = time.perf_counter() - start
+    return latencies, errors[0], wall
+
+_BUCKET_LINE = re.compile(r'^finbot_stage_duration_seconds_bucket\{stage="([^"]+)",le="([^"]+)"\} (\d+)$')
+
+def scrape_stage_buckets(url):
+    import requests
+
+    buckets = {}
+    for line in requests.get(f"{url}/metrics").text.splitlines():
+        match = _BUCKET_LINE.match(line)
+        if match:
+            stage, le, count = match.groups()
+            buckets.setdefault(stage, {})[float("inf") if le == "+Inf" else float(le)] = int(count)
+    return buckets
+
+def stage_quantiles(before, after):
+    """p50/p95/p99 per stage from histogram deltas, interpolated within buckets"""
+    report = {}
+    for stage, counts in after.items():
+        previous = before.get(stage, {})
+        bounds = sorted(counts)
+        cumulative = [counts[b] - previous.get(b, 0) for b in bounds]
+        total = cumulative[-1]
+        if not total:
+            continue
+        quantiles = {}
+        for q in (50, 95, 99):
+            target = total * q / 100
+            lower_bound, lower_count = 0.0, 0
+            for bound, count in zip(bounds, cumulative):
+                if count >= target:
+                    if bound == float("inf"):
+                        quantiles[f"p{q}"] = lower_bound
+                    else:
+                        share = (target - lower_count) / max(1, count - lower_count)
+                        quantiles[f"p{q}"] = lower_bound + (bound - lower_bound) * share
+                    break
+                lower_bound, lower_count = bound, count
+        report[stage] = {"count": total, **{k: round(v * 1000, 1) for k, v in quantiles.items()}}
+    return report
+
+def main(args):
+    workdir = tempfile.mkdtemp(prefix="finbot_loadtest_")
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        start_stand_ins(args)
+        use_mongo(args)
+
+        import chromadb
+        seed_corpus(chromadb.PersistentClient(path="./chroma_db"), args.corpus_size, seed=args.seed)
+
+        flask_service, news_service = load_services()
+        urls = {"api": serve_flask(flask_service.app), "news": serve_fastapi(news_service.app)}
+
+        results = {"config": vars(args), "endpoints": {}, "stages": {}}
+        for endpoint in args.endpoints.split(","):
+            service_url = urls["news"] if endpoint in ("relevant-news", "search-news") else urls["api"]
+            before = scrape_stage_buckets(service_url)
+            latencies, errors, wall = run_endpoint(endpoint, urls, args)
+            after = scrape_stage_buckets(service_url)
+
+            results["endpoints"][endpoint] = {
+                "requests": len(latencies),
+                "errors": errors,
+                "throughput_rps": round(len(latencies) / wall, 2),
+                "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            }
+            results["stages"][endpoint] = stage_quantiles(before, after)
+
+        print(f"\n{'endpoint':<15} {'reqs':>6} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for endpoint, r in results["endpoints"].items():
+            print(f"{endpoint:<15} {r['requests']:>6} {r['errors']:>6} {r['throughput_rps']:>8} "
+                  f"{r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8}")
+            for stage, s in results["stages"][endpoint].items():
+                print(f"  {stage:<13} {s['count']:>6} {'':>6} {'':>8} {s.get('p50', 0):>8} "
+                      f"{s.get('p95', 0):>8} {s.get('p99', 0):>8}")
+
+        if args.json:
+            with open(os.path.join(previous_cwd, args.json), "w") as f:
+                json.dump(results, f, indent=2)
+    finally:
+        os.chdir(previous_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FinBot load test with mocked LLM, Mongo and news providers")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma-separated subset of " + ",".join(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="requests per endpoint")
+    parser.add_argument("--corpus-size", type=int, default=5000, help="seeded Chroma documents")
+    parser.add_argument("--llm-latency-ms", type=float, default=400)
+    parser.add_argument("--llm-slow-rate", type=float, default=0.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--news-latency-ms", type=float, default=150)
+    parser.add_argument("--mongo-uri", default=None, help="use a local MongoDB instead of mongomock")
+    parser.add_argument("--rate-limit", action="store_true", help="keep rate limiting enabled")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", default=None, help="write results to this file")
+    main(parser.parse_args())
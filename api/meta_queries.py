@@ -0,0 +1,271 @@
+"""
+Fast path for questions about the search engine itself (isMetaQuery in /ask).
+
+Questions are answered, in order, from:
+1. an exact-text cache of previous answers (no embedding, no database)
+2. an intent index of known system questions with prepared answers and of
+   previously generated answers, matched by embedding similarity
+3. an LLM call, whose answer is stored in the meta_query_cache collection and
+   added to the intent index so later paraphrases are matched too
+"""
+import os
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+from llm_router import complete as llm_complete
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Cosine similarity above which a question is treated as a known intent
+META_MATCH_THRESHOLD = float(os.environ.get("META_MATCH_THRESHOLD", "0.72"))
+META_CACHE_TTL_DAYS = int(os.environ.get("META_CACHE_TTL_DAYS", "30"))
+META_EXACT_CACHE_SIZE = 1000
+
+META_SYSTEM_MESSAGE = """You are a helpful assistant explaining how the financial search engine works.
+Provide clear, concise explanations about the system's functionality, features, and capabilities.
+
+IMPORTANT: DO NOT use <Thinking> or <Thinking> tags in your response.
+DO NOT include phrases like "Let me think about this" or "Analyzing this step by step".
+DO NOT number your reasoning steps or include any meta-commentary about your thinking process.
+"""
+
+# Known system questions: example phrasings and the prepared answer
+INTENTS = {
+    "overview": {
+        "questions": [
+            "How does this search engine work?",
+            "How does this work?",
+            "What is this system?",
+            "Explain how the search works",
+            "What happens when I ask a question?",
+        ],
+        "answer": """## How the search engine works
+
+- **Retrieval**: your question is turned into an embedding and matched against a vector index of recent financial news and market summaries.
+- **Filtering**: results are narrowed to the region you selected and, when given, to a date range, with newer articles weighted higher.
+- **Answering**: the most relevant articles are passed to the language model you picked, which writes a concise answer grounded in them.
+- **Documents**: when you upload a report, follow-up questions are answered from that document instead of the news index.""",
+    },
+    "features": {
+        "questions": [
+            "What can this search engine do?",
+            "What features does the system have?",
+            "What are the capabilities of the search engine?",
+            "What functionality do you offer?",
+        ],
+        "answer": """## What you can do
+
+- **Ask about markets**: stocks, commodities, currencies, crypto, rates and the economy, answered from recent news.
+- **Filter by region**: Global, North America, Europe, Asia Pacific, Middle East, Africa or Latin America.
+- **Choose a model**: ChatGPT, Llama or DeepSeek.
+- **Upload documents**: PDF, DOCX or TXT financial reports are analysed for key metrics, ratios and risks, and you can ask follow-up questions about them.
+- **Trending news**: browse and search the latest financial headlines.
+- **History**: previous conversations are saved and can be reopened.""",
+    },
+    "limitations": {
+        "questions": [
+            "What are the limitations of the search engine?",
+            "What can't the system do?",
+            "Is the information always accurate?",
+            "Can I trust the answers?",
+        ],
+        "answer": """## Limitations
+
+- **Not financial advice**: answers summarise news and documents; they are not investment recommendations.
+- **Coverage**: answers depend on the news that has been indexed, so very recent or niche events may be missing.
+- **Model errors**: language models can misread sources or state things with too much confidence; check important figures against the original source.
+- **Documents**: scanned PDFs without a text layer cannot be read, and very long documents are condensed before analysis.""",
+    },
+    "sources": {
+        "questions": [
+            "Where does the data come from?",
+            "What news sources do you use?",
+            "How often is the data updated?",
+            "Which data sources power the search engine?",
+        ],
+        "answer": """## Data sources
+
+- **News APIs**: articles are fetched from GNews and NewsAPI and indexed as they come in, with syndicated copies of the same story merged.
+- **Historical dataset**: a curated dataset of financial news summaries provides background coverage.
+- **Your documents**: files you upload are stored privately with your account and used only for your questions.""",
+    },
+    "regions": {
+        "questions": [
+            "How does the region filter work?",
+            "What does selecting a region do?",
+            "Which regions are supported?",
+        ],
+        "answer": """## Regions
+
+Every article is tagged with the regions it is about. When you select a region, retrieval is limited to articles for that region and the answer focuses on it. **Global** searches everything. Supported regions are Global, North America, Europe, Asia Pacific, Middle East, Africa and Latin America.""",
+    },
+    "models": {
+        "questions": [
+            "Which AI models do you use?",
+            "What is the difference between the models?",
+            "Which model should I choose?",
+        ],
+        "answer": """## Models
+
+- **ChatGPT** (GPT-4o mini): balanced quality and speed, a good default.
+- **Llama** (Llama 3 70B): fast answers through Groq.
+- **DeepSeek** (R1 distill): stronger step-by-step reasoning, sometimes slower.
+
+If a provider is slow or unavailable, the request is automatically served by a backup model.""",
+    },
+    "documents": {
+        "questions": [
+            "How do I upload a document?",
+            "What file types can I upload?",
+            "How does document analysis work?",
+        ],
+        "answer": """## Document analysis
+
+Upload a **PDF, DOCX or TXT** file with the attachment button. The text is extracted, key financial metrics, ratios and business segments are identified, and the model writes an analysis with strengths, weaknesses and outlook. You can then ask follow-up questions about the same document.""",
+    },
+    "feedback": {
+        "questions": [
+            "How can I improve the search?",
+            "I found a bug in the search",
+            "There is a problem with the search results",
+            "How do I report an issue with the system?",
+        ],
+        "answer": """## Getting better results
+
+- **Be specific**: name the asset, company or market and the time frame you care about.
+- **Pick a region** when the question is about a particular market.
+- **Try another model** if an answer misses the point.
+
+If you think something is broken, please report it with the question you asked and the region and model you used so it can be reproduced.""",
+    },
+}
+
+def normalize_question(text):
+    """Lower-case, strip punctuation and collapse whitespace for exact-text matching"""
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", (text or "").lower())).strip()
+
+class MetaQueryAnswerer:
+    """Answers meta-queries from caches and an intent index, calling the LLM only on a miss"""
+
+    def __init__(self, embed_model, cache_collection=None, threshold=None):
+        self.embed_model = embed_model
+        self.cache_collection = cache_collection
+        self.threshold = threshold if threshold is not None else META_MATCH_THRESHOLD
+        self.exact = OrderedDict()
+        self.answers = []
+        self.vectors = None
+        self.lock = threading.Lock()
+        self.counts = {"exact": 0, "intent": 0, "cache": 0, "llm": 0}
+
+        if cache_collection is not None:
+            try:
+                cache_collection.create_index("created_at", expireAfterSeconds=META_CACHE_TTL_DAYS * 86400)
+            except Exception as e:
+                logger.error(f"Could not create meta-query cache index: {str(e)}")
+        self._build_index()
+
+    def _encode(self, texts):
+        return np.asarray(self.embed_model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+    def _build_index(self):
+        """Embed the intent phrasings and previously generated answers"""
+        start = time.perf_counter()
+        questions = []
+        for intent, spec in INTENTS.items():
+            for question in spec["questions"]:
+                questions.append(question)
+                self.answers.append((spec["answer"], "intent"))
+                self._remember(question, spec["answer"], "intent")
+
+        if self.cache_collection is not None:
+            try:
+                for doc in self.cache_collection.find({}, {"question": 1, "answer": 1}):
+                    questions.append(doc["question"])
+                    self.answers.append((doc["answer"], "cache"))
+                    self._remember(doc["question"], doc["answer"], "cache")
+            except Exception as e:
+                logger.error(f"Could not load cached meta-query answers: {str(e)}")
+
+        self.vectors = self._encode(questions)
+        logger.info(f"Meta-query index built with {len(questions)} questions in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    def _remember(self, question, answer, source):
+        key = normalize_question(question)
+        self.exact[key] = (answer, source)
+        self.exact.move_to_end(key)
+        while len(self.exact) > META_EXACT_CACHE_SIZE:
+            self.exact.popitem(last=False)
+
+    def _add(self, question, answer, vector):
+        with self.lock:
+            self.vectors = np.vstack([self.vectors, vector[None, :]])
+            self.answers.append((answer, "cache"))
+            self._remember(question, answer, "cache")
+
+    def _generate(self, prompt):
+        user_message = f"""The user is asking about the search engine itself, not about financial information.
+Please answer their question about the system:
+
+USER QUERY: {prompt}
+
+Provide a helpful response about the search engine's functionality."""
+        result = llm_complete(
+            "chatgpt",
+            [
+                {"role": "system", "content": META_SYSTEM_MESSAGE},
+                {"role": "user", "content": user_message}
+            ],
+            max_tokens=500,
+            temperature=0.7
+        )
+        return result.text
+
+    def answer(self, prompt, clean=None):
+        """
+        Returns (answer, source) where source is "exact", "intent", "cache" or "llm".
+        `clean` post-processes generated answers before they are cached.
+        Provider errors from the LLM call are raised to the caller.
+        """
+        hit = self.exact.get(normalize_question(prompt))
+        if hit:
+            self.counts["exact"] += 1
+            return hit[0], "exact"
+
+        vector = self._encode([prompt])[0]
+        with self.lock:
+            vectors, answers = self.vectors, list(self.answers)
+        scores = vectors @ vector
+        best = int(np.argmax(scores))
+        if scores[best] >= self.threshold:
+            answer, source = answers[best]
+            self.counts[source] += 1
+            with self.lock:
+                self._remember(prompt, answer, source)
+            logger.info(f"Meta-query matched a known {source} answer (similarity {scores[best]:.2f})")
+            return answer, source
+
+        answer = self._generate(prompt)
+        if clean:
+            answer = clean(answer)
+        self.counts["llm"] += 1
+        self._add(prompt, answer, vector)
+        if self.cache_collection is not None:
+            try:
+                self.cache_collection.update_one(
+                    {"_id": normalize_question(prompt)},
+                    {"$set": {"question": prompt, "answer": answer, "created_at": datetime.utcnow()}},
+                    upsert=True
+                )
+            except Exception as e:
+                logger.error(f"Could not cache meta-query answer: {str(e)}")
+        return answer, "llm"
+
+    def stats(self):
+        return {"intents": len(INTENTS), "indexed_questions": len(self.answers), "answered": dict(self.counts)}
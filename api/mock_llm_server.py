@@ -0,0 +1,155 @@
+"""
+Local stand-in for the OpenAI and Groq chat completion APIs.
+
+It answers POST /v1/chat/completions (OpenAI) and /openai/v1/chat/completions
+(Groq) with a canned completion after a configurable delay, and can inject slow
+responses and 5xx errors to exercise the LLM router's hedging, fallbacks and
+circuit breakers.
+
+Usage:
+    python mock_llm_server.py --port 8001 --latency-ms 300 --slow-rate 0.1 --error-rate 0.05
+
+    OPENAI_BASE_URL=http://localhost:8001/v1
+    GROQ_API_URL=http://localhost:8002/openai/v1/chat/completions
+
+The behaviour can be changed at runtime with POST /__config and a JSON body
+such as {"latency_ms": 50, "error_rate": 1.0}. GET /__stats returns request counts.
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+COMPLETION_PATHS = ("/v1/chat/completions", "/openai/v1/chat/completions")
+
+class MockConfig:
+    def __init__(self, latency_ms=200, jitter_ms=50, slow_rate=0.0, slow_ms=5000, error_rate=0.0,
+                 error_status=503, completion_tokens=120, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.completion_tokens = completion_tokens
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "slow": 0}
+
+    def update(self, values):
+        with self.lock:
+            for key, value in values.items():
+                if hasattr(self, key) and key not in ("random", "lock", "stats"):
+                    setattr(self, key, value)
+
+    def draw(self):
+        """Decide delay and failure for one request"""
+        with self.lock:
+            self.stats["requests"] += 1
+            delay = self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)
+            if self.random.random() < self.slow_rate:
+                delay += self.slow_ms
+                self.stats["slow"] += 1
+            fail = self.random.random() < self.error_rate
+            if fail:
+                self.stats["errors"] += 1
+            return max(0.0, delay) / 1000, fail, self.error_status, self.completion_tokens
+
+def make_handler(config):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self):
+            if self.path == "/__stats":
+                self._send_json(200, config.stats)
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            body = self._read_json()
+            if self.path == "/__config":
+                config.update(body)
+                self._send_json(200, {"ok": True})
+                return
+            if self.path not in COMPLETION_PATHS:
+                self._send_json(404, {"error": "not found"})
+                return
+
+            delay, fail, status, completion_tokens = config.draw()
+            time.sleep(delay)
+            if fail:
+                self._send_json(status, {"error": {"message": "Injected failure", "type": "server_error"}})
+                return
+
+            prompt_chars = sum(len(m.get("content", "")) for m in body.get("messages", []))
+            self._send_json(200, {
+                "id": f"chatcmpl-mock-{int(time.time() * 1000)}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "## Mock answer\n\n- Markets moved today."},
+                    "finish_reason": "stop"
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_chars // 4,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_chars // 4 + completion_tokens
+                }
+            })
+
+    return Handler
+
+def start_server(port=0, **config_values):
+    """Start a mock server in a background thread; returns (server, config)"""
+    config = MockConfig(**config_values)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, config
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenAI/Groq chat completions server")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of requests delayed by --slow-ms")
+    parser.add_argument("--slow-ms", type=float, default=5000)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 5xx")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server, _ = start_server(
+        port=args.port,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        slow_rate=args.slow_rate,
+        slow_ms=args.slow_ms,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed
+    )
+    print(f"Mock LLM server listening on http://127.0.0.1:{args.port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,116 @@
+"""
+Local stand-in for the GNews and NewsAPI search endpoints.
+
+GET /api/v4/search (GNews) and GET /v2/everything (NewsAPI) return a page of
+synthetic, seeded finance articles after a configurable delay. A share of the
+articles are syndicated copies of the same story so ingestion-time dedup has
+something to collapse.
+
+Usage:
+    python mock_news_server.py --port 8003 --latency-ms 150
+
+    GNEWS_API_URL=http://localhost:8003/api/v4/search
+    NEWS_API_URL=http://localhost:8003/v2/everything
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+TOPICS = ["gold", "oil", "bitcoin", "stocks", "bonds", "inflation", "interest rates", "earnings"]
+PLACES = ["US", "Europe", "China", "Japan", "India", "Saudi Arabia", "Brazil", "Nigeria", "UK", "Germany"]
+MOVES = ["rises", "falls", "rallies", "slides", "steadies", "surges"]
+OUTLETS = ["Reuters", "Bloomberg", "AP", "CNBC", "Financial Times", "MarketWatch"]
+
+def make_article(rng, query, index, syndicated_from=None):
+    """One synthetic article in the shape both providers return"""
+    if syndicated_from:
+        article = dict(syndicated_from)
+        outlet = rng.choice(OUTLETS)
+        article["source"] = {"name": outlet}
+        article["url"] = f"{syndicated_from['url']}?via={outlet.lower().replace(' ', '-')}-{index}"
+        return article
+
+    topic = query if query else rng.choice(TOPICS)
+    place = rng.choice(PLACES)
+    move = rng.choice(MOVES)
+    published = datetime.now(timezone.utc) - timedelta(hours=rng.randint(0, 240))
+    title = f"{topic.title()} {move} in {place} as markets react to new data"
+    description = (f"{topic.title()} {move} {rng.uniform(0.1, 5):.1f}% in {place} trading after "
+                   f"investors weighed fresh economic figures and central bank comments.")
+    return {
+        "title": title,
+        "description": description,
+        "content": description + " Analysts expect volatility to persist in the coming sessions.",
+        "url": f"https://news.example.com/{topic.replace(' ', '-')}/{rng.getrandbits(48):012x}",
+        "publishedAt": published.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "source": {"name": rng.choice(OUTLETS)}
+    }
+
+def make_handler(latency_ms, page_size, duplicate_rate, seed):
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            if parsed.path not in ("/api/v4/search", "/v2/everything"):
+                self._send(404, {"error": "not found"})
+                return
+
+            query = parse_qs(parsed.query).get("q", [""])[0]
+            time.sleep(latency_ms / 1000)
+            articles = []
+            with lock:
+                for i in range(page_size):
+                    if articles and rng.random() < duplicate_rate:
+                        articles.append(make_article(rng, query, i, syndicated_from=rng.choice(articles)))
+                    else:
+                        articles.append(make_article(rng, query, i))
+
+            body = {"totalArticles": len(articles), "articles": articles}
+            if parsed.path == "/v2/everything":
+                body = {"status": "ok", "totalResults": len(articles), "articles": articles}
+            self._send(200, body)
+
+        def _send(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+def start_server(port=0, latency_ms=150, page_size=10, duplicate_rate=0.2, seed=42):
+    """Start a mock news server in a background thread"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latency_ms, page_size, duplicate_rate, seed))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock GNews/NewsAPI server")
+    parser.add_argument("--port", type=int, default=8003)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--duplicate-rate", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    server = start_server(args.port, args.latency_ms, args.page_size, args.duplicate_rate, args.seed)
+    print(f"Mock news server listening on http://127.0.0.1:{args.port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
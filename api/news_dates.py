@@ -0,0 +1,218 @@
+import logging
+import time
+from datetime import datetime, timezone
+
+from index_config import distance_to_similarity, get_news_collection
+from exact_index import mark_changed
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Formats seen in the Kaggle dataset "Date" column and in the news providers
+DATE_FORMATS = [
+    "%Y-%m-%d",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y/%m/%d",
+    "%m/%d/%Y",
+    "%d/%m/%Y",
+    "%m/%d/%Y %H:%M",
+    "%b %d, %Y",
+    "%B %d, %Y",
+    "%d %b %Y",
+    "%d %B %Y",
+    "%a, %d %b %Y %H:%M:%S %Z",
+]
+
+# Formats without a time of day; as an end date they cover the whole day
+DATE_ONLY_FORMATS = [fmt for fmt in DATE_FORMATS if "%H" not in fmt]
+
+SECONDS_PER_DAY = 86400
+
+def parse_date_to_epoch(value):
+    """
+    Normalize a raw date value (ISO 8601 string, CSV date or epoch number)
+    to integer epoch seconds in UTC. Returns None if the value can't be parsed.
+    """
+    if value is None or value == "":
+        return None
+
+    if isinstance(value, (int, float)):
+        return int(value)
+
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        raw = str(value).strip()
+        if not raw or raw.lower() == "unknown":
+            return None
+
+        if raw.isdigit():
+            return int(raw)
+
+        dt = None
+        try:
+            dt = datetime.fromisoformat(raw.replace("Z", "+00:00"))
+        except ValueError:
+            for fmt in DATE_FORMATS:
+                try:
+                    dt = datetime.strptime(raw, fmt)
+                    break
+                except ValueError:
+                    continue
+
+        if dt is None:
+            logger.debug(f"Unparseable date value: {raw}")
+            return None
+
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+def is_date_only(value):
+    """Whether a raw date value is a calendar day without a time of day"""
+    if not isinstance(value, str):
+        return False
+    raw = value.strip()
+    for fmt in DATE_ONLY_FORMATS:
+        try:
+            datetime.strptime(raw, fmt)
+            return True
+        except ValueError:
+            continue
+    return False
+
+def parse_date_param(value, end=False):
+    """
+    Parse a date-range parameter from an API request.
+    With end=True the result is an exclusive upper bound: the next day's
+    midnight for a date-only value (so "2024-01-31" includes the whole day),
+    one second after the given time otherwise.
+    Raises ValueError so routes can answer with a 400.
+    """
+    if value is None or value == "":
+        return None
+    epoch = parse_date_to_epoch(value)
+    if epoch is None:
+        raise ValueError(f"Invalid date: {value}")
+    if end:
+        return epoch + (SECONDS_PER_DAY if is_date_only(value) else 1)
+    return epoch
+
+def parse_half_life_param(value):
+    """
+    Parse a recency half-life in days from an API request; None when unset.
+    Raises ValueError for values that are not positive numbers.
+    """
+    if value is None or value == "":
+        return None
+    try:
+        half_life = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid recencyHalfLifeDays: {value}")
+    if not half_life > 0 or half_life == float("inf"):
+        raise ValueError(f"recencyHalfLifeDays must be a positive number of days, got {value}")
+    return half_life
+
+def build_date_filter(start=None, end=None):
+    """
+    Build a ChromaDB where clause on the numeric 'timestamp' metadata field.
+    `end` is exclusive, as returned by parse_date_param(..., end=True).
+    """
+    clauses = []
+    if start is not None:
+        clauses.append({"timestamp": {"$gte": int(start)}})
+    if end is not None:
+        clauses.append({"timestamp": {"$lt": int(end)}})
+    return combine_filters(*clauses)
+
+def combine_filters(*clauses):
+    """Combine where clauses with $and, skipping empty ones"""
+    clauses = [c for c in clauses if c]
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+def recency_weight(timestamp, half_life_days, now=None):
+    """
+    Exponential decay weight for a document of the given age.
+    Undated documents are weighted as if they were one half-life old.
+    """
+    if timestamp is None:
+        return 0.5
+    now = now if now is not None else time.time()
+    age_days = max(0.0, (now - float(timestamp)) / SECONDS_PER_DAY)
+    return 0.5 ** (age_days / half_life_days)
+
+def apply_recency_decay(results, half_life_days, now=None):
+    """
+    Rerank the first query of a ChromaDB result set by similarity * recency weight.
+    Returns a new result dict with the same shape and an added 'scores' field.
+    """
+    if not half_life_days or not results or not results.get("ids") or not results["ids"][0]:
+        return results
+
+    distances = (results.get("distances") or [[]])[0]
+    metadatas = (results.get("metadatas") or [[]])[0]
+
+    scored = []
+    for i in range(len(results["ids"][0])):
+        distance = distances[i] if i < len(distances) else 0.0
+        metadata = metadatas[i] if i < len(metadatas) else {}
+        similarity = distance_to_similarity(distance)
+        weight = recency_weight((metadata or {}).get("timestamp"), half_life_days, now)
+        scored.append((similarity * weight, i))
+
+    scored.sort(key=lambda item: item[0], reverse=True)
+    order = [i for _, i in scored]
+
+    reranked = dict(results)
+    for key in ("ids", "distances", "metadatas", "documents", "embeddings"):
+        values = results.get(key)
+        if values and values[0] is not None and len(values[0]) == len(order):
+            reranked[key] = [[values[0][i] for i in order]] + list(values[1:])
+    reranked["scores"] = [[score for score, _ in scored]]
+    return reranked
+
+def backfill_timestamps(collection, batch_size=500):
+    """
+    Add the numeric 'timestamp' field to existing documents that only have a raw 'date'.
+    Returns the number of documents updated.
+    """
+    updated = 0
+    offset = 0
+    while True:
+        batch = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+        ids = batch.get("ids", [])
+        if not ids:
+            break
+
+        update_ids = []
+        update_metadatas = []
+        for doc_id, metadata in zip(ids, batch["metadatas"]):
+            metadata = metadata or {}
+            if "timestamp" in metadata:
+                continue
+            epoch = parse_date_to_epoch(metadata.get("date"))
+            if epoch is None:
+                continue
+            update_ids.append(doc_id)
+            update_metadatas.append({**metadata, "timestamp": epoch})
+
+        if update_ids:
+            collection.update(ids=update_ids, metadatas=update_metadatas)
+            mark_changed(collection)
+            updated += len(update_ids)
+
+        offset += len(ids)
+
+    logger.info(f"Backfilled timestamps for {updated} documents")
+    return updated
+
+if __name__ == "__main__":
+    import chromadb
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    chroma_client = chromadb.PersistentClient(path="./chroma_db")
+    backfill_timestamps(get_news_collection(chroma_client))
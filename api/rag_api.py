@@ -6,6 +6,7 @@ from datetime import datetime
 import chromadb
 from sentence_transformers import SentenceTransformer
 import os
+from index_config import EMBEDDING_MODEL_NAME, get_news_collection
 
 app = Flask(__name__)
 CORS(app)
@@ -21,10 +22,10 @@ GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
 
 # ChromaDB Setup
 chroma_client = chromadb.PersistentClient(path="./chroma_db")
-collection = chroma_client.get_or_create_collection(name="news_data")
+collection = get_news_collection(chroma_client)
 
 # Load Embedding Model
-embed_model = SentenceTransformer("all-MiniLM-L6-v2")
+embed_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
 
 # Function to get AI response with RAG
 def get_ai_response(query, model):
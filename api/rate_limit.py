@@ -0,0 +1,286 @@
+import os
+import math
+import time
+import heapq
+import itertools
+import logging
+import threading
+from functools import wraps
+
+from flask import Response, jsonify, request
+from pymongo import ReturnDocument
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Token buckets: sustained requests per minute and burst size
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() == "true"
+USER_RATE_PER_MINUTE = float(os.environ.get("RATE_LIMIT_USER_PER_MINUTE", "20"))
+USER_BURST = float(os.environ.get("RATE_LIMIT_USER_BURST", "5"))
+GLOBAL_RATE_PER_MINUTE = float(os.environ.get("RATE_LIMIT_GLOBAL_PER_MINUTE", "600"))
+GLOBAL_BURST = float(os.environ.get("RATE_LIMIT_GLOBAL_BURST", "50"))
+# Batch routes take one token per item from a separate per-user bucket, sized so
+# that a full batch fits; the global bucket is charged once per batch request
+BATCH_ITEMS_PER_MINUTE = float(os.environ.get("RATE_LIMIT_BATCH_ITEMS_PER_MINUTE", "100"))
+BATCH_BURST = float(os.environ.get("RATE_LIMIT_BATCH_BURST", os.environ.get("BATCH_MAX_ITEMS", "50")))
+# "memory" keeps buckets per process; "mongo" shares them across workers and instances
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory").lower()
+
+# Admission queue in front of provider calls
+QUEUE_MAX_CONCURRENT = int(os.environ.get("LLM_QUEUE_MAX_CONCURRENT", "16"))
+QUEUE_MAX_WAITING = int(os.environ.get("LLM_QUEUE_MAX_WAITING", "64"))
+QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", "30"))
+
+# Lower values are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_UPLOAD = 1
+PRIORITY_BATCH = 2
+
+class RateLimited(Exception):
+    """Request rejected by a rate limit or a full queue"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class InMemoryBucketStore:
+    """Token buckets held in this process"""
+
+    def __init__(self, max_keys=100000):
+        self.buckets = {}
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+
+    def take(self, key, rate, burst, cost=1):
+        """Take cost tokens; returns (allowed, retry_after_seconds)"""
+        now = time.monotonic()
+        with self.lock:
+            tokens, last = self.buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - last) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_keys:
+                self._evict_full(now, rate, burst)
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+    def refund(self, key, rate, burst, cost=1):
+        """Give back tokens taken for a request that was rejected elsewhere"""
+        now = time.monotonic()
+        with self.lock:
+            tokens, last = self.buckets.get(key, (burst, now))
+            self.buckets[key] = (min(burst, tokens + (now - last) * rate + cost), now)
+
+    def _evict_full(self, now, rate, burst):
+        # Buckets that have refilled completely carry no state worth keeping
+        for key in [k for k, (tokens, last) in self.buckets.items() if tokens + (now - last) * rate >= burst]:
+            del self.buckets[key]
+
+class MongoBucketStore:
+    """
+    Token buckets shared through MongoDB, updated atomically with a single
+    pipeline update (MongoDB 4.2+). Idle buckets expire through a TTL index.
+    """
+
+    def __init__(self, collection, idle_ttl=3600):
+        self.collection = collection
+        self.collection.create_index("updated_at", expireAfterSeconds=idle_ttl)
+
+    def take(self, key, rate, burst, cost=1):
+        now = time.time()
+        doc = self.collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {
+                    "tokens": {"$min": [burst, {"$add": [
+                        {"$ifNull": ["$tokens", burst]},
+                        {"$multiply": [{"$max": [0, {"$subtract": [now, {"$ifNull": ["$ts", now]}]}]}, rate]}
+                    ]}]},
+                    "ts": now,
+                    "updated_at": "$$NOW"
+                }},
+                {"$set": {"allowed": {"$gte": ["$tokens", cost]}}},
+                {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", cost]}, "$tokens"]}}}
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        allowed = doc["allowed"]
+        return allowed, 0.0 if allowed else (cost - doc["tokens"]) / rate
+
+    def refund(self, key, rate, burst, cost=1):
+        now = time.time()
+        self.collection.update_one(
+            {"_id": key},
+            [{"$set": {
+                "tokens": {"$min": [burst, {"$add": [
+                    {"$ifNull": ["$tokens", burst]},
+                    {"$multiply": [{"$max": [0, {"$subtract": [now, {"$ifNull": ["$ts", now]}]}]}, rate]},
+                    cost
+                ]}]},
+                "ts": now,
+                "updated_at": "$$NOW"
+            }}]
+        )
+
+class AdmissionQueue:
+    """
+    Bounded priority queue that caps concurrent provider-bound requests.
+    Waiters are admitted by priority, then arrival order. When the queue is
+    full, or a waiter times out, the request is shed with RateLimited.
+    """
+
+    def __init__(self, max_concurrent=QUEUE_MAX_CONCURRENT, max_waiting=QUEUE_MAX_WAITING, timeout=QUEUE_TIMEOUT):
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+
+    def _retry_after(self):
+        # Rough estimate: one timeout window per full round of active slots ahead
+        return max(1, math.ceil(self.timeout * (len(self.waiting) + 1) / max(1, self.max_concurrent)))
+
+    def acquire(self, priority=PRIORITY_INTERACTIVE, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        with self.condition:
+            if self.active < self.max_concurrent and not self.waiting:
+                self.active += 1
+                return
+            if len(self.waiting) >= self.max_waiting:
+                raise RateLimited("Server is busy, please retry later", self._retry_after())
+
+            entry = (priority, next(self.counter))
+            heapq.heappush(self.waiting, entry)
+            deadline = time.monotonic() + timeout
+            try:
+                while not (self.active < self.max_concurrent and self.waiting[0] == entry):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise RateLimited("Server is busy, please retry later", self._retry_after())
+                    self.condition.wait(remaining)
+            finally:
+                self.waiting.remove(entry)
+                heapq.heapify(self.waiting)
+                self.condition.notify_all()
+            self.active += 1
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+    def stats(self):
+        with self.condition:
+            return {"active": self.active, "waiting": len(self.waiting),
+                    "max_concurrent": self.max_concurrent, "max_waiting": self.max_waiting}
+
+_store = InMemoryBucketStore()
+admission_queue = AdmissionQueue()
+
+def configure_store(mongo_collection=None):
+    """Select the bucket backend; called once at startup"""
+    global _store
+    if RATE_LIMIT_BACKEND == "mongo" and mongo_collection is not None:
+        _store = MongoBucketStore(mongo_collection)
+        logger.info("Using MongoDB-backed rate limiter")
+    else:
+        _store = InMemoryBucketStore()
+
+def max_cost(batch=False):
+    """Largest cost a single request can ever be granted: the smaller bucket size"""
+    return BATCH_BURST if batch else min(USER_BURST, GLOBAL_BURST)
+
+def check_cost(cost, batch=False):
+    """Reject costs no bucket could ever cover, which would otherwise be retried forever"""
+    if cost > max_cost(batch):
+        raise ValueError(f"Request cost {cost} exceeds the rate limit burst of {max_cost(batch):g}")
+
+def _user_bucket(user_id, cost, batch):
+    """(key, rate, burst, global cost) of the user bucket a request is charged to"""
+    if batch:
+        return f"batch:{user_id}", BATCH_ITEMS_PER_MINUTE / 60, BATCH_BURST, 1
+    return f"user:{user_id}", USER_RATE_PER_MINUTE / 60, USER_BURST, cost
+
+def check_rate_limit(user_id, cost=1, batch=False):
+    """
+    Take tokens from the user's and the global bucket, raising RateLimited if
+    either is empty. A global rejection refunds the user's tokens, so requests
+    shed by the service limit don't count against the user. Batch requests
+    take `cost` from the user's batch bucket and one token from the global one.
+    """
+    check_cost(cost, batch)
+    user_key, user_rate, user_burst, global_cost = _user_bucket(user_id, cost, batch)
+    allowed, retry_after = _store.take(user_key, user_rate, user_burst, cost)
+    if not allowed:
+        raise RateLimited("Rate limit exceeded for this user", retry_after)
+    allowed, retry_after = _store.take("global", GLOBAL_RATE_PER_MINUTE / 60, GLOBAL_BURST, global_cost)
+    if not allowed:
+        _store.refund(user_key, user_rate, user_burst, cost)
+        raise RateLimited("Service rate limit exceeded", retry_after)
+
+def refund_rate_limit(user_id, cost=1, batch=False):
+    """Give back the tokens check_rate_limit took, for a request that was not served after all"""
+    user_key, user_rate, user_burst, global_cost = _user_bucket(user_id, cost, batch)
+    _store.refund(user_key, user_rate, user_burst, cost)
+    _store.refund("global", GLOBAL_RATE_PER_MINUTE / 60, GLOBAL_BURST, global_cost)
+
+def _request_user_id():
+    data = request.get_json(silent=True) or {}
+    return (data.get("userId") or request.form.get("user_id") or request.args.get("userId")
+            or request.remote_addr or "anonymous")
+
+def too_many_requests(error):
+    response = jsonify({"error": str(error), "retryAfter": math.ceil(error.retry_after)})
+    response.headers["Retry-After"] = str(max(1, math.ceil(error.retry_after)))
+    return response, 429
+
+def limit_llm_route(priority=PRIORITY_INTERACTIVE, cost=None, batch=False):
+    """
+    Flask route decorator: per-user and global token buckets, then a slot in the
+    admission queue for the duration of the request, or until a streamed
+    response is closed. Rejections answer 429 with Retry-After. `cost` may be a
+    callable returning the number of tokens to take; it can be at most the
+    burst size, and requests costing more answer 400. With batch=True the cost
+    is drawn from the per-user batch bucket.
+    """
+    if cost is not None and not callable(cost):
+        check_cost(cost, batch)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not RATE_LIMIT_ENABLED:
+                return view(*args, **kwargs)
+            user_id = _request_user_id()
+            tokens = cost() if callable(cost) else (cost or 1)
+            try:
+                check_rate_limit(user_id, tokens, batch)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            except RateLimited as e:
+                logger.warning(f"Request shed on {request.path}: {str(e)}")
+                return too_many_requests(e)
+            try:
+                admission_queue.acquire(priority)
+            except RateLimited as e:
+                # Shed by the queue: the request was never served, so it costs no tokens
+                refund_rate_limit(user_id, tokens, batch)
+                logger.warning(f"Request shed on {request.path}: {str(e)}")
+                return too_many_requests(e)
+            release = True
+            try:
+                response = view(*args, **kwargs)
+                # A streamed body is generated after the view returns; keep the slot until it is closed
+                if isinstance(response, Response) and response.is_streamed:
+                    response.call_on_close(admission_queue.release)
+                    release = False
+                return response
+            finally:
+                if release:
+                    admission_queue.release()
+        return wrapper
+    return decorator
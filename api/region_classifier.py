@@ -0,0 +1,116 @@
+import os
+import re
+import bisect
+import logging
+
+from region_index import DEFAULT_REGION
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Tag articles with every matching region (comma-separated 'regions' metadata)
+# in addition to the primary 'region'
+REGION_MULTI_LABEL = os.environ.get("REGION_MULTI_LABEL", "false").lower() == "true"
+
+# Keywords per region, in priority order for ties
+REGION_KEYWORDS = {
+    "North America": ["US", "USA", "U.S.", "United States", "American", "Wall Street", "Federal Reserve",
+                      "Canada", "Canadian", "Mexico", "Mexican"],
+    "Europe": ["EU", "Europe", "European", "ECB", "Eurozone", "UK", "Britain", "British", "Germany", "German",
+               "France", "French", "Italy", "Italian", "Spain", "Spanish"],
+    "Asia Pacific": ["China", "Chinese", "Japan", "Japanese", "India", "Indian", "Australia", "Australian",
+                     "Singapore", "Hong Kong"],
+    "Middle East": ["Saudi", "UAE", "Emirati", "Dubai", "Abu Dhabi", "Qatar", "Israel", "Israeli", "Iran", "Iranian"],
+    "Africa": ["Africa", "African", "Nigeria", "Nigerian", "Egypt", "Egyptian", "South Africa", "Kenya", "Kenyan"],
+    "Latin America": ["Brazil", "Brazilian", "Argentina", "Argentine", "Chile", "Chilean", "Colombia",
+                      "Colombian", "Mexico", "Mexican"],
+}
+
+def _is_acronym(keyword):
+    return keyword.replace(".", "").isupper()
+
+def _compile(keywords, flags=0):
+    # Longest first so "South Africa" wins over "Africa" at the same position
+    alternatives = sorted({re.escape(k) for k in keywords}, key=len, reverse=True)
+    # \b doesn't work after a trailing "." so use lookarounds for the word boundary
+    return re.compile(r'(?<!\w)(?:' + '|'.join(alternatives) + r')(?!\w)', flags)
+
+# Acronyms are matched case-sensitively so "US" doesn't match "us"
+_KEYWORD_REGIONS = {}
+for _region, _keywords in REGION_KEYWORDS.items():
+    for _keyword in _keywords:
+        _key = _keyword if _is_acronym(_keyword) else _keyword.lower()
+        _KEYWORD_REGIONS.setdefault(_key, [])
+        if _region not in _KEYWORD_REGIONS[_key]:
+            _KEYWORD_REGIONS[_key].append(_region)
+
+_ACRONYM_PATTERN = _compile([k for k in _KEYWORD_REGIONS if _is_acronym(k)])
+_NAME_PATTERN = _compile([k for k in _KEYWORD_REGIONS if not _is_acronym(k)], re.IGNORECASE)
+
+_REGION_ORDER = {region: i for i, region in enumerate(REGION_KEYWORDS)}
+
+# Separator between texts in a batch; it can't be part of a keyword match
+_BATCH_SEPARATOR = "\n\x00\n"
+
+def _score(counts):
+    """Turn per-region hit counts into (region, score) pairs, best first"""
+    total = sum(counts.values())
+    if not total:
+        return []
+    return sorted(
+        ((region, count / total) for region, count in counts.items()),
+        key=lambda item: (-item[1], _REGION_ORDER[item[0]])
+    )
+
+def _match_key(match):
+    keyword = match.group(0)
+    return keyword if keyword in _KEYWORD_REGIONS else keyword.lower()
+
+def classify_batch(texts, multi=False):
+    """
+    Classify many texts with one pass of each compiled pattern over the joined batch.
+
+    Returns a list with, per text, the primary region (or DEFAULT_REGION) or, if
+    multi is True, a list of (region, score) pairs sorted by score.
+    """
+    texts = [text or "" for text in texts]
+    joined = _BATCH_SEPARATOR.join(texts)
+
+    # Start offset of each text in the joined string
+    starts = []
+    offset = 0
+    for text in texts:
+        starts.append(offset)
+        offset += len(text) + len(_BATCH_SEPARATOR)
+
+    counts = [{} for _ in texts]
+    for pattern in (_ACRONYM_PATTERN, _NAME_PATTERN):
+        for match in pattern.finditer(joined):
+            index = bisect.bisect_right(starts, match.start()) - 1
+            for region in _KEYWORD_REGIONS[_match_key(match)]:
+                counts[index][region] = counts[index].get(region, 0) + 1
+
+    scored = [_score(c) for c in counts]
+    if multi:
+        return scored
+    return [s[0][0] if s else DEFAULT_REGION for s in scored]
+
+def classify_region(text):
+    """Primary region of a single text"""
+    return classify_batch([text])[0]
+
+def classify_regions(text):
+    """All matching regions of a single text as (region, score) pairs"""
+    return classify_batch([text], multi=True)[0]
+
+def region_metadata(scored, multi=None):
+    """
+    ChromaDB metadata fields for a classification result from classify_batch(multi=True).
+    Chroma metadata values must be scalars, so multiple regions are comma-joined.
+    """
+    multi = REGION_MULTI_LABEL if multi is None else multi
+    metadata = {"region": scored[0][0] if scored else DEFAULT_REGION}
+    if multi and scored:
+        metadata["regions"] = ",".join(region for region, _ in scored)
+        metadata["region_score"] = round(scored[0][1], 3)
+    return metadata
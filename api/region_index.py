@@ -0,0 +1,182 @@
+import os
+import re
+import logging
+
+from index_config import get_news_collection
+from exact_index import query_collection, mark_changed
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# When enabled, news is stored in one collection per region instead of a single
+# collection filtered with where={"region": ...} at query time
+REGION_PARTITIONING = os.environ.get("REGION_PARTITIONING", "false").lower() == "true"
+
+NEWS_COLLECTION = "news_data"
+DEFAULT_REGION = "Global"
+REGIONS = [
+    "Global",
+    "North America",
+    "Europe",
+    "Asia Pacific",
+    "Middle East",
+    "Africa",
+    "Latin America",
+]
+
+def region_collection_name(region):
+    """Name of the per-region shard, e.g. 'news_data_asia_pacific'"""
+    slug = re.sub(r'[^a-z0-9]+', '_', (region or DEFAULT_REGION).lower()).strip('_')
+    return f"{NEWS_COLLECTION}_{slug}"
+
+def route_region(region):
+    """Map a region to a known shard, sending unknown regions to Global"""
+    return region if region in REGIONS else DEFAULT_REGION
+
+def get_region_collection(chroma_client, region):
+    """Get or create the shard collection for a region"""
+    return get_news_collection(chroma_client, region_collection_name(route_region(region)))
+
+def get_region_collections(chroma_client):
+    """All region shards, keyed by region"""
+    return {region: get_region_collection(chroma_client, region) for region in REGIONS}
+
+def collection_for_region(chroma_client, collection, region):
+    """The collection that holds news for a region: its shard, or `collection` without partitioning"""
+    if not REGION_PARTITIONING:
+        return collection
+    return get_region_collection(chroma_client, region)
+
+def news_collections(chroma_client, collection):
+    """Every collection holding news, keyed by region (None without partitioning)"""
+    if not REGION_PARTITIONING:
+        return {None: collection}
+    return get_region_collections(chroma_client)
+
+def add_news(chroma_client, collection, ids, embeddings, metadatas, documents=None):
+    """
+    Write news items to the index. In partitioned mode each item is routed to
+    the shard of its 'region' metadata, otherwise everything goes to `collection`.
+    """
+    if not REGION_PARTITIONING:
+        collection.add(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+        mark_changed(collection)
+        return
+
+    batches = {}
+    for i, metadata in enumerate(metadatas):
+        region = route_region(metadata.get("region"))
+        batch = batches.setdefault(region, {"ids": [], "embeddings": [], "metadatas": [], "documents": []})
+        batch["ids"].append(ids[i])
+        batch["embeddings"].append(embeddings[i])
+        batch["metadatas"].append(metadata)
+        batch["documents"].append(documents[i] if documents else None)
+
+    for region, batch in batches.items():
+        shard = get_region_collection(chroma_client, region)
+        shard.add(
+            ids=batch["ids"],
+            embeddings=batch["embeddings"],
+            metadatas=batch["metadatas"],
+            documents=batch["documents"] if documents else None
+        )
+        mark_changed(shard)
+
+def _merge_results(results_list, n_results):
+    """Merge query results from several shards by ascending distance"""
+    num_queries = len(results_list[0]["ids"])
+    keys = [key for key in ("ids", "distances", "metadatas", "documents")
+            if all(r.get(key) is not None for r in results_list)]
+
+    merged = {key: [] for key in keys}
+    for q in range(num_queries):
+        rows = []
+        for r in results_list:
+            for i in range(len(r["ids"][q])):
+                rows.append({key: r[key][q][i] for key in keys})
+        rows.sort(key=lambda row: row["distances"])
+        rows = rows[:n_results]
+        for key in keys:
+            merged[key].append([row[key] for row in rows])
+    return merged
+
+def query_news(chroma_client, collection, query_embeddings, n_results, region=None, where=None):
+    """
+    Query the news index for the given region.
+
+    Without partitioning this is a single where-filtered query on `collection`.
+    With partitioning a regional query only searches that region's shard and a
+    Global query searches every shard and merges the hits by distance. Each
+    collection is searched exactly instead of through HNSW when few enough
+    documents match the filter.
+    """
+    regional = region and region != DEFAULT_REGION
+
+    if not REGION_PARTITIONING:
+        if regional:
+            region_filter = {"region": region}
+            where = {"$and": [region_filter, where]} if where else region_filter
+        return query_collection(collection, query_embeddings, n_results, where)
+
+    shards = [get_region_collection(chroma_client, region)] if regional else list(get_region_collections(chroma_client).values())
+    results_list = []
+    for shard in shards:
+        count = shard.count()
+        if count == 0:
+            continue
+        results_list.append(query_collection(shard, query_embeddings, min(n_results, count), where))
+
+    if not results_list:
+        empty = [[] for _ in query_embeddings]
+        return {"ids": empty, "distances": empty, "metadatas": empty, "documents": empty}
+    if len(results_list) == 1:
+        return results_list[0]
+    return _merge_results(results_list, n_results)
+
+def count_news(chroma_client, collection):
+    """Total number of indexed news items"""
+    if not REGION_PARTITIONING:
+        return collection.count()
+    return sum(shard.count() for shard in get_region_collections(chroma_client).values())
+
+def partition_existing(chroma_client, batch_size=1000):
+    """
+    Copy the single news_data collection into per-region shards.
+    Returns the number of items copied.
+    """
+    source = get_news_collection(chroma_client, NEWS_COLLECTION)
+    copied = 0
+    offset = 0
+    while True:
+        batch = source.get(include=["embeddings", "metadatas", "documents"], limit=batch_size, offset=offset)
+        ids = batch.get("ids", [])
+        if not ids:
+            break
+
+        by_region = {}
+        for i, doc_id in enumerate(ids):
+            metadata = batch["metadatas"][i] or {}
+            region = route_region(metadata.get("region"))
+            shard = by_region.setdefault(region, {"ids": [], "embeddings": [], "metadatas": [], "documents": []})
+            shard["ids"].append(doc_id)
+            shard["embeddings"].append(batch["embeddings"][i])
+            shard["metadatas"].append({**metadata, "region": region})
+            shard["documents"].append(batch["documents"][i] if batch.get("documents") else None)
+
+        for region, shard in by_region.items():
+            target = get_region_collection(chroma_client, region)
+            target.upsert(**shard)
+            mark_changed(target)
+
+        copied += len(ids)
+        offset += len(ids)
+        logger.info(f"Partitioned {copied} items")
+
+    return copied
+
+if __name__ == "__main__":
+    import chromadb
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    chroma_client = chromadb.PersistentClient(path="./chroma_db")
+    partition_existing(chroma_client)
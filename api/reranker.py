@@ -0,0 +1,137 @@
+import os
+import math
+import time
+import logging
+from collections import deque
+
+from context_builder import count_tokens
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Reranking configuration
+RERANK_ENABLED = os.environ.get("RERANK_ENABLED", "false").lower() == "true"
+RERANK_MODEL = os.environ.get("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.environ.get("RERANK_CANDIDATES", "30"))
+RERANK_MAX_DOCS = int(os.environ.get("RERANK_MAX_DOCS", "5"))
+RERANK_MIN_SCORE = float(os.environ.get("RERANK_MIN_SCORE", "0.0"))
+RERANK_TOKEN_BUDGET = int(os.environ.get("RERANK_TOKEN_BUDGET", "1500"))
+
+# Number of documents the prompt used before reranking, for the savings baseline
+BASELINE_DOCS = 5
+
+# Stats of the most recent reranked requests, surfaced on /health
+recent_stats = deque(maxlen=100)
+
+_cross_encoder = None
+
+def get_cross_encoder():
+    """Load the cross-encoder lazily so the API starts without it when reranking is off"""
+    global _cross_encoder
+    if _cross_encoder is None:
+        from sentence_transformers import CrossEncoder
+        logger.info(f"Loading cross-encoder model: {RERANK_MODEL}")
+        _cross_encoder = CrossEncoder(RERANK_MODEL, max_length=256, device="cpu")
+    return _cross_encoder
+
+def document_text(doc):
+    """Text of a retrieved news document used for scoring and for the prompt"""
+    return doc.get("detailed_summary") or doc.get("title") or ""
+
+def _sigmoid(logit):
+    return 1.0 / (1.0 + math.exp(-max(-60.0, min(60.0, float(logit)))))
+
+def _select(ranked, texts, docs, max_docs, token_budget, min_score=None):
+    """The best documents that fit in the token budget, skipping those below min_score"""
+    kept = []
+    context_tokens = 0
+    for _, logit, i in ranked:
+        if len(kept) >= max_docs:
+            break
+        if min_score is not None and logit < min_score:
+            continue
+        tokens = count_tokens(texts[i])
+        if context_tokens + tokens > token_budget:
+            # A smaller, lower-scored document may still fit
+            continue
+        kept.append(docs[i])
+        context_tokens += tokens
+    return kept, context_tokens
+
+def rerank_documents(query, docs, max_docs=None, min_score=None, token_budget=None, weights=None):
+    """
+    Score retrieved documents against the query with a cross-encoder in one batch
+    and keep the best ones above the score cutoff that fit in the token budget.
+
+    `weights` (e.g. recency weights) multiply the cross-encoder relevance, taken
+    as the sigmoid of its logit so the weighting works for negative logits too.
+    The cutoff applies to the raw logit; when no document clears it, the best
+    BASELINE_DOCS are kept rather than none.
+
+    Returns (kept_docs, stats).
+    """
+    max_docs = max_docs if max_docs is not None else RERANK_MAX_DOCS
+    min_score = min_score if min_score is not None else RERANK_MIN_SCORE
+    token_budget = token_budget if token_budget is not None else RERANK_TOKEN_BUDGET
+
+    start = time.perf_counter()
+    texts = [document_text(doc) for doc in docs]
+    baseline_tokens = sum(count_tokens(text) for text in texts[:BASELINE_DOCS])
+
+    if not docs:
+        return [], {"candidates": 0, "kept": 0, "elapsed_ms": 0.0,
+                    "baseline_tokens": 0, "context_tokens": 0, "tokens_saved": 0}
+
+    try:
+        scores = get_cross_encoder().predict(
+            [(query, text) for text in texts],
+            batch_size=len(texts),
+            show_progress_bar=False
+        )
+    except Exception as e:
+        logger.error(f"Reranking failed, keeping vector order: {str(e)}")
+        return docs[:BASELINE_DOCS], {"candidates": len(docs), "kept": min(len(docs), BASELINE_DOCS),
+                                      "elapsed_ms": (time.perf_counter() - start) * 1000,
+                                      "baseline_tokens": baseline_tokens, "context_tokens": baseline_tokens,
+                                      "tokens_saved": 0, "error": str(e)}
+
+    weights = weights if weights is not None else [1.0] * len(docs)
+    ranked = sorted(
+        ((_sigmoid(score) * weight, float(score), i) for i, (score, weight) in enumerate(zip(scores, weights))),
+        key=lambda item: item[0],
+        reverse=True
+    )
+
+    kept, context_tokens = _select(ranked, texts, docs, max_docs, token_budget, min_score)
+    below_cutoff = not kept
+    if below_cutoff:
+        kept, context_tokens = _select(ranked, texts, docs, min(max_docs, BASELINE_DOCS), token_budget)
+
+    stats = {
+        "candidates": len(docs),
+        "kept": len(kept),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+        "top_score": ranked[0][1],
+        "below_cutoff": below_cutoff,
+        "baseline_tokens": baseline_tokens,
+        "context_tokens": context_tokens,
+        "tokens_saved": baseline_tokens - context_tokens
+    }
+    recent_stats.append(stats)
+    logger.info(
+        f"Reranked {stats['candidates']} candidates in {stats['elapsed_ms']}ms, "
+        f"kept {stats['kept']}, saved {stats['tokens_saved']} context tokens"
+    )
+    return kept, stats
+
+def summarize_recent_stats():
+    """Aggregate recent reranking stats for the health endpoint"""
+    if not recent_stats:
+        return {"requests": 0}
+    count = len(recent_stats)
+    return {
+        "requests": count,
+        "avg_elapsed_ms": round(sum(s["elapsed_ms"] for s in recent_stats) / count, 2),
+        "avg_kept": round(sum(s["kept"] for s in recent_stats) / count, 2),
+        "avg_tokens_saved": round(sum(s["tokens_saved"] for s in recent_stats) / count, 2)
+    }
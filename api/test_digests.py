@@ -0,0 +1,47 @@
+"""
+Generic questions served from digests versus specific ones that need the full path.
+
+Usage:
+    python -m pytest test_digests.py
+"""
+import pytest
+
+from digests import classify_generic_query
+
+GENERIC = [
+    ("What's happening in gold today?", "Global", "gold"),
+    ("What's going on with oil?", "Global", "oil"),
+    ("Latest news on the stock market", "Global", "stocks"),
+    ("How are stocks doing?", "Global", "stocks"),
+    ("What's new in crypto?", "Global", "crypto"),
+    ("Any update on the Fed and interest rates?", "Global", "rates"),
+    ("What's happening in European markets?", "Europe", "markets"),
+    ("Latest news on US stocks", "North America", "stocks"),
+    ("How is Bitcoin doing today?", "Global", "crypto"),
+    ("What's happening with OPEC and oil?", "Global", "oil"),
+    ("What's the latest on inflation this Monday?", "Global", "inflation"),
+    ("Gold news?", "Global", "gold"),
+]
+
+SPECIFIC = [
+    ("What's happening with Tesla stock?", "Global"),
+    ("latest news on Nvidia shares", "Global"),
+    ("how is Apple stock doing", "Global"),
+    ("What's going on with Tesla's shares?", "Global"),
+    ("How is Goldman Sachs stock performing?", "Global"),
+    ("What's happening with TSLA?", "Global"),
+    ("Why is gold rising?", "Global"),
+    ("Compare oil and gold", "Global"),
+    ("What happened to stocks on 2024-01-31?", "Global"),
+    ("What's happening in Japanese stocks?", "Europe"),
+    ("What is the price target for gold next year?", "Global"),
+    ("Tell me about dividends", "Global"),
+]
+
+@pytest.mark.parametrize("prompt,region,topic", GENERIC)
+def test_generic_questions_get_a_digest(prompt, region, topic):
+    assert classify_generic_query(prompt, region) == topic
+
+@pytest.mark.parametrize("prompt,region", SPECIFIC)
+def test_specific_questions_take_the_full_path(prompt, region):
+    assert classify_generic_query(prompt, region) is None
@@ -0,0 +1,139 @@
+"""
+LLM router against the local mock servers: fallback, hedging and the
+per-provider circuit breaker.
+
+Usage:
+    python -m pytest test_llm_router.py
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from openai import OpenAI
+
+import llm_router
+from llm_router import CircuitBreaker, ProviderError, complete
+from mock_llm_server import start_server
+
+MESSAGES = [{"role": "user", "content": "What moved gold today?"}]
+
+@pytest.fixture(scope="module")
+def servers():
+    openai_server, openai_config = start_server(latency_ms=20, jitter_ms=0, seed=1)
+    groq_server, groq_config = start_server(latency_ms=20, jitter_ms=0, seed=2)
+    yield {"openai": (openai_server, openai_config), "groq": (groq_server, groq_config)}
+    openai_server.shutdown()
+    groq_server.shutdown()
+
+@pytest.fixture
+def mocks(servers, monkeypatch):
+    """Route both providers to fresh mock configs, with empty stats and breakers"""
+    configs = {}
+    for provider, (server, config) in servers.items():
+        config.update({"latency_ms": 20, "jitter_ms": 0, "slow_rate": 0.0, "error_rate": 0.0, "error_status": 503})
+        config.stats.update({"requests": 0, "errors": 0, "slow": 0})
+        configs[provider] = config
+    openai_port = servers["openai"][0].server_address[1]
+    groq_port = servers["groq"][0].server_address[1]
+    monkeypatch.setattr(llm_router, "openai_client", OpenAI(api_key="test", base_url=f"http://127.0.0.1:{openai_port}/v1"))
+    monkeypatch.setattr(llm_router, "GROQ_API_KEY", "test")
+    monkeypatch.setattr(llm_router, "GROQ_API_URL", f"http://127.0.0.1:{groq_port}/openai/v1/chat/completions")
+    monkeypatch.setattr(llm_router, "_stats", {})
+    monkeypatch.setattr(llm_router, "_breakers", {})
+    monkeypatch.setattr(llm_router, "HEDGING_ENABLED", False)
+    return configs
+
+def use_breaker(provider, **kwargs):
+    breaker = CircuitBreaker(**kwargs)
+    llm_router._breakers[provider] = breaker
+    return breaker
+
+def test_primary_answers(mocks):
+    result = complete("chatgpt", MESSAGES)
+    assert (result.provider, result.model) == ("openai", "gpt-4o-mini")
+    assert result.text.startswith("## Mock answer")
+    assert not result.hedged
+    assert mocks["groq"].stats["requests"] == 0
+
+def test_falls_back_on_server_error(mocks):
+    mocks["openai"].update({"error_rate": 1.0})
+    result = complete("chatgpt", MESSAGES)
+    assert result.provider == "groq"
+    assert mocks["openai"].stats["errors"] == 1
+
+def test_bad_request_skips_fallbacks(mocks):
+    mocks["openai"].update({"error_rate": 1.0, "error_status": 400})
+    with pytest.raises(ProviderError) as error:
+        complete("chatgpt", MESSAGES)
+    assert not error.value.retryable
+    assert mocks["groq"].stats["requests"] == 0
+
+def test_all_providers_failing_raises(mocks):
+    mocks["openai"].update({"error_rate": 1.0})
+    mocks["groq"].update({"error_rate": 1.0})
+    with pytest.raises(ProviderError):
+        complete("chatgpt", MESSAGES)
+
+def test_slow_primary_is_hedged(mocks, monkeypatch):
+    monkeypatch.setattr(llm_router, "HEDGING_ENABLED", True)
+    monkeypatch.setattr(llm_router, "HEDGE_DEFAULT_DELAY", 0.2)
+    mocks["openai"].update({"latency_ms": 3000})
+    start = time.perf_counter()
+    result = complete("chatgpt", MESSAGES)
+    assert result.provider == "groq"
+    assert result.hedged
+    assert time.perf_counter() - start < 2
+
+def test_breaker_opens_half_opens_and_closes(mocks):
+    breaker = use_breaker("openai", failure_threshold=2, cooldown=0.3)
+    mocks["openai"].update({"error_rate": 1.0})
+    for _ in range(2):
+        assert complete("chatgpt", MESSAGES).provider == "groq"
+    assert breaker.state == "open"
+
+    # While open, the provider is skipped without a request
+    assert complete("chatgpt", MESSAGES).provider == "groq"
+    assert mocks["openai"].stats["requests"] == 2
+
+    time.sleep(0.35)
+    assert breaker.state == "half-open"
+    mocks["openai"].update({"error_rate": 0.0})
+    assert complete("chatgpt", MESSAGES).provider == "openai"
+    assert breaker.state == "closed"
+
+def test_failed_trial_reopens_breaker(mocks):
+    breaker = use_breaker("openai", failure_threshold=1, cooldown=0.2)
+    mocks["openai"].update({"error_rate": 1.0})
+    complete("chatgpt", MESSAGES)
+    time.sleep(0.25)
+    assert breaker.state == "half-open"
+    assert complete("chatgpt", MESSAGES).provider == "groq"
+    assert breaker.state == "open"
+    assert not breaker.trial_in_flight
+
+def test_half_open_admits_one_trial():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0)
+    breaker.record(False)
+    assert breaker.acquire() == "trial"
+    assert breaker.acquire() is None
+    breaker.record(True)
+    assert breaker.acquire() == "closed"
+
+def test_cancelled_trial_frees_the_slot(mocks, monkeypatch):
+    # A saturated pool: the trial is queued and cancelled when the call times out
+    release = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=1)
+    executor.submit(release.wait)
+    monkeypatch.setattr(llm_router, "_executor", executor)
+    monkeypatch.setitem(llm_router.MODEL_ROUTES, "trial", [("openai", "gpt-4o-mini")])
+    breaker = use_breaker("openai", failure_threshold=1, cooldown=0)
+    breaker.record(False)
+    try:
+        with pytest.raises(ProviderError):
+            complete("trial", MESSAGES, timeout=0.2)
+        assert not breaker.trial_in_flight
+        assert breaker.allow()
+    finally:
+        release.set()
+        executor.shutdown()
@@ -0,0 +1,169 @@
+import os
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Export spans to OpenTelemetry as well; the SDK and exporter are configured
+# outside the app (e.g. with opentelemetry-instrument and OTEL_* variables)
+OTEL_ENABLED = os.environ.get("OTEL_ENABLED", "false").lower() == "true"
+_tracer = None
+if OTEL_ENABLED:
+    try:
+        from opentelemetry import trace
+        _tracer = trace.get_tracer("finbot")
+    except ImportError:
+        logger.warning("OTEL_ENABLED is set but opentelemetry is not installed")
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] - %(message)s'
+
+# Histogram buckets in seconds, from fast stages (embedding) to slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+request_id_var = contextvars.ContextVar("request_id", default="-")
+_stage_timings = contextvars.ContextVar("stage_timings", default=None)
+
+class Histogram:
+    """Prometheus-style cumulative histogram with one label"""
+
+    def __init__(self, name, description, label, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label = label
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self.lock:
+            series = self.series.setdefault(label_value, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for label_value, series in sorted(self.series.items()):
+                label = f'{self.label}="{label_value}"'
+                for bound, count in zip(self.buckets, series["counts"]):
+                    lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {series["count"]}')
+                lines.append(f'{self.name}_sum{{{label}}} {series["sum"]:.6f}')
+                lines.append(f'{self.name}_count{{{label}}} {series["count"]}')
+        return "\n".join(lines)
+
+STAGE_SECONDS = Histogram("finbot_stage_duration_seconds", "Duration of pipeline stages", "stage")
+REQUEST_SECONDS = Histogram("finbot_request_duration_seconds", "Duration of HTTP requests", "endpoint")
+
+class RequestIdFilter(logging.Filter):
+    """Add the current request id to every log record"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+def install_log_context():
+    """Include the request id in the output of every root log handler"""
+    root = logging.getLogger()
+    for handler in root.handlers:
+        if not any(isinstance(f, RequestIdFilter) for f in handler.filters):
+            handler.addFilter(RequestIdFilter())
+            handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+@contextmanager
+def span(stage):
+    """Time a pipeline stage into the stage histogram (and an OpenTelemetry span if enabled)"""
+    start = time.perf_counter()
+    if _tracer is not None:
+        with _tracer.start_as_current_span(stage) as otel_span:
+            otel_span.set_attribute("request.id", request_id_var.get())
+            try:
+                yield
+            finally:
+                _record_stage(stage, time.perf_counter() - start)
+    else:
+        try:
+            yield
+        finally:
+            _record_stage(stage, time.perf_counter() - start)
+
+def _record_stage(stage, elapsed):
+    STAGE_SECONDS.observe(stage, elapsed)
+    timings = _stage_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + elapsed
+
+def start_request(request_id=None):
+    """Begin a traced request; returns the tokens needed by end_request"""
+    request_id = request_id or uuid.uuid4().hex[:16]
+    return request_id, time.perf_counter(), request_id_var.set(request_id), _stage_timings.set({})
+
+def end_request(state, endpoint, status=None):
+    """Record the request duration and log one structured line with its stage timings"""
+    request_id, start, id_token, timings_token = state
+    elapsed = time.perf_counter() - start
+    REQUEST_SECONDS.observe(endpoint, elapsed)
+    timings = _stage_timings.get() or {}
+    if timings:
+        stages = " ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in timings.items())
+        logger.info(f"{endpoint} status={status} total={elapsed * 1000:.1f}ms {stages}")
+    try:
+        _stage_timings.reset(timings_token)
+        request_id_var.reset(id_token)
+    except ValueError:
+        # Ended from another context, e.g. when a streamed response is closed
+        _stage_timings.set(None)
+        request_id_var.set("-")
+
+def render_metrics():
+    """Prometheus text exposition of all histograms"""
+    return "\n".join([STAGE_SECONDS.render(), REQUEST_SECONDS.render()]) + "\n"
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Route label for requests matching no route, so 404 scans can't add series
+UNMATCHED_ROUTE = "<unmatched>"
+
+def init_flask(app):
+    """Give every Flask request an id (from X-Request-ID when present) and time it"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_trace():
+        g.trace_state = start_request(request.headers.get("X-Request-ID"))
+
+    @app.after_request
+    def _end_trace(response):
+        state = g.pop("trace_state", None)
+        if state is not None:
+            response.headers["X-Request-ID"] = state[0]
+            route = request.url_rule.rule if request.url_rule else UNMATCHED_ROUTE
+            if response.is_streamed:
+                # The body is generated after this hook; time the request until it is sent
+                response.call_on_close(lambda: end_request(state, route, response.status_code))
+            else:
+                end_request(state, route, response.status_code)
+        return response
+
+def fastapi_middleware(app):
+    """Same request tracing for the FastAPI news service"""
+
+    @app.middleware("http")
+    async def _trace(request, call_next):
+        state = start_request(request.headers.get("x-request-id"))
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            response.headers["X-Request-ID"] = state[0]
+            return response
+        finally:
+            route = request.scope.get("route")
+            end_request(state, route.path if route else UNMATCHED_ROUTE, status)
@@ -1,18 +1,23 @@
 import os
 import io
 import pdfplumber  
-import docx
 from flask import jsonify
-from openai import OpenAI
+from werkzeug.exceptions import RequestEntityTooLarge
 import re
 import json
 import logging
-from datetime import datetime
 import uuid
 import time
-import requests
+import hashlib
+import tempfile
 from dotenv import load_dotenv
 
+from llm_router import complete as llm_complete, ProviderError
+from tracing import span
+from documents import build_document_record, sha256_hex
+from docx_extract import extract_docx_text
+from financial_metrics import store_metrics
+
 # Load environment variables
 load_dotenv(".env.local")
 
@@ -20,24 +25,14 @@ load_dotenv(".env.local")
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Get API keys from environment variables with fallbacks
-OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    logger.warning("OPENAI_API_KEY not found in environment variables")
-    # No fallback for API keys - they should be in environment variables
-
-# Initialize OpenAI client only if API key is available
-openai_client = None
-if OPENAI_API_KEY:
-    openai_client = OpenAI(api_key=OPENAI_API_KEY)
-
-# Get Groq API key from environment
-GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
-if not GROQ_API_KEY:
-    logger.warning("GROQ_API_KEY not found in environment variables")
-    # No fallback for API keys - they should be in environment variables
-
-GROQ_API_URL = os.environ.get("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
+# Uploads are streamed into GridFS in chunks instead of being read into memory
+UPLOAD_STREAMING = os.environ.get("UPLOAD_STREAMING", "true").lower() == "true"
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 256 * 1024
+# Extraction reads from a temp file held in memory up to this size, then on disk
+SPOOL_MAX_BYTES = 1024 * 1024
+# Multipart boundaries and form fields around the file
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
 
 def clean_response(response_text):
     """
@@ -76,10 +71,11 @@ def clean_response(response_text):
     
     return cleaned.strip()
 
-def extract_text(source, file_type):
+def extract_text(source, file_type, stats=None):
     """
     Extract text from various file formats
-    Accepts either a file path (string) or a file-like object
+    Accepts either a file path (string) or a file-like object.
+    If a `stats` dict is given, the page count of PDFs is recorded in it.
     """
     try:
         if isinstance(source, str):
@@ -94,26 +90,25 @@ def extract_text(source, file_type):
             try:
                 with pdfplumber.open(f) as pdf:
                     logger.info(f"PDF opened successfully. Pages: {len(pdf.pages)}")
+                    if stats is not None:
+                        stats["page_count"] = len(pdf.pages)
+                    pages = []
                     for i, page in enumerate(pdf.pages):
                         page_text = page.extract_text()
                         if page_text:
-                            text += page_text
-                            logger.info(f"Extracted {len(page_text)} characters from page {i+1}")
+                            pages.append(page_text)
+                            logger.debug(f"Extracted {len(page_text)} characters from page {i+1}")
                         else:
-                            logger.info(f"No text found on page {i+1}")
+                            logger.debug(f"No text found on page {i+1}")
+                    text = "\n".join(pages)
             except Exception as e:
                 logger.error(f"PDF extraction error: {str(e)}")
                 return None
         elif file_type == "docx":
             try:
                 f.seek(0)
-                doc = docx.Document(f)
-                logger.info(f"DOCX opened successfully. Paragraphs: {len(doc.paragraphs)}")
-                for i, para in enumerate(doc.paragraphs):
-                    if para.text:
-                        text += para.text + "\n"
-                        if i < 5 or i % 50 == 0:
-                            logger.info(f"Paragraph {i+1}: {para.text[:50]}...")
+                # Paragraphs and table rows in document order
+                text = extract_docx_text(f)
             except Exception as e:
                 logger.error(f"DOCX extraction error: {str(e)}")
                 return None
@@ -159,22 +154,22 @@ def extract_financial_data(text):
     revenue_match = re.search(r"Total Revenue.*?\$([0-9,.]+)M", text, re.IGNORECASE)
     if revenue_match:
         metrics["revenue"] = revenue_match.group(1)
-        logger.info(f"Extracted revenue: {revenue_match.group(1)}")
+        logger.debug(f"Extracted revenue: {revenue_match.group(1)}")
         
     net_income_match = re.search(r"Net Income.*?\$([0-9,.]+)M", text, re.IGNORECASE)
     if net_income_match:
         metrics["net_income"] = net_income_match.group(1)
-        logger.info(f"Extracted net income: {net_income_match.group(1)}")
+        logger.debug(f"Extracted net income: {net_income_match.group(1)}")
         
     eps_match = re.search(r"Earnings Per Share.*?\$([0-9.]+)", text, re.IGNORECASE)
     if eps_match:
         metrics["eps"] = eps_match.group(1)
-        logger.info(f"Extracted EPS: {eps_match.group(1)}")
+        logger.debug(f"Extracted EPS: {eps_match.group(1)}")
         
     ebitda_match = re.search(r"EBITDA.*?\$([0-9,.]+)M", text, re.IGNORECASE)
     if ebitda_match:
         metrics["ebitda"] = ebitda_match.group(1)
-        logger.info(f"Extracted EBITDA: {ebitda_match.group(1)}")
+        logger.debug(f"Extracted EBITDA: {ebitda_match.group(1)}")
     
     extracted_data["metrics"] = metrics
     
@@ -191,7 +186,7 @@ def extract_financial_data(text):
         match = re.search(pattern, text, re.IGNORECASE)
         if match:
             ratios[key] = match.group(1)
-            logger.info(f"Extracted {key}: {match.group(1)}")
+            logger.debug(f"Extracted {key}: {match.group(1)}")
             
     extracted_data["ratios"] = ratios
     
@@ -205,17 +200,18 @@ def extract_financial_data(text):
                 "name": match[1].strip(),
                 "revenue_contribution": match[2].strip() + "%"
             })
-            logger.info(f"Extracted segment: {match[1].strip()} - {match[2].strip()}%")
+            logger.debug(f"Extracted segment: {match[1].strip()} - {match[2].strip()}%")
     
     extracted_data["segments"] = segments
     
     logger.info(f"Extraction complete. Found {len(metrics)} metrics, {len(ratios)} ratios, and {len(segments)} segments")
     return extracted_data
 
-def analyze_financial_content(text, user_comment=""):
+def analyze_financial_content(text, user_comment="", extracted_data=None):
     """
     Analyze financial document content using LLM
     Includes internal reasoning instructions to prevent showing thought process
+    Pass `extracted_data` when extract_financial_data has already run on the text.
     """
     try:
         if not text:
@@ -237,9 +233,9 @@ def analyze_financial_content(text, user_comment=""):
             logger.info("Document identified as general text")
         
         # Extracting financial data if it's a financial document
-        extracted_data = {}
         if is_financial:
-            extracted_data = extract_financial_data(text)
+            if extracted_data is None:
+                extracted_data = extract_financial_data(text)
             metrics_str = json.dumps(extracted_data.get("metrics", {}), indent=2)
             ratios_str = json.dumps(extracted_data.get("ratios", {}), indent=2)
             segments_str = json.dumps(extracted_data.get("segments", []), indent=2)
@@ -312,152 +308,191 @@ DO NOT number your reasoning steps or include any meta-commentary about your thi
 
         logger.info("Sending document for analysis to LLM")
         
-        # Try using OpenAI first
+        # gpt-4o first; the router hedges slow calls and falls back to Groq on failures
         try:
-            logger.info("Using OpenAI client for document analysis")
-            if not openai_client:
-                return "Error: OpenAI API key not configured. Please set the OPENAI_API_KEY environment variable."
-                
-            response = openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": user_message}
-                ],
-                temperature=0.4,
-                max_tokens=1500 if is_financial else 800
-            )
-            logger.info("Analysis completed successfully with OpenAI")
-            response_text = response.choices[0].message.content
-            
-            # Clean the response to remove any thinking tags
-            cleaned_response = clean_response(response_text)
-            return cleaned_response
-            
-        except Exception as e:
-            logger.error(f"OpenAI API Error: {str(e)}")
-            
-            try:
-                logger.info("Falling back to Groq API with gemma-7b-it")
-                if not GROQ_API_KEY:
-                    return "Error: Groq API key not configured. Please set the GROQ_API_KEY environment variable."
-                    
-                headers = {
-                    "Authorization": f"Bearer {GROQ_API_KEY}",
-                    "Content-Type": "application/json"
-                }
-                payload = {
-                    "model": "gemma-7b-it",  
-                    "messages": [
+            with span("llm_call"):
+                result = llm_complete(
+                    "analysis",
+                    [
                         {"role": "system", "content": system_message},
                         {"role": "user", "content": user_message}
                     ],
-                    "max_tokens": 1500 if is_financial else 800,
-                    "temperature": 0.4
-                }
-                response = requests.post(GROQ_API_URL, headers=headers, json=payload)
-                if response.status_code == 200:
-                    logger.info("Analysis completed successfully with Groq API")
-                    response_text = response.json()['choices'][0]['message']['content'].strip()
-                    
-                    cleaned_response = clean_response(response_text)
-                    return cleaned_response
-                    
-                else:
-                    error_msg = f"Analysis Error: Groq API - {response.status_code} - {response.text}"
-                    logger.error(error_msg)
-                    return error_msg
-            except Exception as e2:
-                error_msg = f"Analysis Error: {str(e)} (OpenAI) and {str(e2)} (Groq)"
-                logger.error(error_msg)
-                return error_msg
+                    max_tokens=1500 if is_financial else 800,
+                    temperature=0.4
+                )
+        except ProviderError as e:
+            error_msg = f"Analysis Error: {str(e)}"
+            logger.error(error_msg)
+            return error_msg
+        
+        logger.info(f"Analysis completed successfully with {result.provider}/{result.model}")
+        
+        # Clean the response to remove any thinking tags
+        return clean_response(result.text)
 
     except Exception as e:
         error_msg = f"AI Processing Error: {str(e)}"
         logger.error(error_msg)
         return f"❌ AI Processing Error: {str(e)}"
 
-def handle_file_upload(request, fs, document_collection, save_to_history_func):
+class UploadTooLarge(Exception):
+    """The upload exceeded MAX_UPLOAD_BYTES while it was being streamed"""
+
+def stream_to_gridfs(fs, stream, filename, spool, max_bytes=None):
+    """
+    Copy an upload stream into GridFS and a spooled temp file chunk by chunk,
+    hashing as it goes. The GridFS file is aborted as soon as the limit is exceeded.
+    Returns (gridfs_id, sha256, size).
+    """
+    max_bytes = max_bytes if max_bytes is not None else MAX_UPLOAD_BYTES
+    hasher = hashlib.sha256()
+    size = 0
+    grid_in = fs.new_file(filename=filename)
+    try:
+        while True:
+            chunk = stream.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(f"File is too large. Maximum file size is {max_bytes // (1024 * 1024)}MB.")
+            hasher.update(chunk)
+            grid_in.write(chunk)
+            spool.write(chunk)
+        grid_in.close()
+    except BaseException:
+        grid_in.abort()
+        raise
+    spool.seek(0)
+    return grid_in._id, hasher.hexdigest(), size
+
+def _read_upload(request):
+    """
+    (filename, stream, comment, user_id) from a multipart form upload or, with
+    Content-Type application/octet-stream, from the raw request body with the
+    filename in the `filename` query parameter or X-Filename header.
+    """
+    if request.mimetype == "application/octet-stream":
+        filename = request.args.get("filename") or request.headers.get("X-Filename", "")
+        return filename, request.stream, request.args.get("comment", ""), request.args.get("user_id", "anonymous")
+
+    if "file" not in request.files:
+        return None, None, "", "anonymous"
+    file = request.files["file"]
+    return file.filename, file.stream, request.form.get('comment', ''), request.form.get('user_id', 'anonymous')
+
+def handle_file_upload(request, fs, document_collection, save_to_history_func, metrics_collection=None):
     """
     Handle file upload requests
     This function is imported and used in app.py
+    Extracted financial metrics are stored in `metrics_collection` when given.
     """
+    spool = None
     try:
         logger.info("📂 Upload request received")
-        logger.info(f"Files in request: {list(request.files.keys())}")
         
-        if "file" not in request.files:
+        filename, stream, user_comment, user_id = _read_upload(request)
+        if stream is None:
             logger.error("❌ No file received in request")
             return jsonify({"error": "No file uploaded"}), 400
 
-        file = request.files["file"]
-        logger.info(f"📄 File received: {file.filename}, Size: {file.content_length} bytes")
-        if file.filename == "":
+        logger.info(f"📄 File received: {filename}, Request size: {request.content_length} bytes")
+        if not filename:
             logger.error("❌ Empty filename received")
             return jsonify({"error": "No selected file"}), 400
 
-        user_comment = request.form.get('comment', '')
         if user_comment:
             logger.info(f"📝 User comment received: {user_comment[:100]}...")
             
-        user_id = request.form.get('user_id', 'anonymous')
-            
         # Ensure the uploaded file is an accepted format
-        file_extension = file.filename.split(".")[-1].lower()
+        file_extension = filename.split(".")[-1].lower()
         allowed_extensions = {"pdf", "docx", "txt"}
         
         if file_extension not in allowed_extensions:
             logger.error(f"❌ Invalid file type: {file_extension}")
             return jsonify({"error": f"Invalid file type: {file_extension}. Allowed types: pdf, docx, txt"}), 400
             
-        # Check file size
-        MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
-        if request.content_length and request.content_length > MAX_FILE_SIZE:
+        # Reject early when the declared size is already over the limit
+        if request.content_length and request.content_length > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES:
             logger.error(f"❌ File too large: {request.content_length} bytes")
-            return jsonify({"error": "File is too large. Maximum file size is 10MB."}), 400
+            return jsonify({"error": f"File is too large. Maximum file size is {MAX_UPLOAD_BYTES // (1024 * 1024)}MB."}), 413
             
-        file_bytes = file.read()
-        gridfs_id = fs.put(file_bytes, filename=file.filename)
-        logger.info(f"✅ File stored in MongoDB GridFS with ID: {gridfs_id}")
+        with span("gridfs_store"):
+            if UPLOAD_STREAMING:
+                # Bounded memory: chunks go to GridFS and a temp file that spills to disk
+                spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+                try:
+                    gridfs_id, file_sha256, file_size = stream_to_gridfs(fs, stream, filename, spool)
+                except UploadTooLarge as e:
+                    logger.error(f"❌ File too large, upload aborted: {filename}")
+                    return jsonify({"error": str(e)}), 413
+                file_obj = spool
+            else:
+                file_bytes = stream.read()
+                if len(file_bytes) > MAX_UPLOAD_BYTES:
+                    return jsonify({"error": f"File is too large. Maximum file size is {MAX_UPLOAD_BYTES // (1024 * 1024)}MB."}), 413
+                gridfs_id = fs.put(file_bytes, filename=filename)
+                file_sha256, file_size = sha256_hex(file_bytes), len(file_bytes)
+                file_obj = io.BytesIO(file_bytes)
+        logger.info(f"✅ File stored in MongoDB GridFS with ID: {gridfs_id} ({file_size} bytes)")
 
-        file_obj = io.BytesIO(file_bytes)
-        extracted_text = extract_text(file_obj, file_extension)
+        extract_stats = {}
+        with span("extract"):
+            extracted_text = extract_text(file_obj, file_extension, extract_stats)
         
         if not extracted_text or extracted_text.strip() == "":
             logger.error("❌ No text found in the file")
             return jsonify({"error": "No text could be extracted from the file"}), 400
             
-        document_collection.insert_one({
-            "filename": file.filename,
-            "gridfs_id": str(gridfs_id),
-            "text": extracted_text,
-            "upload_date": datetime.utcnow().isoformat(),
-            "user_id": user_id
-        })
+        record = build_document_record(
+            filename,
+            user_id,
+            gridfs_id,
+            extracted_text,
+            sha256=file_sha256,
+            page_count=extract_stats.get("page_count"),
+            size_bytes=file_size
+        )
+        document_collection.insert_one(record)
         logger.info(f"✅ Document text stored in database for future reference")
+
+        financial_data = extract_financial_data(extracted_text)
+        if metrics_collection is not None:
+            try:
+                store_metrics(metrics_collection, record, financial_data, extracted_text)
+            except Exception as e:
+                logger.error(f"❌ Could not store financial metrics: {str(e)}")
             
         logger.info("🧠 Analyzing text with enhanced LLM analysis...")
-        analysis = analyze_financial_content(extracted_text, user_comment)
+        analysis = analyze_financial_content(extracted_text, user_comment, financial_data)
         logger.info("✅ Analysis complete")
         
         # Save to history
-        chat_id = save_to_history_func(
-            f"[FILE UPLOAD] {file.filename}" + (f": {user_comment}" if user_comment else ""), 
-            analysis, 
-            user_id=user_id
-        )
+        with span("history_save"):
+            chat_id = save_to_history_func(
+                f"[FILE UPLOAD] {filename}" + (f": {user_comment}" if user_comment else ""), 
+                analysis, 
+                user_id=user_id
+            )
         
         return jsonify({
             "gridfs_id": str(gridfs_id),
-            "filename": file.filename,
+            "documentId": record["document_id"],
+            "filename": filename,
             "analysis": analysis,
             "textLength": len(extracted_text),
             "chatId": chat_id
         })
         
+    except RequestEntityTooLarge:
+        logger.error(f"❌ Request larger than MAX_CONTENT_LENGTH: {request.content_length} bytes")
+        return jsonify({"error": f"File is too large. Maximum file size is {MAX_UPLOAD_BYTES // (1024 * 1024)}MB."}), 413
     except Exception as e:
         logger.error(f"❌ Upload Error: {str(e)}")
         return jsonify({"error": f"Upload processing failed: {str(e)}"}), 500
+    finally:
+        if spool is not None:
+            spool.close()
 
 if __name__ == "__main__":
     logger.info("This module provides document processing functionality for the main app.")
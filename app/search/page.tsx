@@ -38,12 +38,23 @@ interface ApiResponse {
 interface SearchRequestBody {
   model: string
   prompt: string
+  userId: string
+  chatId?: string
   region?: string
   isDocumentFollowUp?: boolean
   documentName?: string
   isMetaQuery?: boolean
 }
 
+// The id uploads are stored under; /ask needs the same one to find the user's documents
+const getUserId = (): string => {
+  try {
+    return JSON.parse(localStorage.getItem("user") || "{}").email || "anonymous"
+  } catch {
+    return "anonymous"
+  }
+}
+
 const detectMetaQuery = (query: string): boolean => {
   // Keywords that might indicate a meta-query about the system itself
   const metaKeywords = [
@@ -280,6 +291,12 @@ export default function SearchPage() {
             setLastSavedMessageCount(messages.length)
             // Update chatId if a new chat was created
             if (result.chatId && chatId !== result.chatId) {
+              // Keep the memory session when the chat moves to its saved id
+              const savedMemoryChatId = localStorage.getItem(`chat-memory-${chatId}`)
+              if (savedMemoryChatId) {
+                localStorage.setItem(`chat-memory-${result.chatId}`, savedMemoryChatId)
+                localStorage.removeItem(`chat-memory-${chatId}`)
+              }
               setChatId(result.chatId)
             }
           } else {
@@ -329,6 +346,14 @@ export default function SearchPage() {
     }
   }, [messages, chatId, selectedModel, selectedRegion, lastDocumentName, isDocumentUploaded])
 
+  // Conversation memory session on the API for this chat; follow-ups send it back
+  // so they are answered with the earlier turns
+  const [memoryChatId, setMemoryChatId] = useState<string | null>(null)
+
+  useEffect(() => {
+    setMemoryChatId(localStorage.getItem(`chat-memory-${chatId}`))
+  }, [chatId])
+
   // Add this useEffect to load messages from localStorage on initial render
   useEffect(() => {
     // Only try to restore if we're not loading a specific chat from URL
@@ -466,6 +491,8 @@ export default function SearchPage() {
         const requestBody: SearchRequestBody = {
           model: selectedModel,
           prompt: actualQuery,
+          userId: getUserId(),
+          chatId: memoryChatId || undefined,
           region: selectedRegion !== "Global" ? selectedRegion : undefined,
         }
 
@@ -514,6 +541,11 @@ export default function SearchPage() {
         const data: ApiResponse = await response.json()
         console.log("✅ API Response:", data)
 
+        if (data.chatId && data.chatId !== memoryChatId) {
+          setMemoryChatId(data.chatId)
+          localStorage.setItem(`chat-memory-${chatId}`, data.chatId)
+        }
+
         if (isRegularQuery) {
           setMessages((prev) => prev.filter((msg) => msg.id !== thinkingId))
         }
@@ -549,6 +581,8 @@ export default function SearchPage() {
       lastDocumentName,
       checkNeedsClarification,
       pendingQuery,
+      chatId,
+      memoryChatId,
     ],
   )
 
@@ -656,10 +690,7 @@ export default function SearchPage() {
     const formData = new FormData()
     formData.append("file", uploadedFile)
 
-    const userId = localStorage.getItem("user")
-      ? JSON.parse(localStorage.getItem("user") || "{}").email || "anonymous"
-      : "anonymous"
-    formData.append("user_id", userId)
+    formData.append("user_id", getUserId())
 
     // Add document comment if provided
     if (searchQuery.trim()) {
@@ -1,15 +1,31 @@
 from fastapi import FastAPI, Query
+from fastapi.responses import PlainTextResponse
 import requests
 import openai
 import chromadb
 import os
+import sys
 from dotenv import load_dotenv
 from sentence_transformers import SentenceTransformer
 import logging
 
+# Shared retrieval helpers live with the main API
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "api"))
+from news_dates import parse_date_to_epoch, parse_date_param, parse_half_life_param, build_date_filter, apply_recency_decay
+from region_index import add_news, query_news, count_news, collection_for_region, news_collections
+from region_classifier import classify_batch, region_metadata
+from fast_json import fastapi_response_class, init_fastapi as init_fast_json
+from tracing import span, fastapi_middleware, install_log_context, render_metrics, METRICS_CONTENT_TYPE
+from index_config import (
+    EMBEDDING_MODEL_NAME, INDEX_WARMUP_ENABLED, collection_metadata, get_news_collection, warm_up, index_memory_footprint
+)
+from exact_index import exact_index_stats, mark_changed
+from dedup import DEDUP_ENABLED, NearDuplicateIndex, article_fingerprint, load_recent_fingerprints, merge_source
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
+install_log_context()
 
 # Load environment variables
 load_dotenv(".env.local")
@@ -19,6 +35,10 @@ GNEWS_API_KEY = os.environ.get("GNEWS_API_KEY")
 NEWS_API_KEY = os.environ.get("NEWS_API_KEY")
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 
+# News provider endpoints (overridable to point at local stand-ins for load tests)
+GNEWS_API_URL = os.environ.get("GNEWS_API_URL", "https://gnews.io/api/v4/search")
+NEWS_API_URL = os.environ.get("NEWS_API_URL", "https://newsapi.org/v2/everything")
+
 # Initialize OpenAI client
 client = None
 if OPENAI_API_KEY:
@@ -28,12 +48,50 @@ else:
 
 # Initialize ChromaDB client
 chroma_client = chromadb.PersistentClient(path="./chroma_db")
-collection = chroma_client.get_or_create_collection(name="news_data")
+collection = get_news_collection(chroma_client)
 
 # Initialize embedding model
-embed_model = SentenceTransformer("all-MiniLM-L6-v2")
+embed_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+# Load the index and model before serving so the first queries are not slow
+if INDEX_WARMUP_ENABLED:
+    try:
+        warm_up(news_collections(chroma_client, collection).values(), embed_model)
+    except Exception as e:
+        logger.error(f"Index warmup failed: {str(e)}")
+
+app = FastAPI(default_response_class=fastapi_response_class())
+fastapi_middleware(app)
+init_fast_json(app)
 
-app = FastAPI()
+# Fingerprints of recently ingested stories, loaded on the first /search-news call
+duplicate_index = None
+
+def get_duplicate_index():
+    """Load the near-duplicate index lazily from recently ingested documents"""
+    global duplicate_index
+    if duplicate_index is None:
+        duplicate_index = NearDuplicateIndex()
+        try:
+            load_recent_fingerprints(duplicate_index, news_collections(chroma_client, collection))
+        except Exception as e:
+            logger.error(f"Error loading recent fingerprints: {str(e)}")
+    return duplicate_index
+
+def attach_duplicate_source(doc_id, region, article):
+    """Record a syndicated copy of a story as an extra source of the canonical document"""
+    target = collection_for_region(chroma_client, collection, region)
+    existing = target.get(ids=[doc_id], include=["metadatas"])
+    if not existing.get("ids"):
+        return
+    updated = merge_source(
+        existing["metadatas"][0] or {},
+        article.get("source", {}).get("name", "Unknown"),
+        article.get("url", "")
+    )
+    if updated:
+        target.update(ids=[doc_id], metadatas=[updated])
+        mark_changed(target)
 
 def fetch_gnews(query):
     """Fetch news articles from GNews API"""
@@ -42,7 +100,7 @@ def fetch_gnews(query):
             logger.error("GNEWS_API_KEY not configured")
             return []
             
-        url = f"https://gnews.io/api/v4/search?q={query}&lang=en&max=10&apikey={GNEWS_API_KEY}"
+        url = f"{GNEWS_API_URL}?q={query}&lang=en&max=10&apikey={GNEWS_API_KEY}"
         response = requests.get(url)
         if response.status_code == 200:
             return response.json().get("articles", [])
@@ -60,7 +118,7 @@ def fetch_newsapi(query):
             logger.error("NEWS_API_KEY not configured")
             return []
             
-        url = f"https://newsapi.org/v2/everything?q={query}&language=en&pageSize=10&apiKey={NEWS_API_KEY}"
+        url = f"{NEWS_API_URL}?q={query}&language=en&pageSize=10&apiKey={NEWS_API_KEY}"
         response = requests.get(url)
         if response.status_code == 200:
             return response.json().get("articles", [])
@@ -101,22 +159,44 @@ def search_news(query: str = Query("finance")):
         logger.info(f"Searching news for query: {query}")
         
         # Fetch articles from both sources
-        gnews_articles = fetch_gnews(query)
-        newsapi_articles = fetch_newsapi(query)
+        with span("news_fetch"):
+            gnews_articles = fetch_gnews(query)
+            newsapi_articles = fetch_newsapi(query)
         all_articles = gnews_articles + newsapi_articles
         
         logger.info(f"Found {len(all_articles)} articles in total")
         
+        # Tag regions for the whole batch in one pass
+        region_results = classify_batch(
+            [(article.get("content", "") or "") + " " + (article.get("description", "") or "") for article in all_articles],
+            multi=True
+        )
+        
+        index = get_duplicate_index() if DEDUP_ENABLED else None
+        duplicates = 0
+        
         # Process and store articles in ChromaDB
-        for article in all_articles:
+        for article, regions in zip(all_articles, region_results):
             try:
                 # Create a rich text representation
                 text = f"{article.get('title', '')} {article.get('description', '')}"
                 if not text.strip():
                     continue
                 
+                # Collapse syndicated copies of the same story into the canonical document
+                fingerprint = None
+                if index is not None:
+                    fingerprint = article_fingerprint(article)
+                    match = index.find(fingerprint)
+                    if match:
+                        attach_duplicate_source(match[0], match[1], article)
+                        duplicates += 1
+                        logger.debug(f"Near-duplicate of {match[0]}: {article.get('title', 'Untitled')}")
+                        continue
+                
                 # Generate embedding
-                embedding = generate_embedding(text)
+                with span("embed"):
+                    embedding = generate_embedding(text)
                 
                 # Prepare metadata
                 metadata = {
@@ -125,67 +205,80 @@ def search_news(query: str = Query("finance")):
                     "date": article.get("publishedAt", "Unknown"),
                     "url": article.get("url", ""),
                     "detailed_summary": article.get("content", article.get("description", "")),
-                    "region": "Global"  # Default region
+                    **region_metadata(regions)
                 }
                 
-                # Detect region from content
-                content = (article.get("content", "") or "") + (article.get("description", "") or "")
-                regions = {
-                    "North America": ["US", "USA", "United States", "Canada", "Mexico"],
-                    "Europe": ["EU", "Europe", "UK", "Germany", "France", "Italy", "Spain"],
-                    "Asia Pacific": ["China", "Japan", "India", "Australia", "Singapore", "Hong Kong"],
-                    "Middle East": ["Saudi", "UAE", "Dubai", "Qatar", "Israel", "Iran"],
-                    "Africa": ["Africa", "Nigeria", "Egypt", "South Africa", "Kenya"],
-                    "Latin America": ["Brazil", "Argentina", "Chile", "Colombia", "Mexico"]
-                }
+                # Numeric date so retrieval can range-filter on it
+                timestamp = parse_date_to_epoch(article.get("publishedAt"))
+                if timestamp is not None:
+                    metadata["timestamp"] = timestamp
+                
+                if fingerprint is not None:
+                    metadata["simhash"] = format(fingerprint, "016x")
+                    metadata["sources"] = metadata["source"]
+                    metadata["source_count"] = 1
                 
-                for region, keywords in regions.items():
-                    if any(keyword.lower() in content.lower() for keyword in keywords):
-                        metadata["region"] = region
-                        break
+                doc_id = article.get("url", str(hash(text)))
                 
-                # Add to ChromaDB
-                collection.add(
-                    documents=[text],
-                    embeddings=[embedding],
-                    ids=[article.get("url", str(hash(text)))],
-                    metadatas=[metadata]
-                )
-                logger.info(f"Added article to ChromaDB: {article.get('title', 'Untitled')}")
+                # Add to ChromaDB, routed to the region shard when partitioning is enabled
+                with span("index_write"):
+                    add_news(
+                        chroma_client,
+                        collection,
+                        documents=[text],
+                        embeddings=[embedding],
+                        ids=[doc_id],
+                        metadatas=[metadata]
+                    )
+                if index is not None:
+                    index.add(doc_id, fingerprint, metadata["region"])
+                logger.debug(f"Added article to ChromaDB: {article.get('title', 'Untitled')}")
                 
             except Exception as e:
                 logger.error(f"Error processing article: {str(e)}")
                 continue
         
-        return {"articles": all_articles, "count": len(all_articles)}
+        if duplicates:
+            logger.info(f"Collapsed {duplicates} near-duplicate articles")
+        
+        return {"articles": all_articles, "count": len(all_articles), "duplicates": duplicates}
     
     except Exception as e:
         logger.error(f"Error in search_news: {str(e)}")
         return {"error": str(e), "articles": []}
 
 @app.get("/relevant-news")
-def get_relevant_news(query: str, region: str = None):
+def get_relevant_news(query: str, region: str = None, start_date: str = None, end_date: str = None,
+                      recency_half_life_days: float = None):
     """
-    Get relevant news articles based on query and optional region
+    Get relevant news articles based on query, optional region and optional date range
     """
     try:
         logger.info(f"Finding relevant news for query: {query}, region: {region}")
         
+        try:
+            date_filter = build_date_filter(parse_date_param(start_date), parse_date_param(end_date, end=True))
+            recency_half_life_days = parse_half_life_param(recency_half_life_days)
+        except ValueError as e:
+            return {"error": str(e), "relevant_articles": []}
+        
         # Generate query embedding
-        query_embedding = generate_embedding(query)
+        with span("embed"):
+            query_embedding = generate_embedding(query)
         
-        # Query ChromaDB with optional region filter
-        if region and region != "Global":
-            results = collection.query(
+        # Query ChromaDB with optional region and date filters
+        with span("retrieve"):
+            results = query_news(
+                chroma_client,
+                collection,
                 query_embeddings=[query_embedding],
                 n_results=5,
-                where={"region": region}
-            )
-        else:
-            results = collection.query(
-                query_embeddings=[query_embedding],
-                n_results=5
+                region=region,
+                where=date_filter
             )
+            
+            if recency_half_life_days:
+                results = apply_recency_decay(results, recency_half_life_days)
         
         # Process results
         articles = []
@@ -196,7 +289,9 @@ def get_relevant_news(query: str, region: str = None):
                     articles.append({
                         "title": metadata.get("title", "Untitled"),
                         "source": metadata.get("source", "Unknown"),
+                        "sources": metadata.get("sources", metadata.get("source", "Unknown")),
                         "date": metadata.get("date", "Unknown"),
+                        "timestamp": metadata.get("timestamp"),
                         "url": metadata.get("url", ""),
                         "summary": metadata.get("detailed_summary", doc),
                         "region": metadata.get("region", "Global"),
@@ -210,19 +305,26 @@ def get_relevant_news(query: str, region: str = None):
         logger.error(f"Error in get_relevant_news: {str(e)}")
         return {"error": str(e), "relevant_articles": []}
 
+@app.get("/metrics")
+def metrics():
+    """Stage and request latency histograms in Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/health")
 def health_check():
     """Health check endpoint"""
     try:
         # Check if ChromaDB is accessible
-        collection_info = collection.get()
-        doc_count = len(collection_info.get('ids', []))
+        doc_count = count_news(chroma_client, collection)
         
         return {
             "status": "healthy",
             "chromadb_status": "connected",
             "document_count": doc_count,
-            "embedding_model": "all-MiniLM-L6-v2"
+            "embedding_model": EMBEDDING_MODEL_NAME,
+            "index_config": collection_metadata(),
+            "index_memory": index_memory_footprint(news_collections(chroma_client, collection).values()),
+            "exact_search": exact_index_stats()
         }
     except Exception as e:
         return {
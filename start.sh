@@ -2,6 +2,12 @@
 
 # Start the Flask backend in background
 cd backend
+
+# Restore the news index from a prebuilt snapshot instead of re-embedding with load_data.py
+if [ -n "$INDEX_SNAPSHOT_PATH" ]; then
+  python index_snapshot.py restore "$INDEX_SNAPSHOT_PATH" --if-empty || echo "Index snapshot restore failed, starting with the existing index"
+fi
+
 gunicorn app:app --bind 0.0.0.0:5000 &
 cd ..
 